@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark por etapas de `APIDataHandler` sobre consultas sintéticas (`src/synthetic.py`).
+
+Para cada tamaño de la rejilla (número de celdas = filas × medidas) genera una consulta, mide el tiempo
+(de reloj y de CPU) de cada etapa y, en una segunda pasada con `tracemalloc`, el pico de memoria:
+
+    parse        -> json.loads del cuerpo de la respuesta
+    dataframe    -> get_DataFrame_dataJSON(process_measures = True, numeric_measures = True)
+    hierarchies  -> process_all_hierarchies (con las respuestas de las jerarquías ya generadas)
+    mapping      -> map_data_w_hierarchies_info
+
+Los resultados se guardan en JSON y se pueden comparar con un fichero anterior para detectar regresiones.
+
+Uso:
+    python benchmarks/bench_stages.py --grid 10000,100000,1000000,10000000 --output benchmarks/results.json
+    python benchmarks/bench_stages.py --grid 10000,100000 --baseline benchmarks/results.json --tolerance 0.25
+"""
+
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import numpy as np
+import pandas as pd
+
+from main import APIDataHandler
+import memory
+import synthetic
+
+DEFAULT_GRID = (10000, 100000, 1000000, 10000000)
+STAGES = ("parse", "dataframe", "hierarchies", "mapping")
+
+
+def run_stages(body, hierarchy_values, tracker = None):
+    """
+    Ejecuta las etapas sobre el cuerpo de una consulta y devuelve, para cada una, el tiempo de reloj, el
+    tiempo de CPU y el número de filas resultante. Si se indica `tracker` (`memory.MemoryTracker`), cada
+    etapa se mide también en memoria.
+    """
+    timings = {}
+    state = {}
+
+    def parse():
+        state["json"] = json.loads(body)
+        return len(state["json"]["data"])
+
+    def dataframe():
+        state["handler"] = APIDataHandler.from_json(state.pop("json"))
+        return len(state["handler"].get_DataFrame_dataJSON(process_measures = True, numeric_measures = True))
+
+    def hierarchies():
+        return len(state["handler"].process_all_hierarchies(hierarchy_values = hierarchy_values))
+
+    def mapping():
+        return len(state["handler"].map_data_w_hierarchies_info())
+
+    for name, stage in zip(STAGES, (parse, dataframe, hierarchies, mapping)):
+        gc.collect()
+        context = tracker.stage(name) if tracker is not None else _null_stage()
+        with context:
+            wall, cpu = time.perf_counter(), time.process_time()
+            rows = stage()
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        timings[name] = {"wall_seconds": wall, "cpu_seconds": cpu, "rows_out": rows}
+    return timings
+
+
+class _null_stage:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+def bench_size(cells, n_measures = 2, n_hierarchies = 3, depth = 3, fanout = 5, repeat = 1, measure_memory = True,
+               seed = 0):
+    """
+    Mide todas las etapas para una consulta sintética de `cells` celdas.
+
+    Retorna:
+        list of dict: Una entrada por etapa con el tamaño de la consulta, `wall_seconds` y `cpu_seconds`
+                      (mínimo de `repeat` repeticiones), `rows_out` y `peak_bytes` (None sin `measure_memory`).
+    """
+    n_rows = max(1, cells // n_measures)
+    consulta, values = synthetic.generate_consulta(n_rows, n_hierarchies, depth, fanout, n_measures, seed = seed)
+    body = synthetic.consulta_body(consulta)
+    hierarchy_values = synthetic.hierarchy_values_for(consulta, values)
+    del consulta
+
+    best = {}
+    for _ in range(max(1, repeat)):
+        for name, timing in run_stages(body, hierarchy_values).items():
+            if name not in best or timing["wall_seconds"] < best[name]["wall_seconds"]:
+                best[name] = timing
+
+    peaks = {}
+    if measure_memory:
+        tracker = memory.MemoryTracker()
+        try:
+            run_stages(body, hierarchy_values, tracker)
+        finally:
+            tracker.stop()
+        peaks = {entry["stage"]: entry["peak_bytes"] for entry in tracker.report}
+
+    return [dict({"cells": n_rows * n_measures, "rows": n_rows, "measures": n_measures, "hierarchies": n_hierarchies,
+                  "depth": depth, "fanout": fanout, "body_bytes": len(body), "stage": name,
+                  "peak_bytes": peaks.get(name)}, **best[name])
+            for name in STAGES]
+
+
+def run_grid(grid = DEFAULT_GRID, output = None, **options):
+    """
+    Ejecuta `bench_size` para cada tamaño de `grid` y, si se indica `output`, guarda los resultados en JSON.
+
+    Retorna:
+        dict: `{"meta": {...}, "results": [...]}`.
+    """
+    results = []
+    for cells in grid:
+        print(f"Midiendo {cells} celdas...", flush = True)
+        results.extend(bench_size(cells, **options))
+    report = {
+        "meta": {
+            "created": datetime.datetime.now().isoformat(timespec = "seconds"),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "options": options,
+        },
+        "results": results,
+    }
+    if output is not None:
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok = True)
+        with open(output, "w", encoding = "utf-8") as f:
+            json.dump(report, f, indent = 2)
+    return report
+
+
+def compare(report, baseline, tolerance = 0.25, metrics = ("wall_seconds", "peak_bytes")):
+    """
+    Compara dos informes y devuelve las regresiones: etapas (del mismo número de celdas) en las que una
+    métrica supera en más de `tolerance` (proporción) el valor de `baseline`.
+
+    Retorna:
+        list of dict: `cells`, `stage`, `metric`, `baseline`, `current` y `ratio` de cada regresión.
+    """
+    reference = {(r["cells"], r["stage"]): r for r in baseline["results"]}
+    regressions = []
+    for result in report["results"]:
+        previous = reference.get((result["cells"], result["stage"]))
+        if previous is None:
+            continue
+        for metric in metrics:
+            current, before = result.get(metric), previous.get(metric)
+            if not current or not before:
+                continue
+            ratio = current / before
+            if ratio > 1 + tolerance:
+                regressions.append({"cells": result["cells"], "stage": result["stage"], "metric": metric,
+                                    "baseline": before, "current": current, "ratio": ratio})
+    return regressions
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Benchmark por etapas de APIDataHandler con consultas sintéticas.")
+    parser.add_argument("--grid", default = ",".join(map(str, DEFAULT_GRID)),
+                        help = "Tamaños en celdas (filas × medidas), separados por comas.")
+    parser.add_argument("--measures", type = int, default = 2)
+    parser.add_argument("--hierarchies", type = int, default = 3)
+    parser.add_argument("--depth", type = int, default = 3)
+    parser.add_argument("--fanout", type = int, default = 5)
+    parser.add_argument("--repeat", type = int, default = 1)
+    parser.add_argument("--no-memory", action = "store_true", help = "No medir la memoria (pasada con tracemalloc).")
+    parser.add_argument("--output", default = os.path.join(os.path.dirname(__file__), "results.json"))
+    parser.add_argument("--baseline", help = "Informe anterior con el que comparar.")
+    parser.add_argument("--tolerance", type = float, default = 0.25)
+    args = parser.parse_args(argv)
+
+    grid = [int(cells) for cells in args.grid.split(",") if cells.strip()]
+    report = run_grid(grid, args.output, n_measures = args.measures, n_hierarchies = args.hierarchies,
+                      depth = args.depth, fanout = args.fanout, repeat = args.repeat,
+                      measure_memory = not args.no_memory)
+    for r in report["results"]:
+        peak = "-" if r["peak_bytes"] is None else f"{r['peak_bytes'] / 2 ** 20:.1f} MB"
+        print(f"{r['cells']:>10} celdas  {r['stage']:<12} {r['wall_seconds']:8.3f} s  {r['cpu_seconds']:8.3f} s CPU  {peak}")
+
+    if args.baseline:
+        with open(args.baseline, encoding = "utf-8") as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for r in regressions:
+            print(f"REGRESIÓN {r['cells']} celdas, {r['stage']}, {r['metric']}: {r['baseline']:.4g} -> {r['current']:.4g} "
+                  f"(x{r['ratio']:.2f})")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,9 +5,14 @@ Created on Mon Nov 18 09:56:04 2024
 @author: Ana Borrego
 """
 import requests
+from requests.adapters import HTTPAdapter
 import pandas as pd
 import logging
 import re
+import time
+import os
+import json
+import hashlib
 
 url ='https://www.juntadeandalucia.es/institutodeestadisticaycartografia/intranet/admin/rest/v1.0/consulta/13514?'
 
@@ -16,8 +21,120 @@ params = {
     "posord" : "f[D_SEXO_0],f[D_CNED2014_0],f[D_EPA_NIVEL_0],f[D_TEMPORAL_0],f[D_EDAD_0],c[Measures],p[D_EPA_RELACTIVIDAD_0],p[D_TERRITORIO_0]"
 }
 
+# Sesión HTTP compartida: reutiliza conexiones, limita el tiempo de cada petición (TIMEOUT)
+# y el de toda la actualización (TOTAL_TIMEOUT, reintentos, esperas y lectura de los cuerpos incluidos),
+# y reintenta con espera exponencial ante errores de conexión y respuestas 5xx.
+# `request_timeout` y `get` replican `http_client.BADEAClient.get` del proyecto (el script se pega en
+# PowerBI y no puede importarlo): cualquier cambio en uno debe aplicarse también en el otro.
+TIMEOUT = (10, 120)
+TOTAL_TIMEOUT = 600
+RETRIES = 3
+BACKOFF_FACTOR = 0.5
+DEADLINE = time.monotonic() + TOTAL_TIMEOUT
+session = requests.Session()
+session.mount("https://", HTTPAdapter(pool_maxsize = 10))
+
+def request_timeout():
+    remaining = DEADLINE - time.monotonic()
+    if remaining <= 0:
+        raise requests.Timeout(f"Tiempo máximo de la actualización agotado ({TOTAL_TIMEOUT} s)")
+    return tuple(min(t, remaining) for t in TIMEOUT)
+
+def read_content(response):
+    # El tiempo de lectura de `requests` limita cada lectura del socket, no la descarga completa:
+    # el cuerpo se lee por bloques comprobando DEADLINE tras cada uno
+    chunks = []
+    for chunk in response.iter_content(65536):
+        if time.monotonic() > DEADLINE:
+            response.close()
+            raise requests.Timeout(f"Tiempo máximo de la actualización agotado ({TOTAL_TIMEOUT} s)")
+        chunks.append(chunk)
+    response._content = b"".join(chunks)
+    response._content_consumed = True
+
+def get(url, params = None, headers = None):
+    """
+    Petición GET con reintentos, limitada por TIMEOUT y por el tiempo restante hasta DEADLINE
+    (también mientras se lee el cuerpo). Las respuestas 4xx se devuelven sin reintentar; las 5xx se reintentan.
+    """
+    attempt = 0
+    while True:
+        try:
+            response = session.get(url, params = params, headers = headers, timeout = request_timeout(),
+                                   stream = True)
+            if response.status_code < 500:
+                read_content(response)
+                return response
+            response.close()
+            error = requests.HTTPError(f"{response.status_code} al consultar {url}", response = response)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            error = e
+        wait = BACKOFF_FACTOR * (2 ** attempt)
+        if attempt >= RETRIES or time.monotonic() + wait >= DEADLINE:
+            raise error
+        time.sleep(wait)
+        attempt += 1
+
+# Caché persistente de las jerarquías entre actualizaciones, con el mismo formato que `src/http_cache.py` del
+# proyecto (`<sha256 de la url>.body` y `.meta.json`): las jerarquías vigentes (CACHE_TTL) se leen de disco sin
+# ninguna petición y las caducadas se revalidan con una petición condicional (ETag/Last-Modified), sin descargarlas
+# de nuevo si no han cambiado. Con CACHE_DIR = None las jerarquías se descargan siempre. Si CACHE_DIR no se puede
+# crear, el script falla en lugar de continuar sin caché.
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".badea_cache", "jerarquias")
+CACHE_TTL = 7 * 24 * 3600
+if CACHE_DIR is not None:
+    os.makedirs(CACHE_DIR, exist_ok = True)
+
+def cache_paths(url):
+    base = os.path.join(CACHE_DIR, hashlib.sha256(url.encode("utf-8")).hexdigest())
+    return base + ".body", base + ".meta.json"
+
+def write_atomic(path, content):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+def cached_get_json(url):
+    """
+    JSON de `url` desde la caché de CACHE_DIR mientras esté vigente; al caducar se revalida con el servidor.
+    """
+    body_path, meta_path = cache_paths(url)
+    try:
+        with open(meta_path, "r", encoding = "utf-8") as f:
+            meta = json.load(f)
+        with open(body_path, "rb") as f:
+            body = f.read()
+    except (OSError, ValueError):
+        meta, body = None, None
+    if meta is not None and time.time() - meta["stored_at"] < CACHE_TTL:
+        return json.loads(body)
+
+    headers = {}
+    if meta is not None and meta.get("etag"):
+        headers["If-None-Match"] = meta["etag"]
+    if meta is not None and meta.get("last_modified"):
+        headers["If-Modified-Since"] = meta["last_modified"]
+    response = get(url, headers = headers)
+    if response.status_code == 304 and meta is not None:
+        meta["stored_at"] = time.time()
+        write_atomic(meta_path, json.dumps(meta).encode("utf-8"))
+        return json.loads(body)
+
+    response.raise_for_status()
+    meta = {
+        "url": url,
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "stored_at": time.time(),
+    }
+    write_atomic(body_path, response.content)
+    write_atomic(meta_path, json.dumps(meta).encode("utf-8"))
+    return json.loads(response.content)
+
 # Realizar request GET
-response = requests.get(url, params = params)
+response = get(url, params = params)
+response.raise_for_status()
 
 # Auxiliar functions for processing data in APIHandlerData
 def clean_text(texto):
@@ -118,7 +235,10 @@ class APIDataHandler:
     @staticmethod
     def request_hierarchies_values(hierarchy_element):
         url = hierarchy_element.get("url")
-        response = requests.get(url)
+        if CACHE_DIR is not None:
+            return cached_get_json(url)
+        response = get(url)
+        response.raise_for_status()
         return response.json()
 
     def process_hierarchy_level(self, alias, node, cod_combination=None, descriptions=None, level=1):
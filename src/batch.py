@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+"""
+Ejecución por lotes de varias consultas de BADEA.
+
+Las consultas se describen en un manifiesto (lista de id de consulta y parámetros). Las respuestas
+de las consultas y de sus jerarquías se descargan de forma concurrente con hilos, y el procesamiento
+(`get_DataFrame_dataJSON` → `process_all_hierarchies` → `map_data_w_hierarchies_info`), que es
+intensivo en CPU, se reparte entre varios procesos. Cada consulta se procesa en cuanto termina su
+descarga, y un error en una consulta se registra en su resultado sin detener las demás.
+
+Formato del manifiesto (JSON):
+
+    {
+        "base_url": "https://www.juntadeandalucia.es/institutodeestadisticaycartografia/intranet/admin/rest/v1.0/consulta/",
+        "consultas": [
+            {"id": 44804, "name": "autonomos", "params": {"D_TEMPORAL_0": "180194", "posord": "..."}},
+            {"url": ".../consulta/13514?", "params": {...}}
+        ]
+    }
+
+`base_url` es opcional, y el manifiesto también puede ser directamente la lista de consultas.
+"""
+
+import asyncio
+import functools
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+
+import http_client
+import export
+from main import APIDataHandler
+from result_cache import consulta_id
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BASE_URL = "https://www.juntadeandalucia.es/institutodeestadisticaycartografia/intranet/admin/rest/v1.0/consulta/"
+
+# Formatos de salida de `run_batch` (extensión del fichero)
+FILE_FORMATS = ("pkl", "xlsx", "csv", "tsv", "parquet", "arrow")
+
+
+def normalize_job(job, base_url = DEFAULT_BASE_URL):
+    """
+    Completa una entrada del manifiesto: `url` (a partir de `id` y `base_url` si no se indica), `params` y `name`.
+
+    Ejemplo de uso:
+        >>> normalize_job({"id": 44804}, "https://host/rest/v1.0/consulta/")
+        {'id': '44804', 'url': 'https://host/rest/v1.0/consulta/44804', 'params': {}, 'name': '44804'}
+    """
+    if job.get("url") is None and job.get("id") is None:
+        raise ValueError(f"La consulta del manifiesto no tiene 'id' ni 'url': {job}")
+    id_ = str(job["id"]) if job.get("id") is not None else consulta_id(job["url"])
+    url = job.get("url") or f"{base_url.rstrip('/')}/{id_}"
+    name = job.get("name") or id_ or "consulta"
+    return {"id": id_, "url": url, "params": dict(job.get("params") or {}), "name": str(name)}
+
+
+def unique_names(jobs):
+    """
+    Añade un sufijo (`_2`, `_3`, ...) a los nombres repetidos, de forma que cada consulta tenga su propio fichero.
+    """
+    seen = {}
+    for job in jobs:
+        n = seen.get(job["name"], 0) + 1
+        seen[job["name"]] = n
+        if n > 1:
+            job["name"] = f"{job['name']}_{n}"
+    return jobs
+
+
+def load_manifest(path):
+    """
+    Lee un manifiesto JSON y devuelve la lista de consultas normalizadas (ver `normalize_job`).
+    """
+    with open(path, encoding = "utf-8") as f:
+        manifest = json.load(f)
+    if isinstance(manifest, list):
+        manifest = {"consultas": manifest}
+    base_url = manifest.get("base_url", DEFAULT_BASE_URL)
+    return [normalize_job(job, base_url) for job in manifest.get("consultas", [])]
+
+
+def fetch_payloads(job, client = None, hierarchy_cache = None):
+    """
+    Descarga la respuesta de una consulta y las de todas sus jerarquías.
+
+    Retorna:
+        tuple: `(json_data, hierarchy_values)`, con las respuestas de las jerarquías en el orden de `hierarchies`.
+    """
+    client = client if client is not None else http_client.get_default_client()
+    json_data = client.get_json(job["url"], params = job["params"])
+    hierarchy_values = [APIDataHandler.request_hierarchies_values(hier, cache = hierarchy_cache, client = client)
+                        for hier in json_data.get("hierarchies", [])]
+    return json_data, hierarchy_values
+
+
+def transform_payload(json_data, hierarchy_values, numeric_measures = False, path = None):
+    """
+    Procesa una consulta ya descargada: datos, jerarquías y mapeo. Se ejecuta en los procesos de `run_batch`,
+    por lo que no realiza ninguna petición.
+
+    Parámetros:
+        json_data (dict): Respuesta JSON de la consulta.
+        hierarchy_values (list): Respuestas de sus jerarquías (ver `fetch_payloads`).
+        numeric_measures (bool, opcional): Ver `APIDataHandler.get_DataFrame_dataJSON`.
+        path (str, opcional): Si se indica, el resultado se guarda en `path` (formato según la extensión,
+                              ver `FILE_FORMATS`) y se devuelve la ruta en lugar del DataFrame.
+
+    Retorna:
+        pd.DataFrame or str: El resultado mapeado o la ruta donde se ha guardado.
+    """
+    handler = APIDataHandler.from_json(json_data, low_memory = True)
+    handler.get_DataFrame_dataJSON(process_measures = True, numeric_measures = numeric_measures)
+    handler.process_all_hierarchies(hierarchy_values = hierarchy_values)
+    dataset = handler.map_data_w_hierarchies_info()
+    if path is None:
+        return dataset
+
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".pkl":
+        dataset.to_pickle(path)
+    elif extension in (".parquet", ".arrow"):
+        measure_columns = handler._measure_columns_in(dataset)
+        export.write_table(dataset, path, export.description_columns(dataset, measure_columns),
+                           measure_columns = measure_columns)
+    else:
+        handler.save_dataset(path, dataset)
+    return path
+
+
+def _failed(result, stage, error):
+    result.update(ok = False, stage = stage, error = f"{type(error).__name__}: {error}")
+    logger.error(f'Consulta {result["name"]}: error en la fase "{stage}" - {result["error"]}')
+
+
+def run_batch(jobs, client = None, hierarchy_cache = None, output_dir = None, file_format = "pkl",
+              numeric_measures = False, fetch_workers = 4, process_workers = None, base_url = DEFAULT_BASE_URL):
+    """
+    Ejecuta varias consultas: descarga concurrente y procesamiento en un conjunto de procesos.
+
+    Parámetros:
+        jobs (list of dict): Consultas a ejecutar, con `id` o `url`, `params` y `name` opcional (ver `normalize_job`
+                             y `load_manifest`).
+        client (http_client.BADEAClient, opcional): Cliente HTTP para las descargas. Por defecto, el compartido del proceso.
+        hierarchy_cache (http_cache.HTTPCache, opcional): Caché de las jerarquías, compartida entre consultas.
+        output_dir (str, opcional): Si se indica, cada resultado se guarda en `<output_dir>/<name>.<file_format>`
+                                    desde el proceso que lo calcula, y no se devuelve el DataFrame.
+        file_format (str, opcional): Formato de los ficheros de salida (ver `FILE_FORMATS`). Por defecto, "pkl".
+        numeric_measures (bool, opcional): Ver `APIDataHandler.get_DataFrame_dataJSON`.
+        fetch_workers (int, opcional): Número de hilos de descarga.
+        process_workers (int, opcional): Número de procesos para el procesamiento. Por defecto, uno por CPU;
+                                         con 0 se procesa en el propio proceso.
+        base_url (str, opcional): Url base de las consultas indicadas solo por `id`.
+
+    Retorna:
+        list of dict: Un resultado por consulta, en el orden de `jobs`, con `id`, `name`, `url`, `ok`,
+                      `dataset` (o `path` si se indica `output_dir`), `stage` y `error` si ha fallado
+                      ("fetch" o "process") y `seconds` desde el inicio del lote.
+
+    Ejemplo de uso:
+        >>> results = run_batch(load_manifest("consultas.json"), output_dir = "salida")
+        >>> [r["name"] for r in results if not r["ok"]]
+    """
+    if file_format not in FILE_FORMATS:
+        raise ValueError(f"Formato no soportado '{file_format}'. Use uno de {FILE_FORMATS}.")
+    jobs = unique_names([normalize_job(job, base_url) for job in jobs])
+    client = client if client is not None else http_client.get_default_client()
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok = True)
+
+    start = time.perf_counter()
+    results = [dict(job, ok = None, dataset = None, path = None, stage = None, error = None, seconds = None)
+               for job in jobs]
+
+    def finish(i, value):
+        results[i].update(ok = True, seconds = time.perf_counter() - start)
+        results[i]["path" if output_dir is not None else "dataset"] = value
+
+    pool = ProcessPoolExecutor(max_workers = process_workers) if process_workers != 0 else None
+    try:
+        transforms = {}
+        with ThreadPoolExecutor(max_workers = max(1, fetch_workers)) as fetcher:
+            fetches = {fetcher.submit(fetch_payloads, job, client, hierarchy_cache): i for i, job in enumerate(jobs)}
+            for future in as_completed(fetches):
+                i = fetches[future]
+                try:
+                    json_data, hierarchy_values = future.result()
+                except Exception as error:
+                    _failed(results[i], "fetch", error)
+                    continue
+                path = None
+                if output_dir is not None:
+                    path = os.path.join(output_dir, f"{jobs[i]['name']}.{file_format}")
+                args = (json_data, hierarchy_values, numeric_measures, path)
+                del json_data, hierarchy_values
+                if pool is None:
+                    try:
+                        finish(i, transform_payload(*args))
+                    except Exception as error:
+                        _failed(results[i], "process", error)
+                else:
+                    transforms[pool.submit(transform_payload, *args)] = i
+
+        for future in as_completed(transforms):
+            i = transforms[future]
+            try:
+                finish(i, future.result())
+            except Exception as error:
+                _failed(results[i], "process", error)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    n_failed = sum(not result["ok"] for result in results)
+    logger.info(f'Lote terminado: {len(results) - n_failed} consultas correctas, {n_failed} con errores')
+    return results
+
+
+async def run_batch_async(jobs, client = None, hierarchy_cache = None, max_concurrency = 8, numeric_measures = False,
+                          executor = None, base_url = DEFAULT_BASE_URL):
+    """
+    Versión asíncrona de `run_batch` para un servicio asyncio: todas las consultas y sus jerarquías se descargan
+    en el bucle de eventos, con como máximo `max_concurrency` peticiones simultáneas en total, y el procesamiento
+    de los DataFrames se ejecuta en `executor` (por defecto, el del bucle de eventos).
+
+    Retorna:
+        list of dict: Un resultado por consulta, con el mismo formato que `run_batch` (sin `path`).
+
+    Ejemplo de uso:
+        >>> results = await run_batch_async(load_manifest("consultas.json"), max_concurrency = 8)
+    """
+    jobs = unique_names([normalize_job(job, base_url) for job in jobs])
+    client = client if client is not None else http_client.get_default_client()
+    semaphore = asyncio.Semaphore(max_concurrency)
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+
+    async def run(job):
+        result = dict(job, ok = None, dataset = None, path = None, stage = "fetch", error = None, seconds = None)
+        try:
+            handler = await APIDataHandler.from_url_async(job["url"], job["params"], client = client,
+                                                          hierarchy_cache = hierarchy_cache, semaphore = semaphore,
+                                                          low_memory = True)
+            hierarchy_values = await handler.request_all_hierarchies_values_async(semaphore)
+            result["stage"] = "process"
+            await handler.get_DataFrame_dataJSON_async(True, numeric_measures, executor)
+            await loop.run_in_executor(executor, functools.partial(handler.process_all_hierarchies,
+                                                                   hierarchy_values = hierarchy_values))
+            dataset = await handler.map_data_w_hierarchies_info_async(executor)
+        except Exception as error:
+            _failed(result, result["stage"], error)
+            return result
+        result.update(ok = True, dataset = dataset, stage = None, seconds = time.perf_counter() - start)
+        return result
+
+    results = list(await asyncio.gather(*(run(job) for job in jobs)))
+    n_failed = sum(not result["ok"] for result in results)
+    logger.info(f'Lote terminado: {len(results) - n_failed} consultas correctas, {n_failed} con errores')
+    return results
+
+
+def run_manifest(path, **options):
+    """
+    Ejecuta las consultas de un manifiesto JSON con `run_batch`. Si el manifiesto incluye `output_dir`
+    y no se indica en `options`, los resultados se guardan en ese directorio.
+    """
+    with open(path, encoding = "utf-8") as f:
+        manifest = json.load(f)
+    if isinstance(manifest, dict) and "output_dir" in manifest:
+        options.setdefault("output_dir", manifest["output_dir"])
+    return run_batch(load_manifest(path), **options)
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+Exportación de las tablas de una consulta a Parquet o Arrow IPC (Feather v2).
+
+Son formatos columnares y binarios: se cargan en segundos incluso con millones de filas (PowerBI los lee
+directamente) y ocupan una fracción del tamaño de un xlsx. Las columnas de descripciones de las jerarquías,
+con muy pocos valores distintos repetidos en muchas filas, se guardan con codificación de diccionario.
+
+Requiere `pyarrow`, que solo se importa al exportar.
+"""
+
+import os
+import re
+
+import pandas as pd
+
+import functions
+
+# Extensiones reconocidas para cada formato
+FORMATS = {
+    ".parquet": "parquet",
+    ".pq": "parquet",
+    ".arrow": "arrow",
+    ".feather": "arrow",
+    ".ipc": "arrow",
+}
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+        import pyarrow.ipc
+    except ImportError as e:
+        raise ImportError("La exportación a Parquet/Arrow requiere pyarrow: pip install pyarrow") from e
+    return pyarrow
+
+
+def format_from_path(path):
+    """
+    Formato (`parquet` o `arrow`) que corresponde a la extensión de `path`.
+
+    Excepciones:
+        ValueError: Si la extensión no corresponde a ninguno de los formatos.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in FORMATS:
+        raise ValueError(f"Extensión no soportada '{extension}'. Use una de: {', '.join(FORMATS)}")
+    return FORMATS[extension]
+
+
+def prepare_frame(df, dictionary_columns = (), measure_columns = ()):
+    """
+    Prepara un DataFrame para convertirlo a Arrow sin modificar el original.
+
+    Parámetros:
+        df (pd.DataFrame): Tabla a exportar (`df_data`, `df_data_mapped` o `hierarchies_info_df`).
+        dictionary_columns (iterable of str, opcional): Columnas que se guardan con codificación de diccionario
+                                                        (tipo `category` en pandas). Las que no existan se ignoran.
+        measure_columns (iterable of str, opcional): Columnas de medidas. Si aún contienen los diccionarios de
+                                                     BADEA (medidas sin procesar), se guarda su valor numérico.
+
+    Retorna:
+        pd.DataFrame: Copia superficial con:
+            - Las celdas que son diccionarios de BADEA sustituidas por su texto (`des`) en las jerarquías
+              y por su valor numérico (`val`, ver `functions.to_numeric_measure`) en las medidas sin procesar.
+            - Las combinaciones de códigos (`_cod`, `COD_combination`) como listas de texto; los códigos
+              sueltos se convierten en una lista de un elemento.
+            - Las columnas de `dictionary_columns` como `category`.
+
+    Ejemplo de uso:
+        >>> df = pd.DataFrame({"SEXO1": ["Total", "Total"], "D_SEXO_0_cod": [["1"], "6"]})
+        >>> prepared = prepare_frame(df, ["SEXO1"])
+        >>> str(prepared["SEXO1"].dtype), prepared["D_SEXO_0_cod"].tolist()
+        ('category', [['1'], ['6']])
+    """
+    prepared = {}
+    for col in df.columns:
+        values = df[col]
+        if values.dtype == object:
+            sample = values.dropna()
+            sample = sample.iloc[0] if len(sample) else None
+            if isinstance(sample, dict) and col in measure_columns:
+                values = functions.to_numeric_measure(values.map(_cell_value, na_action = "ignore").to_numpy())
+                values.index = df.index
+            elif isinstance(sample, dict):
+                values = values.map(_cell_text, na_action = "ignore")
+            elif isinstance(sample, list) or col.endswith("_cod") or col == "COD_combination":
+                values = values.map(_cod_list, na_action = "ignore")
+        if col in dictionary_columns:
+            values = values.astype("category")
+        prepared[col] = values
+    return pd.DataFrame(prepared, index = df.index, copy = False)
+
+
+def _cell_text(cell):
+    return cell.get("des") if isinstance(cell, dict) else cell
+
+
+def _cell_value(cell):
+    return cell.get("val") if isinstance(cell, dict) else cell
+
+
+def _cod_list(value):
+    if isinstance(value, list):
+        return [str(item) for item in value]
+    return [str(value)]
+
+
+def to_arrow_table(df, dictionary_columns = (), measure_columns = ()):
+    """
+    Convierte un DataFrame en una `pyarrow.Table` (ver `prepare_frame`), sin el índice.
+    """
+    pa = _require_pyarrow()
+    return pa.Table.from_pandas(prepare_frame(df, dictionary_columns, measure_columns), preserve_index = False)
+
+
+def write_table(df, path, dictionary_columns = (), compression = None, measure_columns = (), file_format = None):
+    """
+    Escribe un DataFrame en Parquet o Arrow IPC según la extensión de `path`.
+
+    Parámetros:
+        df (pd.DataFrame): Tabla a exportar.
+        path (str or file-like): Ruta del fichero (`.parquet`/`.pq` o `.arrow`/`.feather`/`.ipc`) o fichero
+                                 binario abierto (por ejemplo, `io.BytesIO`), indicando entonces `file_format`.
+        dictionary_columns (iterable of str, opcional): Columnas con codificación de diccionario.
+        compression (str, opcional): Compresión (`"snappy"`, `"zstd"`, `"lz4"`...). Por defecto, la del formato:
+                                     snappy en Parquet y sin comprimir en Arrow IPC.
+        measure_columns (iterable of str, opcional): Columnas de medidas (ver `prepare_frame`).
+        file_format (str, opcional): `"parquet"` o `"arrow"`. Por defecto, el de la extensión de `path`.
+
+    Retorna:
+        str: La ruta del fichero escrito (o el propio fichero abierto).
+
+    Excepciones:
+        ImportError: Si `pyarrow` no está instalado.
+        ValueError: Si la extensión no corresponde a ningún formato.
+    """
+    file_format = file_format or format_from_path(path)
+    pa = _require_pyarrow()
+    table = to_arrow_table(df, dictionary_columns, measure_columns)
+    if file_format == "parquet":
+        pa.parquet.write_table(table, path, compression = compression or "snappy")
+    elif isinstance(path, (str, os.PathLike)):
+        options = pa.ipc.IpcWriteOptions(compression = compression)
+        with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, table.schema, options = options) as writer:
+            writer.write_table(table)
+    else:
+        options = pa.ipc.IpcWriteOptions(compression = compression)
+        with pa.ipc.new_file(path, table.schema, options = options) as writer:
+            writer.write_table(table)
+    return path
+
+
+def read_table(path, file_format = None):
+    """
+    Lee un fichero escrito con `write_table` (una ruta o un fichero binario abierto, indicando entonces
+    `file_format`) y lo devuelve como DataFrame.
+
+    Las columnas con codificación de diccionario se recuperan como `category`.
+    """
+    file_format = file_format or format_from_path(path)
+    pa = _require_pyarrow()
+    if file_format == "parquet":
+        return pa.parquet.read_table(path).to_pandas()
+    if not isinstance(path, (str, os.PathLike)):
+        return pa.ipc.open_file(path).read_all().to_pandas()
+    with pa.memory_map(path, "r") as source:
+        return pa.ipc.open_file(source).read_all().to_pandas()
+
+
+def description_columns(df, measure_columns = ()):
+    """
+    Columnas de descripciones de una tabla de la consulta, candidatas a la codificación de diccionario:
+    `Variable` y `Des1..DesN` en la tabla de jerarquías, y las columnas de texto que no son medidas
+    ni códigos en los datos.
+    """
+    if "COD_combination" in df.columns:
+        return [col for col in df.columns if col == "Variable" or re.match(r'^Des\d+$', col)]
+    return [col for col in df.columns if col not in measure_columns and not col.endswith("_cod")]
@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""
+Construcción por columnas del DataFrame de datos de una consulta.
+
+Los datos de BADEA llegan como una lista de filas, y cada fila es una lista de celdas: primero una
+celda por jerarquía (diccionario con `cod` y `des`) y después una celda por medida. En lugar de crear
+un DataFrame de diccionarios y extraer los códigos celda a celda con `apply`, las filas se trasponen
+una única vez a listas por columna y los códigos se extraen de esas listas directamente.
+
+También construye el formato largo (una fila por observación y medida, `INDICATOR`/`OBS_VALUE`) a partir
+del formato ancho, reservando cada columna una única vez.
+"""
+
+import itertools
+import operator
+
+import numpy as np
+import pandas as pd
+
+# Columnas del formato largo: la medida de cada fila y su valor
+INDICATOR = "INDICATOR"
+OBS_VALUE = "OBS_VALUE"
+
+
+class ColumnarDataBuilder:
+
+    def __init__(self):
+        """
+        Constructor del acumulador de columnas.
+
+        Atributos:
+            n_rows (int): Número de filas acumuladas.
+            n_columns (int): Número de celdas por fila. Es None mientras no se haya añadido ninguna fila.
+
+        Notas:
+            - Cada bloque de filas se guarda traspuesto (una tupla por columna) y los bloques solo se
+              unen al crear el DataFrame, de forma que no se copian las celdas en listas intermedias.
+        """
+        self._blocks = []
+        self.n_rows = 0
+        self.n_columns = None
+
+    def extend(self, rows):
+        """
+        Añade un bloque de filas a las columnas acumuladas.
+
+        Parámetros:
+            rows (iterable of lists): Filas de datos con la estructura de `data` en la respuesta de BADEA.
+                                      Se puede llamar varias veces para ir acumulando bloques.
+
+        Excepciones:
+            ValueError: Si las filas no tienen todas el mismo número de celdas.
+        """
+        rows = rows if isinstance(rows, list) else list(rows)
+        if not rows:
+            return
+        try:
+            transposed = tuple(zip(*rows, strict = True))
+        except ValueError:
+            raise ValueError("Las filas de datos no tienen el mismo número de columnas")
+
+        if self.n_columns is None:
+            self.n_columns = len(transposed)
+        elif len(transposed) != self.n_columns:
+            raise ValueError("Las filas de datos no tienen el mismo número de columnas")
+        self._blocks.append(transposed)
+        self.n_rows += len(rows)
+
+    def column(self, position):
+        """
+        Iterable con los valores de la columna `position`, recorriendo todos los bloques acumulados.
+        """
+        if len(self._blocks) == 1:
+            return self._blocks[0][position]
+        return itertools.chain.from_iterable(block[position] for block in self._blocks)
+
+    def to_frame(self, hierarchy_columns, measure_columns):
+        """
+        Crea el DataFrame de datos con las columnas de jerarquías, de medidas y de códigos (`_cod`).
+
+        Parámetros:
+            hierarchy_columns (list of str): Alias de las jerarquías, en el orden de las celdas.
+            measure_columns (list of str): Descripciones de las medidas, en el orden de las celdas.
+
+        Retorna:
+            pd.DataFrame: Las columnas de jerarquías y medidas con las celdas originales, seguidas de una
+                          columna `<alias>_cod` por jerarquía con el valor `cod` de cada celda
+                          (None si la celda no es un diccionario con dicha clave).
+
+        Excepciones:
+            ValueError: Si el número de celdas de las filas no coincide con el de columnas esperadas.
+        """
+        columnas = hierarchy_columns + measure_columns
+        n_columns = self.n_columns if self.n_columns is not None else len(columnas)
+        if n_columns != len(columnas):
+            raise ValueError(f"{len(columnas)} columns passed, passed data had {n_columns} columns")
+
+        frame = {}
+        for position, name in enumerate(columnas):
+            frame[name] = to_object_array(self._column_values(position), self.n_rows)
+        for position, alias in enumerate(hierarchy_columns):
+            frame[alias + "_cod"] = extract_key(self._column_values(position), "cod", self.n_rows)
+        return pd.DataFrame(frame, columns = columnas + [alias + "_cod" for alias in hierarchy_columns],
+                            copy = False)
+
+    def _column_values(self, position):
+        return self.column(position) if self._blocks else ()
+
+
+def extract_key(values, key, count, keep_other = False):
+    """
+    Extrae `key` de cada diccionario de una columna en un array de tipo `object`. Los valores que
+    no son diccionarios, o no contienen la clave, se sustituyen por None; con `keep_other = True`
+    los valores que no son diccionarios se conservan tal cual.
+
+    En el caso habitual (todas las celdas son diccionarios con la clave) la extracción se hace con
+    `operator.itemgetter` en un único `map`, sin ejecutar código Python por celda.
+    """
+    values = values if isinstance(values, (list, tuple)) else tuple(values)
+    try:
+        return to_object_array(map(operator.itemgetter(key), values), count)
+    except (KeyError, TypeError, IndexError):
+        if keep_other:
+            return to_object_array((x.get(key) if isinstance(x, dict) else x for x in values), count)
+        return to_object_array((x.get(key) if isinstance(x, dict) else None for x in values), count)
+
+
+def to_object_array(values, count):
+    """
+    Convierte un iterable en un array unidimensional de tipo `object`, también cuando sus elementos
+    son listas (como los códigos `cod`), sin que numpy intente crear un array de varias dimensiones.
+    """
+    return np.fromiter(values, dtype = object, count = count)
+
+
+def long_frame(df, measure_columns, labels = None, indicator = INDICATOR, value = OBS_VALUE, dropna = False):
+    """
+    Convierte una tabla en formato ancho (una columna por medida) al formato largo: una fila por observación
+    y medida, con la medida en la columna `indicator` y su valor en `value`.
+
+    Parámetros:
+        df (pd.DataFrame): Tabla en formato ancho. No se modifica.
+        measure_columns (list of str): Columnas de medidas de `df`, en el orden en que se apilan.
+        labels (list of str, opcional): Valor de `indicator` para cada medida. Por defecto, el nombre de su columna.
+        indicator, value (str, opcional): Nombres de las columnas de la medida y del valor.
+        dropna (bool, opcional): Si es True, se omiten las filas cuyo valor está vacío.
+
+    Retorna:
+        pd.DataFrame: Las columnas de `df` que no son medidas, seguidas de `indicator` (categórica, con las medidas
+                      como categorías en su orden) y `value`. Las filas están ordenadas por medida: primero todas
+                      las de la primera medida, en el orden de `df`, después las de la segunda, etc.
+
+    Ejemplo de uso:
+        >>> df = pd.DataFrame({"SEXO1": ["Hombres", "Mujeres"], "Tasa": [1.5, None], "Total": [10, 20]})
+        >>> long_frame(df, ["Tasa", "Total"])
+             SEXO1 INDICATOR  OBS_VALUE
+        0  Hombres      Tasa        1.5
+        1  Mujeres      Tasa        NaN
+        2  Hombres     Total       10.0
+        3  Mujeres     Total       20.0
+
+    Notas:
+        - Cada columna de salida se reserva una única vez con su tamaño final (`take` de las columnas de
+          identificación y relleno por tramos del valor), en lugar de concatenar una tabla por medida.
+        - El valor es `Int64` si todas las medidas son enteras, `float64` si son numéricas y texto en otro caso.
+    """
+    measure_columns = list(measure_columns)
+    labels = measure_columns if labels is None else list(labels)
+    measures = [df[col] for col in measure_columns]
+    # Filas de `df` que se conservan para cada medida (todas, salvo las vacías con `dropna`)
+    if dropna:
+        selections = [np.flatnonzero(values.notna().to_numpy()) for values in measures]
+    else:
+        selections = [np.arange(len(df))] * len(measures)
+    sizes = [len(selection) for selection in selections]
+    rows = np.concatenate(selections) if selections else np.array([], dtype = np.int64)
+
+    measure_set = set(measure_columns)
+    frame = {col: df[col].array.take(rows) for col in df.columns if col not in measure_set}
+    frame[indicator] = pd.Categorical.from_codes(np.repeat(np.arange(len(labels)), sizes), categories = labels)
+    frame[value] = stack_values(measures, selections, sum(sizes))
+    return pd.DataFrame(frame, index = pd.RangeIndex(len(rows)), copy = False)
+
+
+def stack_values(columns, selections, size):
+    """
+    Apila en un único array reservado de antemano los valores `column[selection]` de cada columna.
+    """
+    dtypes = [values.dtype for values in columns]
+    if columns and all(pd.api.types.is_integer_dtype(dtype) for dtype in dtypes):
+        data, mask = np.empty(size, dtype = np.int64), np.empty(size, dtype = bool)
+        fill = lambda values: values.to_numpy(dtype = np.int64, na_value = 0)
+    elif columns and all(pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)
+                          for dtype in dtypes):
+        data, mask = np.empty(size, dtype = np.float64), None
+        fill = lambda values: values.to_numpy(dtype = np.float64, na_value = np.nan)
+    else:
+        data, mask = np.empty(size, dtype = object), None
+        fill = lambda values: values.to_numpy(dtype = object)
+
+    start = 0
+    for values, selection in zip(columns, selections):
+        end = start + len(selection)
+        data[start:end] = fill(values)[selection]
+        if mask is not None:
+            mask[start:end] = values.isna().to_numpy()[selection]
+        start = end
+    return data if mask is None else pd.arrays.IntegerArray(data, mask)
@@ -1,5 +1,9 @@
 import re
 
+import numpy as np
+import pandas as pd
+from pandas.api.types import infer_dtype
+
 def clean_text(texto):
     """
     Limpia un texto eliminando acentos y caracteres especiales, y reemplaza espacios por guiones bajos.
@@ -92,4 +96,112 @@ def remove_column(df, column_name):
         return df.drop(columns=[column_name])
     else:
         print(f"La columna '{column_name}' no existe en el DataFrame.")
-        return df
\ No newline at end of file
+        return df
+
+def to_numeric_measure(values):
+    """
+    Convierte los valores de una medida en una serie numérica.
+
+    Parámetros:
+        values (array-like): Valores `val` de la medida tal y como llegan de la API
+                             (números, cadenas vacías o None para los datos no disponibles), o ya
+                             convertidos a texto con coma decimal (`process_measures_columns`).
+
+    Retorna:
+        pd.Series: Serie `Int64` (entero con nulos) si todos los valores presentes son enteros en el JSON,
+                   o `float64` en otro caso. Los valores no numéricos se convierten en nulos.
+
+    Ejemplo de uso:
+        >>> to_numeric_measure([120, "", None]).tolist()
+        [120, <NA>, <NA>]
+        >>> to_numeric_measure([1.5, 2]).tolist()
+        [1.5, 2.0]
+        >>> to_numeric_measure(["120", "1,5", ""]).tolist()
+        [120.0, 1.5, nan]
+    """
+    series = pd.Series(values, dtype = object)
+    if infer_dtype(series, skipna = True) in ("string", "mixed"):
+        series = pd.Series([parse_decimal_comma(x) if isinstance(x, str) else x for x in series], dtype = object)
+    numeric = pd.to_numeric(series, errors = "coerce")
+    if infer_dtype(series, skipna = True) in ("integer", "mixed-integer") and numeric.notna().any():
+        if (numeric.dropna() % 1 == 0).all():
+            return numeric.astype("Int64")
+    return numeric.astype("float64")
+
+def parse_decimal_comma(text):
+    """
+    Número de un texto con coma decimal (`"1,5"` -> 1.5, `"120"` -> 120), o None si no es un número.
+    """
+    text = text.strip().replace(",", ".")
+    try:
+        return int(text)
+    except ValueError:
+        try:
+            return float(text)
+        except ValueError:
+            return None
+
+
+def format_decimal_comma(df, columns):
+    """
+    Devuelve una copia del DataFrame con las columnas numéricas indicadas convertidas a texto
+    con coma como separador decimal, para su exportación a consumidores con configuración regional española.
+
+    Parámetros:
+        df (pd.DataFrame): DataFrame a exportar. No se modifica.
+        columns (list of str): Columnas a formatear. Las que no existan o no sean numéricas se ignoran.
+
+    Retorna:
+        pd.DataFrame: Copia con las columnas formateadas. Los valores nulos se escriben como cadena vacía.
+
+    Ejemplo de uso:
+        >>> format_decimal_comma(pd.DataFrame({"Tasa": [1.5, None]}), ["Tasa"])
+          Tasa
+        0  1,5
+        1
+    """
+    df = df.copy()
+    for col in columns:
+        if col in df.columns and pd.api.types.is_numeric_dtype(df[col]):
+            df[col] = df[col].astype("string").str.replace(".", ",", regex = False).fillna("")
+    return df
+
+def cod_key(value):
+    """
+    Clave hashable de una combinación de códigos, equivalente a `", ".join(value)` para listas
+    y a `str(value)` para el resto de valores (por ejemplo, None en los datos sin código).
+
+    Ejemplo de uso:
+        >>> cod_key(["01", "04"])
+        ('01', '04')
+        >>> cod_key("01") == cod_key(["01"])
+        True
+    """
+    return tuple(value) if isinstance(value, list) else (str(value),)
+
+def intern_cod_paths(values, codes, add = True):
+    """
+    Convierte una columna de combinaciones de códigos en enteros, usando el diccionario `codes`
+    (combinación de códigos -> entero) como tabla de internado.
+
+    Parámetros:
+        values (iterable): Combinaciones de códigos (listas) o valores sueltos.
+        codes (dict): Tabla de internado. Se amplía con las combinaciones nuevas si `add` es True.
+        add (bool, opcional): Si es False, las combinaciones que no están en `codes` se codifican como -1,
+                              valor que nunca coincide con una clave de la tabla.
+
+    Retorna:
+        np.ndarray: Array `int64` con el entero de cada combinación.
+
+    Ejemplo de uso:
+        >>> codes = {}
+        >>> intern_cod_paths([["01"], ["01", "04"], ["01"]], codes)
+        array([0, 1, 0])
+        >>> intern_cod_paths([["01", "04"], ["99"]], codes, add = False)
+        array([ 1, -1])
+    """
+    if add:
+        keys = [codes.setdefault(cod_key(value), len(codes)) for value in values]
+    else:
+        keys = [codes.get(cod_key(value), -1) for value in values]
+    return np.array(keys, dtype = np.int64)
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""
+Aplanamiento iterativo de las jerarquías de BADEA.
+
+El árbol de una jerarquía se recorre con una pila explícita (en preorden, el mismo orden que el
+recorrido recursivo) y cada nodo se escribe en búferes por columnas: posición del padre, nivel,
+código, descripción e id. Las combinaciones de códigos y las columnas `Des1..DesN` se derivan al
+final a partir de la posición del padre, sin copiar listas en cada nivel del recorrido.
+"""
+
+import numpy as np
+import pandas as pd
+
+import functions
+
+# Códigos de los nodos "total" que no forman parte de la combinación de códigos de los datos.
+TOTAL_CODES = ("Total", "TOTAL", "P1_00")
+
+
+def flatten_hierarchy(root, keep = None, excluded = TOTAL_CODES):
+    """
+    Recorre el árbol de una jerarquía y devuelve sus nodos en búferes por columnas.
+
+    Parámetros:
+        root (dict): Nodo raíz de la jerarquía (`data` en la respuesta de la url de la jerarquía),
+                     con las claves "id", "cod", "des", "isLastLevel" y "children".
+        keep (set of tuples, opcional): Si se indica, solo se recorren los nodos cuya combinación de códigos
+                                        (sin los códigos de `excluded`) está en `keep` (ver `observed_prefixes`):
+                                        las ramas que no lleven a ninguna de ellas no se visitan.
+        excluded (iterable, opcional): Códigos de los nodos "total" para calcular la combinación de códigos con `keep`.
+
+    Retorna:
+        dict: Búferes con un elemento por nodo, en preorden:
+              - `parent` (np.ndarray int64): posición del nodo padre (-1 para la raíz).
+              - `level` (np.ndarray int64): nivel del nodo, empezando en 1 para la raíz.
+              - `cod`, `des`, `id` (list): código, descripción e identificador del nodo.
+
+    Ejemplo de uso:
+        >>> nodes = flatten_hierarchy({"id": "1", "cod": "Total", "des": "Total", "isLastLevel": False,
+        ...                            "children": [{"id": "2", "cod": "1", "des": "Hombres",
+        ...                                          "isLastLevel": True, "children": []}]})
+        >>> nodes["parent"], nodes["cod"]
+        (array([-1,  0]), ['Total', '1'])
+    """
+    if keep is not None:
+        return _flatten_pruned(root, keep, set(excluded))
+
+    parent, level, cod, des, ids = [], [], [], [], []
+    stack = [(root, -1, 1)]
+    while stack:
+        node, parent_position, node_level = stack.pop()
+        position = len(cod)
+        parent.append(parent_position)
+        level.append(node_level)
+        cod.append(node["cod"])
+        des.append(node["des"])
+        ids.append(node["id"])
+        if not node["isLastLevel"] and node["children"]:
+            # Los hijos se apilan en orden inverso para visitarlos en su orden original
+            for child in reversed(node["children"]):
+                stack.append((child, position, node_level + 1))
+
+    return {
+        "parent": np.array(parent, dtype = np.int64),
+        "level": np.array(level, dtype = np.int64),
+        "cod": cod,
+        "des": des,
+        "id": ids,
+    }
+
+
+def _flatten_pruned(root, keep, excluded):
+    """
+    `flatten_hierarchy` limitado a los nodos cuya combinación de códigos está en `keep`.
+    Cada entrada de la pila lleva además la combinación de códigos del nodo.
+    """
+    parent, level, cod, des, ids = [], [], [], [], []
+    root_path = () if root["cod"] in excluded else (root["cod"],)
+    stack = [(root, -1, 1, root_path)] if root_path in keep else []
+    while stack:
+        node, parent_position, node_level, path = stack.pop()
+        position = len(cod)
+        parent.append(parent_position)
+        level.append(node_level)
+        cod.append(node["cod"])
+        des.append(node["des"])
+        ids.append(node["id"])
+        if not node["isLastLevel"] and node["children"]:
+            for child in reversed(node["children"]):
+                child_path = path if child["cod"] in excluded else path + (child["cod"],)
+                if child_path in keep:
+                    stack.append((child, position, node_level + 1, child_path))
+
+    return {
+        "parent": np.array(parent, dtype = np.int64),
+        "level": np.array(level, dtype = np.int64),
+        "cod": cod,
+        "des": des,
+        "id": ids,
+    }
+
+
+def observed_prefixes(values):
+    """
+    Combinaciones de códigos presentes en una columna de datos (`<alias>_cod`) y todos sus prefijos,
+    es decir, los nodos observados y sus antecesores, para `flatten_hierarchy(root, keep = ...)`.
+
+    Ejemplo de uso:
+        >>> sorted(observed_prefixes([["01", "04"], ["01", "04"], "99"]))
+        [(), ('01',), ('01', '04'), ('99',)]
+    """
+    prefixes = set()
+    for path in {functions.cod_key(value) for value in values}:
+        for end in range(len(path), -1, -1):
+            if path[:end] in prefixes:
+                break
+            prefixes.add(path[:end])
+    return prefixes
+
+
+def cod_combinations(nodes, excluded = TOTAL_CODES):
+    """
+    Combinación de códigos de cada nodo (códigos desde la raíz hasta el nodo), sin los códigos de `excluded`.
+
+    Los nodos están en preorden, por lo que el padre siempre se ha calculado antes que sus hijos.
+    """
+    parent = nodes["parent"].tolist()
+    excluded = set(excluded)
+    paths = []
+    for position, cod in enumerate(nodes["cod"]):
+        base = paths[parent[position]] if parent[position] >= 0 else []
+        paths.append(base + [cod] if cod not in excluded else list(base))
+    return paths
+
+
+def description_columns(nodes, n_levels = None):
+    """
+    Columnas `Des1..DesN` de cada nodo: la descripción de su antecesor en cada nivel y NaN
+    en los niveles inferiores al del nodo.
+
+    Parámetros:
+        nodes (dict): Búferes devueltos por `flatten_hierarchy`.
+        n_levels (int, opcional): Número de columnas a generar. Por defecto, la profundidad de la jerarquía.
+
+    Retorna:
+        list of np.ndarray: Una columna (array de tipo `object`) por nivel.
+    """
+    parent, level = nodes["parent"], nodes["level"]
+    n_nodes = len(level)
+    depth = int(level.max()) if n_nodes else 0
+    n_levels = depth if n_levels is None else n_levels
+    des = np.fromiter(nodes["des"], dtype = object, count = n_nodes)
+
+    columns = [np.full(n_nodes, np.nan, dtype = object) for _ in range(n_levels)]
+    # Se rellenan los niveles de arriba abajo: cada nodo copia de su padre las descripciones
+    # de los niveles superiores y añade la suya en su propio nivel.
+    for current_level in range(1, min(depth, n_levels) + 1):
+        positions = np.flatnonzero(level == current_level)
+        parents = parent[positions]
+        for k in range(current_level - 1):
+            columns[k][positions] = columns[k][parents]
+        columns[current_level - 1][positions] = des[positions]
+    return columns
+
+
+def hierarchies_frame(flattened, n_levels = None):
+    """
+    Construye la tabla de jerarquías aplanadas (`hierarchies_info_df`) a partir de los nodos de cada jerarquía.
+
+    Parámetros:
+        flattened (list of tuples): Pares `(alias, nodes)` en el orden de las jerarquías, con los nodos
+                                    devueltos por `flatten_hierarchy`.
+        n_levels (int, opcional): Número de columnas `Des`. Por defecto, la mayor profundidad entre todas las jerarquías.
+
+    Retorna:
+        pd.DataFrame: Columnas `Variable`, `id`, `COD_combination` (sin los códigos de total) y `Des1..DesN`.
+    """
+    if n_levels is None:
+        n_levels = max((int(nodes["level"].max()) for _, nodes in flattened if len(nodes["level"])), default = 0)
+    variable, ids, combinations = [], [], []
+    des_parts = [[] for _ in range(n_levels)]
+    for alias, nodes in flattened:
+        variable.extend([alias] * len(nodes["cod"]))
+        ids.extend(nodes["id"])
+        combinations.extend(cod_combinations(nodes))
+        for part, column in zip(des_parts, description_columns(nodes, n_levels)):
+            part.append(column)
+
+    frame = {"Variable": variable, "id": ids, "COD_combination": pd.Series(combinations, dtype = object)}
+    for k, parts in enumerate(des_parts, start = 1):
+        frame[f"Des{k}"] = np.concatenate(parts)
+    return pd.DataFrame(frame)
@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+"""
+Índice compacto de las jerarquías aplanadas.
+
+`HierarchyIndex` guarda los nodos de una jerarquía en arrays (posición del padre, nivel, código, descripción
+e id) junto con tablas hash para localizar un nodo por su id, por su código o por su combinación de códigos.
+La combinación de códigos no se guarda como una lista por nodo: se resuelve recorriendo un trie de pares
+`(nodo padre, código)`, de forma que el índice ocupa una entrada por nodo independientemente de la profundidad.
+La tabla de jerarquías (`hierarchies_info_df`) y las columnas `Des1..DesN` solo se materializan cuando se piden.
+"""
+
+import numpy as np
+import pandas as pd
+
+import functions
+import hierarchy_flatten
+
+
+class HierarchyIndex:
+
+    def __init__(self, alias, nodes, excluded = hierarchy_flatten.TOTAL_CODES):
+        """
+        Constructor del índice de una jerarquía.
+
+        Parámetros:
+            alias (str): Alias de la jerarquía (`D_SEXO_0`).
+            nodes (dict): Búferes devueltos por `hierarchy_flatten.flatten_hierarchy`, con los nodos en preorden.
+            excluded (iterable, opcional): Códigos de los nodos "total", que no forman parte de la combinación
+                                           de códigos de los datos.
+
+        Atributos:
+            parent, depth (np.ndarray int32): Posición del padre (-1 para la raíz) y nivel (1 para la raíz) de cada nodo.
+            cod, des, id (np.ndarray object): Código, descripción e identificador de cada nodo.
+            by_id, by_cod (dict): Id o código -> posición del nodo.
+            children (dict): `(posición del prefijo, código)` -> posición del nodo cuya combinación de códigos es
+                             la del prefijo más ese código. El prefijo vacío es la posición -1.
+            empty_path (int): Posición del nodo cuya combinación de códigos es vacía (el total raíz), o -1.
+            duplicate_paths (int): Número de nodos cuya combinación de códigos ya aparecía antes en la jerarquía.
+
+        Notas:
+            - Si un id, un código o una combinación de códigos se repite, el índice apunta a su primera aparición,
+              igual que el mapeo de los datos.
+            - Los nodos "total" comparten la combinación de códigos de su padre.
+            - Las tablas hash y las columnas de descripciones se construyen la primera vez que se usan y se
+              conservan, de forma que un índice compartido (`hierarchy_registry`) solo las calcula una vez.
+        """
+        self.alias = alias
+        n_nodes = len(nodes["cod"])
+        self.parent = np.asarray(nodes["parent"], dtype = np.int32)
+        self.depth = np.asarray(nodes["level"], dtype = np.int32)
+        self.cod = np.fromiter(nodes["cod"], dtype = object, count = n_nodes)
+        self.des = np.fromiter(nodes["des"], dtype = object, count = n_nodes)
+        self.id = np.fromiter(nodes["id"], dtype = object, count = n_nodes)
+        self.excluded = frozenset(excluded)
+        self._by_id = None
+        self._by_cod = None
+        self._children = None
+        self._descriptions = None
+
+    @property
+    def by_id(self):
+        if self._by_id is None:
+            self._by_id = _first_positions(self.id)
+        return self._by_id
+
+    @property
+    def by_cod(self):
+        if self._by_cod is None:
+            self._by_cod = _first_positions(self.cod)
+        return self._by_cod
+
+    @property
+    def children(self):
+        if self._children is None:
+            self._build_paths()
+        return self._children
+
+    @property
+    def empty_path(self):
+        if self._children is None:
+            self._build_paths()
+        return self._empty_path
+
+    @property
+    def duplicate_paths(self):
+        if self._children is None:
+            self._build_paths()
+        return self._duplicate_paths
+
+    def _build_paths(self):
+        """
+        Construye el trie de combinaciones de códigos (`children`, `empty_path` y `duplicate_paths`).
+        """
+        children = {}
+        empty_path = -1
+        duplicate_paths = 0
+        # Posición (en el trie) de la combinación de códigos de cada nodo; -1 es la combinación vacía.
+        # Los nodos están en preorden, por lo que el padre siempre se ha resuelto antes que sus hijos.
+        path_positions = []
+        for position, (parent, cod) in enumerate(zip(self.parent.tolist(), self.cod)):
+            prefix = path_positions[parent] if parent >= 0 else -1
+            if cod in self.excluded:
+                path_positions.append(prefix)
+                if prefix < 0 and empty_path < 0:
+                    empty_path = position
+            else:
+                path_position = children.setdefault((prefix, cod), position)
+                duplicate_paths += path_position != position
+                path_positions.append(path_position)
+        self._children, self._empty_path, self._duplicate_paths = children, empty_path, duplicate_paths
+
+    @classmethod
+    def from_tree(cls, alias, root):
+        """
+        Índice de una jerarquía a partir de su árbol (`data` en la respuesta de la url de la jerarquía).
+
+        Ejemplo de uso:
+            >>> index = HierarchyIndex.from_tree("D_SEXO_0", {"id": "1", "cod": "Total", "des": "Total",
+            ...     "isLastLevel": False, "children": [{"id": "2", "cod": "1", "des": "Hombres",
+            ...                                         "isLastLevel": True, "children": []}]})
+            >>> index.find_path(["1"]), index.find_id("2"), index.path(1)
+            (1, 1, ['1'])
+        """
+        return cls(alias, hierarchy_flatten.flatten_hierarchy(root))
+
+    def __len__(self):
+        return len(self.cod)
+
+    def nodes(self):
+        """
+        Búferes de los nodos con el formato de `hierarchy_flatten.flatten_hierarchy`.
+        """
+        return {"parent": self.parent, "level": self.depth, "cod": self.cod, "des": self.des, "id": self.id}
+
+    def find_id(self, node_id):
+        """
+        Posición del nodo con el id `node_id`, o -1 si no existe.
+        """
+        return self.by_id.get(node_id, -1)
+
+    def find_cod(self, cod):
+        """
+        Posición del primer nodo con el código `cod`, o -1 si no existe.
+        """
+        return self.by_cod.get(cod, -1)
+
+    def find_path(self, path):
+        """
+        Posición del nodo con la combinación de códigos `path` (sin los códigos de total), o -1 si no existe.
+        """
+        position = -1
+        for cod in path:
+            position = self.children.get((position, cod))
+            if position is None:
+                return -1
+        return position if len(path) else self.empty_path
+
+    def find_paths(self, values):
+        """
+        Posición en la jerarquía de cada valor de una columna de códigos (`<alias>_cod`).
+
+        Parámetros:
+            values (iterable): Combinaciones de códigos (listas) o códigos sueltos, como en `functions.cod_key`.
+
+        Retorna:
+            np.ndarray: Array `int64` con la posición de cada valor, -1 si no está en la jerarquía.
+        """
+        found = {}
+        positions = []
+        for value in values:
+            key = functions.cod_key(value)
+            position = found.get(key)
+            if position is None:
+                position = found[key] = self.find_path(key)
+            positions.append(position)
+        return np.array(positions, dtype = np.int64)
+
+    def ancestors(self, position):
+        """
+        Posiciones de los nodos desde la raíz hasta `position`, incluido.
+        """
+        chain = []
+        while position >= 0:
+            chain.append(position)
+            position = int(self.parent[position])
+        return chain[::-1]
+
+    def path(self, position):
+        """
+        Combinación de códigos del nodo `position`, sin los códigos de total.
+        """
+        return [self.cod[ancestor] for ancestor in self.ancestors(position) if self.cod[ancestor] not in self.excluded]
+
+    def description_arrays(self, n_levels = None):
+        """
+        Columnas `Des1..DesN` de los nodos como arrays de pandas (ver `hierarchy_flatten.description_columns`),
+        que admiten `take(..., allow_fill = True)` con posiciones -1. Por defecto, una columna por nivel de la jerarquía.
+        """
+        if n_levels is not None:
+            return [pd.Series(column).array for column in hierarchy_flatten.description_columns(self.nodes(), n_levels)]
+        if self._descriptions is None:
+            self._descriptions = self.description_arrays(int(self.depth.max()) if len(self) else 0)
+        return self._descriptions
+
+    def frame(self, n_levels = None):
+        """
+        Filas de la jerarquía con el formato de `hierarchies_info_df`. Por defecto, con tantas columnas `Des`
+        como niveles tiene la jerarquía.
+        """
+        return hierarchies_frame([self], n_levels)
+
+
+def hierarchies_frame(indexes, n_levels = None):
+    """
+    Construye la tabla de jerarquías aplanadas (`hierarchies_info_df`) a partir de los índices de cada jerarquía.
+
+    Parámetros:
+        indexes (iterable of HierarchyIndex): Índices en el orden de las jerarquías.
+        n_levels (int, opcional): Número de columnas `Des`. Por defecto, la mayor profundidad entre las jerarquías.
+
+    Retorna:
+        pd.DataFrame: Columnas `Variable`, `id`, `COD_combination` y `Des1..DesN` (ver `hierarchy_flatten.hierarchies_frame`).
+    """
+    return hierarchy_flatten.hierarchies_frame([(index.alias, index.nodes()) for index in indexes], n_levels)
+
+
+def _first_positions(values):
+    """
+    Diccionario valor -> posición de su primera aparición.
+    """
+    positions = {}
+    for position, value in enumerate(values):
+        positions.setdefault(value, position)
+    return positions
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+Registro en memoria, compartido por todo el proceso, de las jerarquías ya indexadas.
+
+Jerarquías como `D_TEMPORAL_0`, `D_SEXO_0` o `D_EDAD_0` aparecen en casi todas las consultas. `HierarchyRegistry`
+guarda el índice de cada jerarquía (`hierarchy_index.HierarchyIndex`, con sus tablas de búsqueda ya construidas)
+identificado por su alias y un hash de su contenido. Así, todos los `APIDataHandler` de un mismo proceso
+(por ejemplo, un lote de consultas de PowerBI) comparten una única copia de cada jerarquía. Si la jerarquía cambia
+en la API, su hash cambia y se indexa de nuevo. El número de jerarquías guardadas está limitado y se descartan
+las menos usadas (LRU).
+
+El hash se calcula sobre el cuerpo de la respuesta de la url de la jerarquía al descargarla (`HierarchyPayload`),
+de forma que una jerarquía ya registrada se encuentra antes de aplanarla y no se vuelve a aplanar ni a indexar.
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+import hierarchy_index
+
+# Número de jerarquías que guarda por defecto el registro del proceso
+DEFAULT_MAX_ENTRIES = 128
+
+
+def payload_digest(body):
+    """
+    Hash del cuerpo (bytes) de la respuesta de la url de una jerarquía.
+
+    Retorna:
+        str: Hash hexadecimal (BLAKE2b de 128 bits).
+    """
+    return hashlib.blake2b(body, digest_size = 16).hexdigest()
+
+
+class HierarchyPayload(dict):
+    """
+    Respuesta JSON de la url de una jerarquía (un `dict`) junto con el hash de su cuerpo (`digest`),
+    con el que se busca la jerarquía en el registro antes de aplanarla.
+    """
+
+    def __init__(self, value, digest):
+        super().__init__(value)
+        self.digest = digest
+
+    @classmethod
+    def from_body(cls, body):
+        """
+        Respuesta a partir del cuerpo (bytes) descargado.
+        """
+        return cls(json.loads(body), payload_digest(body))
+
+
+def content_digest(nodes):
+    """
+    Hash del contenido de una jerarquía aplanada: códigos, descripciones, ids y estructura (posición del padre).
+
+    Parámetros:
+        nodes (dict): Búferes devueltos por `hierarchy_flatten.flatten_hierarchy`.
+
+    Retorna:
+        str: Hash hexadecimal (BLAKE2b de 128 bits).
+
+    Notas:
+        - Se calcula sobre los búferes por columnas, mucho más rápido que serializar el árbol JSON.
+    """
+    digest = hashlib.blake2b(digest_size = 16)
+    for key in ("cod", "des", "id"):
+        digest.update("\x1f".join(map(str, nodes[key])).encode("utf-8", "surrogatepass"))
+        digest.update(b"\x1e")
+    digest.update(nodes["parent"].tobytes())
+    return digest.hexdigest()
+
+
+class HierarchyRegistry:
+
+    def __init__(self, max_entries = DEFAULT_MAX_ENTRIES):
+        """
+        Constructor del registro de jerarquías.
+
+        Parámetros:
+            max_entries (int, opcional): Número máximo de jerarquías guardadas. Al superarlo se descarta la
+                                         menos usada. Con None no hay límite.
+
+        Atributos:
+            hits, misses (int): Número de jerarquías servidas desde el registro y número de jerarquías indexadas.
+        """
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def lookup(self, alias, digest):
+        """
+        Índice registrado para la jerarquía `alias` con el hash `digest` (ver `payload_digest`), o None si no está.
+        Permite comprobar el registro antes de aplanar la jerarquía.
+        """
+        key = (alias, digest)
+        with self._lock:
+            index = self._entries.get(key)
+            if index is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            return index
+
+    def get(self, alias, nodes, digest = None):
+        """
+        Devuelve el índice compartido de una jerarquía aplanada, creándolo si no está en el registro.
+
+        Parámetros:
+            alias (str): Alias de la jerarquía.
+            nodes (dict): Búferes devueltos por `hierarchy_flatten.flatten_hierarchy`.
+            digest (str, opcional): Hash del cuerpo de la respuesta de la jerarquía (`HierarchyPayload.digest`).
+                                    Si es None, se calcula sobre los búferes (`content_digest`).
+
+        Retorna:
+            tuple: `(index, cached)`, con el `HierarchyIndex` de la jerarquía y True si ya estaba en el registro.
+
+        Ejemplo de uso:
+            >>> registry = HierarchyRegistry()
+            >>> index, cached = registry.get("D_SEXO_0", hierarchy_flatten.flatten_hierarchy(root))
+            >>> registry.get("D_SEXO_0", hierarchy_flatten.flatten_hierarchy(root)) == (index, True)
+            True
+        """
+        key = (alias, digest if digest is not None else content_digest(nodes))
+        index = self.lookup(*key)
+        if index is not None:
+            return index, True
+
+        index = hierarchy_index.HierarchyIndex(alias, nodes)
+        with self._lock:
+            # Otro hilo puede haber indexado la misma jerarquía mientras tanto: se conserva la primera copia
+            index = self._entries.setdefault(key, index)
+            self._entries.move_to_end(key)
+            self.misses += 1
+            while self.max_entries is not None and len(self._entries) > self.max_entries:
+                self._entries.popitem(last = False)
+        return index, False
+
+    def clear(self):
+        """
+        Elimina todas las jerarquías del registro.
+        """
+        with self._lock:
+            self._entries.clear()
+
+
+_default_registry = None
+_default_registry_lock = threading.Lock()
+
+
+def get_default_registry():
+    """
+    Devuelve el registro compartido del proceso, creándolo en la primera llamada.
+
+    Es el que utiliza `APIDataHandler` por defecto (opción `registry = True`).
+    """
+    global _default_registry
+    with _default_registry_lock:
+        if _default_registry is None:
+            _default_registry = HierarchyRegistry()
+        return _default_registry
+
+
+def resolve(registry):
+    """
+    Registro que corresponde a la opción `registry` de `APIDataHandler`: el del proceso si es True,
+    ninguno si es False o None, o el propio registro indicado.
+    """
+    if registry is True:
+        return get_default_registry()
+    return None if registry is None or registry is False else registry
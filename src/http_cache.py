@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+"""
+Caché en disco de respuestas HTTP de BADEA.
+
+Guarda el cuerpo de cada respuesta junto con sus validadores (`ETag` y `Last-Modified`), de forma
+que las peticiones repetidas se sirven desde disco mientras la entrada no haya caducado y, una vez
+caducada, se revalidan con una petición condicional en lugar de descargarse de nuevo.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+import requests
+
+
+class HTTPCache:
+
+    def __init__(self, directory, ttl = 7 * 24 * 3600, max_bytes = None):
+        """
+        Constructor de la caché.
+
+        Parámetros:
+            directory (str): Directorio donde se guardan las entradas. Se crea si no existe.
+            ttl (float, opcional): Segundos durante los que una entrada se considera vigente y se sirve
+                                   sin consultar al servidor. Si es None, las entradas no caducan.
+                                   Por defecto, una semana.
+            max_bytes (int, opcional): Tamaño máximo que puede ocupar la caché en disco. Al superarlo se
+                                       eliminan las entradas usadas hace más tiempo (LRU). Si es None, no hay límite.
+
+        Notas:
+            - Cada entrada se compone de dos ficheros: `<clave>.body` con el cuerpo de la respuesta y
+              `<clave>.meta.json` con la url, los validadores y la fecha de almacenamiento.
+            - La fecha de último uso para el LRU es la fecha de modificación del fichero `.body`.
+            - Una entrada puede tener ficheros adjuntos (`<clave>.<nombre>`, ver `write_attachment`) con datos
+              derivados de su cuerpo. Cuentan para `max_bytes`, se eliminan con la entrada y se descartan
+              cuando el cuerpo de la respuesta cambia.
+        """
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok = True)
+
+    @staticmethod
+    def key(url):
+        """
+        Clave de la entrada: hash de la url completa, apto como nombre de fichero.
+        """
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def _paths(self, key):
+        base = os.path.join(self.directory, key)
+        return base + ".body", base + ".meta.json"
+
+    def _attachment_path(self, url, name):
+        if not name or os.sep in name or "/" in name or name in ("body", "meta.json") or name.endswith(".tmp"):
+            raise ValueError(f"Nombre de adjunto no válido: {name!r}")
+        return os.path.join(self.directory, f"{self.key(url)}.{name}")
+
+    def lookup(self, url):
+        """
+        Devuelve la entrada guardada para `url` o None si no existe.
+
+        Retorna:
+            dict: Metadatos de la entrada (`url`, `etag`, `last_modified`, `stored_at`) y el cuerpo en `body`.
+        """
+        body_path, meta_path = self._paths(self.key(url))
+        try:
+            with open(meta_path, "r", encoding = "utf-8") as f:
+                entry = json.load(f)
+            with open(body_path, "rb") as f:
+                entry["body"] = f.read()
+        except (OSError, ValueError):
+            return None
+        self._mark_used(body_path)
+        return entry
+
+    def is_fresh(self, entry):
+        """
+        Indica si la entrada sigue vigente según el `ttl` de la caché.
+        """
+        if self.ttl is None:
+            return True
+        return time.time() - entry["stored_at"] < self.ttl
+
+    @staticmethod
+    def conditional_headers(entry):
+        """
+        Cabeceras para revalidar una entrada con el servidor (`If-None-Match` / `If-Modified-Since`).
+        """
+        headers = {}
+        if entry is None:
+            return headers
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def store(self, url, body, headers = None):
+        """
+        Guarda el cuerpo de una respuesta y sus validadores, y aplica el límite de tamaño. Si el cuerpo
+        es distinto del guardado, se eliminan los adjuntos de la entrada.
+        """
+        headers = headers or {}
+        body_path, meta_path = self._paths(self.key(url))
+        meta = {
+            "url": url,
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "stored_at": time.time(),
+        }
+        with self._lock:
+            try:
+                with open(body_path, "rb") as f:
+                    changed = f.read() != body
+            except OSError:
+                changed = True
+            if changed:
+                # Los adjuntos proceden del cuerpo anterior
+                names = self._files().get(self.key(url), [])
+                self._remove_files([name for name in names if not name.endswith((".body", ".meta.json"))])
+            self._write_atomic(body_path, body)
+            self._write_atomic(meta_path, json.dumps(meta).encode("utf-8"))
+            self._evict()
+
+    def renew(self, url, entry):
+        """
+        Renueva la fecha de almacenamiento de una entrada revalidada (respuesta 304).
+        """
+        _, meta_path = self._paths(self.key(url))
+        meta = {k: v for k, v in entry.items() if k != "body"}
+        meta["stored_at"] = time.time()
+        with self._lock:
+            self._write_atomic(meta_path, json.dumps(meta).encode("utf-8"))
+
+    def get_json(self, url, get = requests.get):
+        """
+        Devuelve el JSON de `url`, sirviéndolo desde la caché cuando es posible.
+
+        Parámetros:
+            url (str): Url a consultar. Es la clave de la caché.
+            get (callable, opcional): Función con la firma de `requests.get` usada para las peticiones.
+
+        Retorna:
+            dict: Contenido JSON de la respuesta.
+
+        Funcionalidad:
+            1. Si existe una entrada vigente, se devuelve sin realizar ninguna petición.
+            2. Si existe pero ha caducado, se hace una petición condicional con sus validadores;
+               si el servidor responde 304 se renueva la entrada y se devuelve la copia guardada.
+            3. En cualquier otro caso se descarga la respuesta y se guarda en la caché.
+        """
+        return json.loads(self.get_body(url, get = get))
+
+    def get_body(self, url, get = requests.get):
+        """
+        Devuelve el cuerpo (bytes) de la respuesta de `url`, con la misma lógica de caché que `get_json`.
+        """
+        entry = self.lookup(url)
+        if entry is not None and self.is_fresh(entry):
+            return entry["body"]
+
+        response = get(url, headers = self.conditional_headers(entry))
+        if response.status_code == 304 and entry is not None:
+            self.renew(url, entry)
+            return entry["body"]
+
+        response.raise_for_status()
+        self.store(url, response.content, response.headers)
+        return response.content
+
+    def read_attachment(self, url, name):
+        """
+        Contenido (bytes) del adjunto `name` de la entrada de `url`, o None si no existe.
+        """
+        try:
+            with open(self._attachment_path(url, name), "rb") as f:
+                content = f.read()
+        except OSError:
+            return None
+        self._mark_used(self._paths(self.key(url))[0])
+        return content
+
+    def write_attachment(self, url, name, content):
+        """
+        Guarda `content` (bytes) como adjunto `name` de la entrada de `url` y aplica el límite de tamaño.
+
+        Retorna:
+            bool: False si la entrada no existe (el adjunto no se guarda), True en otro caso.
+
+        Excepciones:
+            ValueError: Si `name` no es un nombre de adjunto válido.
+        """
+        path = self._attachment_path(url, name)
+        with self._lock:
+            if not os.path.isfile(self._paths(self.key(url))[0]):
+                return False
+            self._write_atomic(path, content)
+            self._evict()
+        return True
+
+    def remove_attachment(self, url, name):
+        """
+        Elimina el adjunto `name` de la entrada de `url`, si existe.
+        """
+        path = self._attachment_path(url, name)
+        with self._lock:
+            self._remove(path)
+
+    def clear(self):
+        """
+        Elimina todas las entradas de la caché, con sus adjuntos.
+        """
+        with self._lock:
+            for names in self._files().values():
+                self._remove_files(names)
+
+    def size(self):
+        """
+        Tamaño en bytes que ocupan las entradas en disco.
+        """
+        return sum(size for _, size, _ in self._entries())
+
+    def _files(self):
+        # Ficheros de cada clave: el cuerpo, los metadatos y los adjuntos (sin los temporales)
+        files = {}
+        for name in os.listdir(self.directory):
+            if "." in name and not name.endswith(".tmp"):
+                files.setdefault(name.split(".", 1)[0], []).append(name)
+        return files
+
+    def _entries(self, files = None):
+        # Los adjuntos cuya entrada ya no existe tienen fecha de uso 0 y son los primeros en eliminarse
+        entries = []
+        for key, names in (files if files is not None else self._files()).items():
+            size = 0
+            last_used = 0
+            for name in names:
+                try:
+                    stat = os.stat(os.path.join(self.directory, name))
+                except OSError:
+                    continue
+                size += stat.st_size
+                if name.endswith(".body"):
+                    last_used = stat.st_mtime_ns
+            entries.append((key, size, last_used))
+        return entries
+
+    def _evict(self):
+        if self.max_bytes is None:
+            return
+        files = self._files()
+        entries = sorted(self._entries(files), key = lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        for key, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            self._remove_files(files[key])
+            total -= size
+
+    def _remove_files(self, names):
+        for name in names:
+            self._remove(os.path.join(self.directory, name))
+
+    @staticmethod
+    def _mark_used(path):
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    @staticmethod
+    def _write_atomic(path, content):
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
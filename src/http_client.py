@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+Cliente HTTP compartido para las peticiones a la API de BADEA.
+
+Reutiliza las conexiones (keep-alive) mediante una `requests.Session` con un pool de conexiones,
+aplica un tiempo máximo por petición y un tiempo máximo total por llamada (también mientras se lee el
+cuerpo de la respuesta), y reintenta con espera exponencial ante errores de conexión, tiempos agotados
+y respuestas 5xx.
+"""
+
+import logging
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class BADEAClient:
+
+    def __init__(self, timeout = (10, 120), total_timeout = 600, retries = 3, backoff_factor = 0.5,
+                 pool_maxsize = 10, transport = None):
+        """
+        Constructor del cliente.
+
+        Parámetros:
+            timeout (float o tuple, opcional): Tiempo máximo de cada petición, con el formato de `requests`
+                                               (segundos, o tupla `(conexión, lectura)`). Por defecto `(10, 120)`.
+            total_timeout (float, opcional): Tiempo máximo total de una llamada, reintentos, esperas y lectura
+                                             del cuerpo incluidos. Si es None, solo se limita cada petición individual.
+            retries (int, opcional): Número de reintentos tras el primer intento fallido.
+            backoff_factor (float, opcional): Espera base entre reintentos; el reintento `n` espera
+                                              `backoff_factor * 2 ** n` segundos.
+            pool_maxsize (int, opcional): Número máximo de conexiones abiertas por host. Debe ser al menos
+                                          igual al número de hilos que usan el cliente a la vez.
+            transport (objeto, opcional): Objeto con un método `get` compatible con `requests.Session.get`
+                                          que sustituye a la sesión HTTP, por ejemplo en las pruebas.
+
+        Notas:
+            - La sesión es segura para usarse desde varios hilos en peticiones GET, por lo que una única
+              instancia puede compartirse entre las descargas concurrentes de jerarquías.
+            - `bytes_downloaded` acumula el tamaño de los cuerpos recibidos por el cliente.
+        """
+        self.timeout = timeout
+        self.total_timeout = total_timeout
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.bytes_downloaded = 0
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+        if transport is None:
+            transport = requests.Session()
+            adapter = HTTPAdapter(pool_connections = pool_maxsize, pool_maxsize = pool_maxsize)
+            transport.mount("https://", adapter)
+            transport.mount("http://", adapter)
+        self.transport = transport
+
+    def get(self, url, params = None, headers = None, stream = False):
+        """
+        Realiza una petición GET con reintentos y tiempos máximos.
+
+        Parámetros:
+            url (str): Url de la petición.
+            params (dict, opcional): Parámetros de la consulta.
+            headers (dict, opcional): Cabeceras adicionales (por ejemplo, las condicionales de la caché).
+            stream (bool, opcional): Si es True, el cuerpo no se descarga hasta que se lea de la respuesta.
+
+        Retorna:
+            requests.Response: La respuesta del servidor. Las respuestas 4xx se devuelven sin reintentar.
+                               Su atributo `deadline` es el instante (`time.monotonic`) en el que se agota
+                               `total_timeout`, con el que `iter_content` limita la lectura del cuerpo.
+
+        Excepciones:
+            requests.HTTPError: Si el servidor sigue respondiendo 5xx tras agotar los reintentos.
+            requests.ConnectionError / requests.Timeout: Si la conexión sigue fallando tras los reintentos
+                                                         o se supera `total_timeout`.
+
+        Notas:
+            - El cuerpo se pide siempre por bloques (`stream = True` en la sesión). Sin `stream`, se lee aquí
+              comprobando `total_timeout` tras cada bloque: el tiempo de lectura de `requests` limita cada
+              lectura del socket, no la descarga completa, y un servidor que envía el cuerpo muy despacio
+              podría superar el tiempo máximo.
+        """
+        deadline = None if self.total_timeout is None else time.monotonic() + self.total_timeout
+        attempt = 0
+        while True:
+            try:
+                response = self.transport.get(url, params = params, headers = headers,
+                                              timeout = self._request_timeout(deadline), stream = True)
+                if response.status_code < 500:
+                    response.deadline = deadline
+                    if not stream:
+                        self._read_content(response)
+                    return response
+                self._close_response(response)
+                error = requests.HTTPError(f"{response.status_code} al consultar {url}", response = response)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+
+            wait = self.backoff_factor * (2 ** attempt)
+            if attempt >= self.retries or (deadline is not None and time.monotonic() + wait >= deadline):
+                raise error
+            self.logger.warning(f"Reintentando {url} en {wait:.1f}s ({attempt + 1}/{self.retries}): {error}")
+            time.sleep(wait)
+            attempt += 1
+
+    def get_json(self, url, params = None):
+        """
+        Realiza una petición GET y devuelve el contenido JSON, comprobando el código de estado.
+        """
+        response = self.get(url, params = params)
+        response.raise_for_status()
+        return response.json()
+
+    def iter_content(self, response, chunk_size = 65536):
+        """
+        Recorre el cuerpo de una respuesta obtenida con `stream = True` por bloques, contabilizando
+        los bytes recibidos en `bytes_downloaded`.
+
+        Excepciones:
+            requests.Timeout: Si se supera el `total_timeout` de la petición (`response.deadline`) mientras
+                              se lee el cuerpo.
+        """
+        deadline = getattr(response, "deadline", None)
+        for chunk in response.iter_content(chunk_size):
+            with self._lock:
+                self.bytes_downloaded += len(chunk)
+            if deadline is not None and time.monotonic() > deadline:
+                self._close_response(response)
+                raise requests.Timeout(f"Tiempo máximo total agotado al leer la respuesta de {getattr(response, 'url', '')}")
+            yield chunk
+
+    def close(self):
+        """
+        Cierra las conexiones abiertas del pool.
+        """
+        close = getattr(self.transport, "close", None)
+        if close is not None:
+            close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _request_timeout(self, deadline):
+        if deadline is None:
+            return self.timeout
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise requests.Timeout("Tiempo máximo total de la petición agotado")
+        if isinstance(self.timeout, tuple):
+            return tuple(min(t, remaining) for t in self.timeout)
+        return min(self.timeout, remaining) if self.timeout is not None else remaining
+
+    def _read_content(self, response):
+        # Las respuestas de `requests` aún sin leer tienen `_content = False`; las demás (transportes de
+        # prueba, respuestas grabadas) ya tienen el cuerpo en memoria
+        if getattr(response, "_content", None) is not False:
+            content = getattr(response, "content", None) or b""
+            with self._lock:
+                self.bytes_downloaded += len(content)
+            return
+        response._content = b"".join(self.iter_content(response))
+        response._content_consumed = True
+
+    @staticmethod
+    def _close_response(response):
+        close = getattr(response, "close", None)
+        if close is not None:
+            close()
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def get_default_client():
+    """
+    Devuelve el cliente compartido del proceso, creándolo en la primera llamada.
+
+    Es el que utiliza `APIDataHandler` cuando no se le indica un cliente, de forma que todas las
+    instancias reutilizan el mismo pool de conexiones.
+    """
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = BADEAClient()
+        return _default_client
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+Lectura incremental de la respuesta JSON de una consulta de BADEA.
+
+La respuesta de una consulta es un objeto con las claves `hierarchies`, `measures`, `metainfo` y `data`,
+donde `data` contiene la inmensa mayoría del tamaño. En lugar de descargar el cuerpo completo y
+decodificarlo de una vez, el cuerpo se lee por bloques y las filas de `data` se van entregando por lotes
+según se decodifican, de forma que nunca coexisten en memoria el texto completo, el árbol JSON completo
+y el DataFrame. El resto de claves se decodifican enteras, ya que su tamaño es pequeño.
+
+Solo utiliza la biblioteca estándar (`json.JSONDecoder.raw_decode` sobre un búfer de texto), decodificando
+en una sola llamada todas las filas completas de cada bloque descargado.
+"""
+
+import codecs
+import json
+
+_WHITESPACE = " \t\n\r"
+
+
+class _TextBuffer:
+    """
+    Búfer de texto sobre un iterable de bloques de bytes, decodificados como UTF-8 de forma incremental
+    (ignorando la marca BOM inicial, si la hay).
+    """
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder("utf-8-sig")()
+        self.text = ""
+        self.pos = 0
+        self.exhausted = False
+
+    def read_more(self):
+        """
+        Añade el siguiente bloque al búfer, descartando el texto ya consumido. Devuelve False si no quedan bloques.
+        """
+        while not self.exhausted:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                self.exhausted = True
+                text = self._decoder.decode(b"", final = True)
+            else:
+                text = self._decoder.decode(chunk) if isinstance(chunk, bytes) else chunk
+            if text:
+                self.text = self.text[self.pos:] + text
+                self.pos = 0
+                return True
+        return False
+
+    def peek(self):
+        """
+        Primer carácter que no es espacio en blanco, sin consumirlo (cadena vacía al final del cuerpo).
+        """
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self.read_more():
+                return ""
+
+    def expect(self, chars):
+        """
+        Consume el siguiente carácter significativo, que debe ser uno de `chars`, y lo devuelve.
+        """
+        char = self.peek()
+        if not char or char not in chars:
+            raise json.JSONDecodeError(f"Se esperaba uno de {chars!r}", self.text, self.pos)
+        self.pos += 1
+        return char
+
+    def decode_value(self, decoder):
+        """
+        Decodifica el siguiente valor JSON completo, leyendo más bloques mientras esté incompleto.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = decoder.raw_decode(self.text, self.pos)
+            except json.JSONDecodeError:
+                if self.read_more():
+                    continue
+                raise
+            # Un número al final del búfer puede continuar en el siguiente bloque
+            if end == len(self.text) and not isinstance(value, (dict, list, str)) and self.read_more():
+                continue
+            self.pos = end
+            return value
+
+    def decode_sequence(self, decoder, max_attempts = 2):
+        """
+        Decodifica de una sola vez los elementos completos (listas) de una lista que ya están en el búfer,
+        a partir de la posición actual (inicio de un elemento).
+
+        Se busca desde el final del búfer un `]` seguido de `,` y `[` (el final de una fila y el comienzo de
+        la siguiente) y se decodifica `"[" + texto_hasta_el_corchete + "]"`. Ese texto solo es un JSON válido
+        si el corchete cierra realmente un elemento de la lista, por lo que el resultado coincide siempre
+        con la decodificación elemento a elemento. Decodificar todo el bloque en una llamada evita el coste
+        por elemento y comparte las cadenas de las claves repetidas entre todas las filas del bloque.
+
+        Retorna:
+            list: Elementos decodificados (lista vacía si no hay ninguno completo en el búfer). La posición
+                  queda sobre el separador siguiente (`,` o el `]` de cierre de la lista).
+        """
+        text, start = self.text, self.pos
+        cut = len(text)
+        attempts = 0
+        while attempts < max_attempts:
+            cut = _last_row_end(text, start, cut)
+            if cut < 0:
+                break
+            attempts += 1
+            try:
+                items, end = decoder.raw_decode("[" + text[start:cut + 1] + "]")
+            except json.JSONDecodeError:
+                continue
+            # Los caracteres `1..end-2` del texto sintético son los del búfer consumidos
+            self.pos = start + end - 2
+            return items
+        return []
+
+
+def _last_row_end(text, start, stop):
+    """
+    Posición del último `]` entre `start` y `stop` seguido (salvo espacios) de `,` y `[`, o -1 si no hay.
+    """
+    cut = stop
+    while True:
+        cut = text.rfind("]", start, cut)
+        if cut < 0:
+            return -1
+        position = _skip_whitespace(text, cut + 1)
+        if position < len(text) and text[position] == ",":
+            position = _skip_whitespace(text, position + 1)
+            if position < len(text) and text[position] == "[":
+                return cut
+
+
+def _skip_whitespace(text, position):
+    while position < len(text) and text[position] in _WHITESPACE:
+        position += 1
+    return position
+
+
+def iter_consulta(chunks, batch_size = 10000, stream_key = "data"):
+    """
+    Recorre de forma incremental el objeto JSON de una consulta.
+
+    Parámetros:
+        chunks (iterable of bytes): Bloques del cuerpo de la respuesta, por ejemplo `response.iter_content(65536)`.
+        batch_size (int, opcional): Número de filas de `stream_key` a partir del cual se entrega un lote. Las filas
+                                    se decodifican por bloques de descarga, por lo que un lote puede ser mayor.
+        stream_key (str, opcional): Clave cuyo valor (una lista) se entrega por lotes. Por defecto, "data".
+
+    Retorna:
+        generator: Pares `(clave, valor)` en el orden del cuerpo. Para `stream_key` se generan uno o varios
+                   pares con listas de filas; para el resto de claves, un único par con el valor completo.
+
+    Excepciones:
+        json.JSONDecodeError: Si el cuerpo no es un objeto JSON válido o está incompleto.
+
+    Ejemplo de uso:
+        >>> body = b'{"measures": [{"des": "Valor"}], "data": [[1], [2], [3]]}'
+        >>> list(iter_consulta([body[:20], body[20:44], body[44:]], batch_size = 2))
+        [('measures', [{'des': 'Valor'}]), ('data', [[1], [2]]), ('data', [[3]])]
+    """
+    decoder = json.JSONDecoder()
+    buffer = _TextBuffer(chunks)
+    buffer.expect("{")
+    if buffer.peek() == "}":
+        buffer.pos += 1
+        return
+    while True:
+        key = buffer.decode_value(decoder)
+        buffer.expect(":")
+        if key == stream_key and buffer.peek() == "[":
+            yield from _iter_array_batches(buffer, decoder, key, batch_size)
+        else:
+            yield key, buffer.decode_value(decoder)
+        if buffer.expect(",}") == "}":
+            return
+
+
+def _iter_array_batches(buffer, decoder, key, batch_size):
+    buffer.expect("[")
+    batch, emitted = [], False
+    if buffer.peek() == "]":
+        buffer.pos += 1
+    else:
+        while True:
+            items = buffer.decode_sequence(decoder)
+            if items:
+                batch.extend(items)
+            else:
+                batch.append(buffer.decode_value(decoder))
+            if len(batch) >= batch_size:
+                yield key, batch
+                batch, emitted = [], True
+            if buffer.expect(",]") == "]":
+                break
+    # Una lista vacía también se entrega, para que la clave quede registrada
+    if batch or not emitted:
+        yield key, batch
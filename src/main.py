@@ -5,20 +5,46 @@ Created on Wed Nov 13 11:20:04 2024
 @author: Ana Borrego
 """
 
-import requests
+import numpy as np
 import pandas as pd
 import logging
 import re
+import os
+import functools
+import contextlib
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 
 # Auxiliar functions for processing data in APIHandlerData
 # import os
 # os.chdir("C:/Users/AnaBorrego/Desktop/Proyectos/ANDALUCIA_EMPRENDE/VISOR/BADEA_2D/")
 import functions
+import http_client
+import frame_builder
+import json_stream
+import memory
+import export
+import writers
+import hierarchy_flatten
+import hierarchy_index
+import hierarchy_registry
+import query_split
+import sdmx
+import stats
 
 # Class for handle API response definition. 
 class APIDataHandler:
+
+    # Valores por defecto de las opciones del constructor
+    low_memory = False
+    memory_tracker = None
+    stats = None
+    hierarchy_index = None
+    registry = None
+    _hierarchies_info_df = None
     
-    def __init__(self, response):
+    def __init__(self, response, hierarchy_cache = None, client = None, low_memory = False, track_memory = False,
+                 log_stats = False, registry = True):
         """
         Constructor que toma la respuesta JSON de una consulta API y extrae sus elementos clave.
         
@@ -28,6 +54,22 @@ class APIDataHandler:
     
         Parámetros:
             response (requests.Response): La respuesta de una consulta a una API, que se espera que esté en formato JSON.
+            hierarchy_cache (http_cache.HTTPCache, opcional): Caché en disco para los valores de las jerarquías.
+                                                              Si se indica, `process_all_hierarchies` solo descarga
+                                                              las jerarquías que no estén guardadas o hayan caducado.
+            client (http_client.BADEAClient, opcional): Cliente HTTP con el que se solicitan las jerarquías.
+                                                        Si es None, se usa el cliente compartido del proceso.
+            low_memory (bool, opcional): Si es True, cada resultado intermedio se libera en cuanto la etapa siguiente
+                                         lo ha consumido (respuesta, JSON y filas de datos, nodos de las jerarquías y
+                                         `df_data` tras el mapeo) y se evitan las copias defensivas.
+            track_memory (bool, opcional): Si es True, se mide el pico de memoria y la memoria retenida de cada etapa
+                                           con `tracemalloc` y se guardan en `self.memory_report`.
+            log_stats (bool, opcional): Si es True, las estadísticas de cada etapa (`self.stats`) se emiten también
+                                        como líneas JSON en el logger `badea.stats`.
+            registry (bool or hierarchy_registry.HierarchyRegistry, opcional): Registro en memoria de las jerarquías
+                                        ya indexadas. Por defecto (True) se usa el registro compartido del proceso, de
+                                        forma que las jerarquías comunes a varias consultas se indexan una sola vez;
+                                        con False cada instancia indexa sus propias jerarquías.
         
         Retorna:
             Ninguno: Este método no retorna un valor. Inicializa los atributos de la clase.
@@ -56,18 +98,247 @@ class APIDataHandler:
             - Si alguna de estas claves no está presente en la respuesta, se usará un valor predeterminado (como una lista vacía o un diccionario vacío).
             - El logger se configura dinámicamente en función del `id_consulta` para cada instancia de la clase.
         """
-        self.response = response
-        self.JSONdata = response.json().copy()
+        self._init_options(low_memory, track_memory, log_stats, client, registry)
+        with self._stage("parse") as record:
+            json_data = response.json()
+            record["rows_out"] = len(json_data.get("data") or [])
+            # En modo `low_memory` no se guarda la respuesta (con su cuerpo) ni una copia del JSON
+            self.response = None if low_memory else response
+            self._load_json(json_data if low_memory else json_data.copy(), hierarchy_cache, client)
+
+    def _init_options(self, low_memory = False, track_memory = False, log_stats = False, client = None,
+                      registry = True):
+        """
+        Configura el modo de bajo consumo de memoria, la medición de memoria, el registro de estadísticas por etapas
+        y el registro de jerarquías.
+        """
+        self.low_memory = low_memory
+        self.registry = hierarchy_registry.resolve(registry)
+        self.memory_tracker = memory.MemoryTracker() if track_memory else None
+        self.memory_report = self.memory_tracker.report if track_memory else []
+        client = client if client is not None else http_client.get_default_client()
+        self.stats = stats.StageStats(self.memory_tracker, client = client, log_json = log_stats)
+
+    def _stage(self, name, memory = True, **fields):
+        """
+        Contexto que registra una etapa en `self.stats` (tiempos, bytes descargados, filas y, si `track_memory`
+        está activo y `memory` es True, memoria). Devuelve el registro de la etapa para completar sus filas.
+        """
+        if self.stats is None:
+            self.stats = stats.StageStats(self.memory_tracker)
+        return self.stats.stage(name, memory, **fields)
+
+    def _load_json(self, json_data, hierarchy_cache = None, client = None, data_builder = None):
+        """
+        Inicializa los atributos de la clase a partir del contenido JSON de la consulta.
+        """
+        self.JSONdata = json_data
 
         # Extraer los elementos principales de la respuesta JSON
         self.hierarchies = self.JSONdata.get("hierarchies", [])
-        self.data = self.JSONdata.get("data", [])
+        self.data = self.JSONdata.get("data", []) if data_builder is None else None
+        self.data_builder = data_builder
         self.measures = self.JSONdata.get("measures", [])
         self.metainfo = self.JSONdata.get("metainfo", {})
         self.id_consulta = self.metainfo.get("id")
+        self.hierarchy_cache = hierarchy_cache
+        self.client = client if client is not None else http_client.get_default_client()
         
         # Registro de mensajes de log en aplicaciones
         self.logger = logging.getLogger(f'{self.__class__.__name__} [{self.id_consulta}]')
+        if self.stats is not None:
+            self.stats.context["id_consulta"] = self.id_consulta
+
+    @property
+    def hierarchies_info_df(self):
+        """
+        Tabla de jerarquías aplanadas (`Variable`, `id`, `COD_combination` y `Des1..DesN`).
+
+        Se materializa a partir de los índices de las jerarquías (`self.hierarchy_index`) la primera vez que se pide.
+        En modo `low_memory` no se guarda: se vuelve a construir en cada acceso. Es None si aún no se han procesado
+        las jerarquías.
+        """
+        df = self._hierarchies_info_df
+        if df is None and self.hierarchy_index is not None:
+            df = hierarchy_index.hierarchies_frame(self.hierarchy_index.values())
+            if not self.low_memory:
+                self._hierarchies_info_df = df
+        return df
+
+    @hierarchies_info_df.setter
+    def hierarchies_info_df(self, df):
+        self._hierarchies_info_df = df
+
+    @classmethod
+    def from_json(cls, json_data, hierarchy_cache = None, client = None, low_memory = False, track_memory = False,
+                  log_stats = False, registry = True):
+        """
+        Construye la clase a partir del contenido JSON de una consulta ya decodificado (por ejemplo, leído de disco).
+
+        Parámetros:
+            json_data (dict): Contenido de la respuesta, con las claves `hierarchies`, `data`, `measures` y `metainfo`.
+            hierarchy_cache (http_cache.HTTPCache, opcional): Caché en disco de las jerarquías.
+            client (http_client.BADEAClient, opcional): Cliente HTTP con el que se solicitan las jerarquías.
+            low_memory, track_memory, log_stats, registry (opcional): Ver el constructor.
+
+        Retorna:
+            APIDataHandler: La clase inicializada, con `self.response` igual a None.
+        """
+        handler = cls.__new__(cls)
+        handler._init_options(low_memory, track_memory, log_stats, client, registry)
+        handler.response = None
+        handler._load_json(json_data, hierarchy_cache, client)
+        return handler
+
+    @classmethod
+    def from_stream(cls, chunks, hierarchy_cache = None, client = None, batch_size = 10000, response = None,
+                    low_memory = False, track_memory = False, log_stats = False, registry = True):
+        """
+        Construye la clase leyendo el cuerpo de la consulta de forma incremental.
+
+        Las filas de `data` se decodifican por lotes y se añaden directamente a un
+        `frame_builder.ColumnarDataBuilder`, sin construir la lista completa de filas ni guardar el
+        cuerpo de la respuesta. Solo `hierarchies`, `measures` y `metainfo` se conservan como objetos Python.
+
+        Parámetros:
+            chunks (iterable of bytes): Bloques del cuerpo JSON de la consulta.
+            hierarchy_cache (http_cache.HTTPCache, opcional): Caché en disco de las jerarquías.
+            client (http_client.BADEAClient, opcional): Cliente HTTP con el que se solicitan las jerarquías.
+            batch_size (int, opcional): Número de filas que se decodifican antes de añadirlas al acumulador.
+            response (requests.Response, opcional): Respuesta de la que proceden los bloques, que se guarda en
+                                                    `self.response` (sin su cuerpo) salvo en modo `low_memory`.
+            low_memory, track_memory, log_stats, registry (opcional): Ver el constructor.
+
+        Retorna:
+            APIDataHandler: La clase inicializada. `self.data` es None y las filas están en `self.data_builder`,
+                            que es el que utiliza `get_DataFrame_dataJSON`.
+
+        Ejemplo de uso:
+            >>> with open("consulta_44804.json", "rb") as f:
+            ...     handler = APIDataHandler.from_stream(iter(lambda: f.read(65536), b""))
+        """
+        handler = cls.__new__(cls)
+        handler._init_options(low_memory, track_memory, log_stats, client, registry)
+        with handler._stage("parse") as record:
+            elements = {}
+            builder = frame_builder.ColumnarDataBuilder()
+            for key, value in json_stream.iter_consulta(chunks, batch_size = batch_size):
+                if key == "data":
+                    builder.extend(value)
+                else:
+                    elements[key] = value
+
+            handler.response = None if low_memory else response
+            handler._load_json(elements, hierarchy_cache, client, data_builder = builder)
+            record["rows_out"] = builder.n_rows
+        return handler
+
+    @classmethod
+    def from_url(cls, url, params = None, client = None, hierarchy_cache = None, stream = False,
+                 chunk_size = 65536, max_cells = query_split.DEFAULT_MAX_CELLS, split_by = None, **options):
+        """
+        Realiza la consulta a la API y construye la clase con su respuesta.
+
+        Parámetros:
+            url (str): Url de la consulta, por ejemplo `.../rest/v1.0/consulta/44804?`.
+            params (dict, opcional): Parámetros de la consulta (`D_TEMPORAL_0`, `posord`, ...).
+            client (http_client.BADEAClient, opcional): Cliente HTTP para la consulta y las jerarquías.
+                                                        Si es None, se usa el cliente compartido del proceso.
+            hierarchy_cache (http_cache.HTTPCache, opcional): Caché en disco de las jerarquías.
+            stream (bool, opcional): Si es True, el cuerpo se descarga por bloques y se decodifica de forma
+                                     incremental con `from_stream`, reduciendo el pico de memoria en consultas grandes.
+            chunk_size (int, opcional): Tamaño en bytes de los bloques descargados en modo `stream`.
+            max_cells (int, opcional): Si el número de celdas estimado a partir de los ids de `params` supera este
+                                       umbral, la consulta se divide en varias peticiones concurrentes cuyas
+                                       respuestas se unen (ver `query_split.fetch_split`), sin usar `stream`.
+                                       Con None no se divide.
+            split_by (dict or list, opcional): Dimensiones por las que dividir la consulta, por ejemplo
+                                               `{"D_TEMPORAL_0": 1}` para una petición por periodo. Si se indica,
+                                               la consulta se divide aunque no supere `max_cells`.
+            **options: Opciones del constructor (`low_memory`, `track_memory`, `log_stats`, `registry`).
+
+        Retorna:
+            APIDataHandler: La clase inicializada con la respuesta de la consulta.
+
+        Ejemplo de uso:
+            >>> handler = APIDataHandler.from_url(url, params = params)
+            >>> handler = APIDataHandler.from_url(url, params = params, stream = True)
+            >>> handler = APIDataHandler.from_url(url, params = params, split_by = {"D_TEMPORAL_0": 1})
+        """
+        client = client if client is not None else http_client.get_default_client()
+        # La descarga se registra como etapa "fetch" y se añade a `stats` de la clase una vez construida
+        fetch_stats = stats.StageStats(client = client, log_json = options.get("log_stats", False), context = {"url": url})
+        if query_split.needs_split(params, max_cells, split_by):
+            with fetch_stats.stage("fetch") as record:
+                json_data = query_split.fetch_split(url, params, client = client,
+                                                    max_cells = max_cells or query_split.DEFAULT_MAX_CELLS,
+                                                    split_by = split_by)
+                record["rows_out"] = len(json_data.get("data") or [])
+            handler = cls.from_json(json_data, hierarchy_cache = hierarchy_cache, client = client, **options)
+            handler.stats.extend(fetch_stats)
+            return handler
+        with fetch_stats.stage("fetch"):
+            response = client.get(url, params = params, stream = stream)
+            response.raise_for_status()
+        if not stream:
+            handler = cls(response, hierarchy_cache = hierarchy_cache, client = client, **options)
+            handler.stats.extend(fetch_stats)
+            return handler
+        try:
+            # En modo `stream` el cuerpo se descarga durante la etapa "parse"
+            handler = cls.from_stream(client.iter_content(response, chunk_size), hierarchy_cache = hierarchy_cache,
+                                      client = client, response = response, **options)
+            handler.stats.extend(fetch_stats)
+            return handler
+        finally:
+            close = getattr(response, "close", None)
+            if close is not None:
+                close()
+
+    @classmethod
+    async def from_url_async(cls, url, params = None, client = None, hierarchy_cache = None, semaphore = None,
+                             max_cells = query_split.DEFAULT_MAX_CELLS, split_by = None, executor = None, **options):
+        """
+        Versión asíncrona de `from_url` para usar la clase dentro de un servicio asyncio.
+
+        Las peticiones no usan E/S asíncrona nativa: se hacen con el cliente HTTP bloqueante (`requests`), cada una
+        en un hilo con `asyncio.to_thread`, de forma que el bucle de eventos puede atender otras consultas mientras
+        tanto. La construcción de la clase a partir del JSON (`from_json`) se ejecuta en `executor`, fuera del bucle.
+
+        Parámetros:
+            url, params, client, hierarchy_cache, max_cells, split_by, **options: Ver `from_url`.
+            semaphore (asyncio.Semaphore, opcional): Limita el número de peticiones simultáneas. Se puede compartir
+                                                     entre varias consultas y con `process_all_hierarchies_async`.
+                                                     Si la consulta se divide, cada parte ocupa una plaza
+                                                     (ver `query_split.fetch_split_async`).
+            executor (concurrent.futures.Executor, opcional): Ejecutor de `from_json`. Por defecto, el del bucle
+                                                              de eventos.
+
+        Retorna:
+            APIDataHandler: La clase inicializada con la respuesta de la consulta.
+
+        Ejemplo de uso:
+            >>> semaphore = asyncio.Semaphore(8)
+            >>> handler = await APIDataHandler.from_url_async(url, params = params, semaphore = semaphore)
+            >>> await handler.process_all_hierarchies_async(semaphore = semaphore)
+        """
+        client = client if client is not None else http_client.get_default_client()
+        fetch_stats = stats.StageStats(client = client, log_json = options.get("log_stats", False), context = {"url": url})
+        with fetch_stats.stage("fetch") as record:
+            if query_split.needs_split(params, max_cells, split_by):
+                json_data = await query_split.fetch_split_async(url, params, client = client,
+                                                                max_cells = max_cells or query_split.DEFAULT_MAX_CELLS,
+                                                                split_by = split_by, semaphore = semaphore)
+            else:
+                async with (semaphore if semaphore is not None else contextlib.nullcontext()):
+                    json_data = await asyncio.to_thread(client.get_json, url, params = params)
+            record["rows_out"] = len(json_data.get("data") or [])
+        loop = asyncio.get_running_loop()
+        handler = await loop.run_in_executor(executor, functools.partial(cls.from_json, json_data,
+                                                                         hierarchy_cache = hierarchy_cache,
+                                                                         client = client, **options))
+        handler.stats.extend(fetch_stats)
+        return handler
 
     def get_elements_of_response(self):
         """
@@ -82,7 +353,7 @@ class APIDataHandler:
             "datos": self.data
         }
     
-    def process_measures_columns(self, df_data):
+    def process_measures_columns(self, df_data, numeric = False):
         """
         Procesa columnas que contienen diccionarios, extrayendo el valor asociado a la clave 'val', 
         y reorganiza dichas columnas para que aparezcan al final del DataFrame.
@@ -94,6 +365,9 @@ class APIDataHandler:
             measures (list of dicts): Lista de nombres de columnas que contienen diccionarios con la clave 'val'.
                              Estas columnas serán procesadas y reordenadas al final del DataFrame.
             self.measures_columns : guarda las columnas de medidas para que el último método muestre el dataset completo ordenado. 
+            numeric (bool, opcional): Si es True, las medidas se guardan como números (`Int64` si todos los valores
+                                      son enteros, `float64` en otro caso) en lugar de texto con coma decimal.
+                                      El formato con coma decimal se aplica al exportar (`save_dataset`).
     
         Retorna:
             pd.DataFrame: El DataFrame modificado, con las columnas `measures` procesadas y reubicadas 
@@ -105,6 +379,8 @@ class APIDataHandler:
                - Si el valor es un diccionario, extrae el valor asociado a la clave `'val'`.
                - Si no es un diccionario, mantiene el valor original.
             3. Reorganiza las columnas del DataFrame para que las incluidas en `measures` aparezcan al final.
+            Con `numeric = True`, el valor 'val' se extrae de toda la columna a la vez y se convierte a número
+            con `functions.to_numeric_measure`, sin pasar por texto.
     
         Ejemplo de uso:
             >>> data = {
@@ -132,7 +408,11 @@ class APIDataHandler:
         for i in range(n_measures):
             col = self.measures[i]["des"]
             measures_des.append(col)
-            if col in df_data.columns:
+            if col in df_data.columns and numeric:
+                # Extraer el valor de la clave 'val' de toda la columna y mantenerlo como número
+                values = frame_builder.extract_key(df_data[col].to_numpy(), "val", len(df_data), keep_other = True)
+                df_data[col] = functions.to_numeric_measure(values).array
+            elif col in df_data.columns:
                 # Extraer el valor de la clave 'val' en cada fila
                 df_data[col] = df_data[col].apply(lambda x: x.get('val') if isinstance(x, dict) else x)
                 # Convertir valores a texto y reemplazar puntos por comas
@@ -145,7 +425,7 @@ class APIDataHandler:
         
         return df_data
     
-    def get_DataFrame_dataJSON(self, process_measures = False):
+    def get_DataFrame_dataJSON(self, process_measures = False, numeric_measures = False):
         """
         Transforma los datos JSON estructurados según las jerarquías en un DataFrame de Pandas,
         añadiendo columnas de códigos (_cod) para las jerarquías y procesando las columnas de medidas
@@ -154,10 +434,14 @@ class APIDataHandler:
         Este método realiza los siguientes pasos:
         1. Construye un DataFrame a partir de los datos estructurados según las jerarquías y las medidas.
         2. Agrega columnas para los códigos de las jerarquías, basándose en los valores 'cod' presentes en los datos.
+           Ambos pasos se realizan por columnas con `frame_builder.ColumnarDataBuilder`, recorriendo `self.data` una sola vez
+           (o directamente desde `self.data_builder` si la consulta se leyó en modo streaming).
         3. Llama a la función `process_measures_columns` para procesar las columnas de medidas y reorganizarlas.
         
         Parámetros:
-            Ninguno.
+            process_measures (bool, opcional): Si es True, procesa las columnas de medidas con `process_measures_columns`.
+            numeric_measures (bool, opcional): Si es True (junto con `process_measures`), las medidas se mantienen
+                                               como columnas numéricas en lugar de texto con coma decimal.
         
         Retorna:
             pd.DataFrame: El DataFrame procesado con las columnas de medidas reorganizadas y las columnas de códigos añadidas.
@@ -199,24 +483,37 @@ class APIDataHandler:
         columnas_medida = [medida["des"] for medida in self.measures]
         columnas = columnas_jerarquia + columnas_medida
 
-        # Crear el DataFrame de los datos
-        try:
-            df = pd.DataFrame(self.data, columns=columnas)
-        except Exception as e:
-            print(f'Consulta sin datos - {self.id_consulta}')
-            raise e
+        if self.data is None and self.data_builder is None:
+            raise ValueError("Los datos de la consulta ya se han liberado (modo low_memory)")
 
-        # Agregar columnas de códigos
-        col_to_cod = [col for col in columnas if col not in columnas_medida]
-        col_cod = [col + "_cod" for col in col_to_cod]
+        with self._stage("dataframe") as record:
+            # Crear el DataFrame de los datos junto con las columnas de códigos, trasponiendo las filas
+            # una única vez en lugar de extraer el 'cod' celda a celda sobre un DataFrame de diccionarios.
+            try:
+                builder = self.data_builder
+                if builder is None:
+                    builder = frame_builder.ColumnarDataBuilder()
+                    builder.extend(self.data)
+                record["rows_in"] = builder.n_rows
+                df = builder.to_frame(columnas_jerarquia, columnas_medida)
+            except Exception as e:
+                print(f'Consulta sin datos - {self.id_consulta}')
+                raise e
+            del builder
 
-        for c, c_c in zip(col_to_cod, col_cod):
-            df[c_c] = df[c].apply(lambda x: x["cod"] if isinstance(x, dict) and "cod" in x else None)
-        
-        if process_measures:
-            df = self.process_measures_columns(df)
+            # Las filas ya están en el DataFrame: en modo `low_memory` se liberan
+            if self.low_memory:
+                self.data = None
+                self.data_builder = None
+                self.JSONdata.pop("data", None)
+
+            if process_measures:
+                with self._stage("measures", memory = False, rows_in = len(df)) as measures_record:
+                    df = self.process_measures_columns(df, numeric = numeric_measures)
+                    measures_record["rows_out"] = len(df)
+            record["rows_out"] = len(df)
         
-        self.logger.info('Datos Transformados a DataFrame Correctamente')
+        self.logger.info(f'Datos Transformados a DataFrame Correctamente ({len(df)} filas en {record["wall_seconds"]:.2f} s)')
         self.df_data = df
         return df
     
@@ -228,16 +525,59 @@ class APIDataHandler:
         Hay jerarquías de la EPA que tiene una codificación para el TOTAL que no necesitamos para el mapeo y 
         también debemos eliminar. 
         """
-        return [item for item in cod_combination if item not in ["Total", "TOTAL", "P1_00"]]
+        return [item for item in cod_combination if item not in hierarchy_flatten.TOTAL_CODES]
 
     @staticmethod
-    def request_hierarchies_values(hierarchy_element):
+    def request_hierarchies_values(hierarchy_element, cache = None, client = None):
         """
         Realiza una solicitud a la URL de una jerarquía específica para obtener sus valores.
+
+        Si se indica `cache` (`http_cache.HTTPCache`), la respuesta se sirve desde disco mientras
+        esté vigente y se revalida con una petición condicional (ETag/Last-Modified) al caducar.
+        La petición se realiza con `client` (`http_client.BADEAClient`) o, si es None, con el
+        cliente compartido del proceso.
+
+        Retorna:
+            hierarchy_registry.HierarchyPayload: El JSON de la respuesta (un `dict`) con el hash de su cuerpo
+                                                 en `digest`, con el que se consulta el registro de jerarquías.
         """
         url = hierarchy_element.get("url")
-        response = requests.get(url)
-        return response.json()
+        client = client if client is not None else http_client.get_default_client()
+        if cache is not None:
+            return hierarchy_registry.HierarchyPayload.from_body(cache.get_body(url, get = client.get))
+        response = client.get(url)
+        response.raise_for_status()
+        return hierarchy_registry.HierarchyPayload.from_body(response.content)
+
+    def request_all_hierarchies_values(self, max_workers = None):
+        """
+        Solicita los valores de todas las jerarquías de la consulta, de forma secuencial o concurrente.
+
+        Parámetros:
+            max_workers (int, opcional): Número de hilos con los que se descargan las urls de las jerarquías
+                                         en paralelo. Si es None o 1, las jerarquías se solicitan una a una.
+
+        Retorna:
+            list: Respuestas JSON de cada jerarquía, en el mismo orden que `self.hierarchies`.
+
+        Notas:
+            - Las descargas son operaciones de red, por lo que varios hilos permiten solapar los tiempos
+              de espera de cada petición sin necesidad de varios procesos.
+            - `ThreadPoolExecutor.map` conserva el orden de entrada, de forma que `hierarchies_info_df`
+              sigue siendo determinista independientemente del orden en que terminen las peticiones.
+        """
+        hierarchies = self.hierarchies
+
+        def request(hier):
+            with self._stage("hierarchy_fetch", memory = False, alias = hier.get("alias")):
+                return self.request_hierarchies_values(hier, cache = self.hierarchy_cache, client = self.client)
+
+        if not max_workers or max_workers <= 1 or len(hierarchies) <= 1:
+            return [request(hier) for hier in hierarchies]
+
+        self.logger.info(f'Solicitando {len(hierarchies)} jerarquías con {max_workers} hilos')
+        with ThreadPoolExecutor(max_workers = min(max_workers, len(hierarchies))) as executor:
+            return list(executor.map(request, hierarchies))
 
     def process_hierarchy_level(self, alias, node, cod_combination=None, descriptions=None, level=1):
         """
@@ -292,6 +632,8 @@ class APIDataHandler:
             - El método se llama recursivamente para procesar todos los niveles de la jerarquía.
             - Las combinaciones de códigos y descripciones se acumulan a medida que se desciende por los niveles de jerarquía.
             - Este método actualiza la lista `self.result_rows`, que debe estar previamente definida en la clase.
+            - `process_all_hierarchies` ya no utiliza este método, sino el recorrido iterativo de
+              `hierarchy_flatten.flatten_hierarchy`. Se mantiene para procesar jerarquías sueltas.
         """
         if cod_combination is None:
             cod_combination = []
@@ -321,17 +663,76 @@ class APIDataHandler:
             for child in node["children"]:
                 self.process_hierarchy_level(alias, child, current_cod_combination, current_descriptions, level + 1)
 
-    def process_all_hierarchies(self):
+    async def request_all_hierarchies_values_async(self, semaphore = None, max_concurrency = 8):
+        """
+        Versión asíncrona de `request_all_hierarchies_values`: solicita todas las jerarquías desde el bucle de eventos,
+        con como máximo `max_concurrency` peticiones simultáneas (o las que permita `semaphore`, si se indica).
+        Cada petición se hace con el cliente bloqueante en un hilo (`asyncio.to_thread`), no con E/S asíncrona nativa.
+
+        Retorna:
+            list: Respuestas JSON de cada jerarquía, en el mismo orden que `self.hierarchies`.
+        """
+        semaphore = semaphore if semaphore is not None else asyncio.Semaphore(max_concurrency)
+
+        def fetch(hier):
+            with self._stage("hierarchy_fetch", memory = False, alias = hier.get("alias")):
+                return self.request_hierarchies_values(hier, cache = self.hierarchy_cache, client = self.client)
+
+        async def request(hier):
+            async with semaphore:
+                return await asyncio.to_thread(fetch, hier)
+
+        return list(await asyncio.gather(*(request(hier) for hier in self.hierarchies)))
+
+    async def process_all_hierarchies_async(self, semaphore = None, max_concurrency = 8, executor = None, prune = False):
+        """
+        Versión asíncrona de `process_all_hierarchies`: descarga las jerarquías con
+        `request_all_hierarchies_values_async` y las aplana en `executor` (por defecto, el del bucle de eventos),
+        sin bloquear el bucle. `prune` como en `process_all_hierarchies`.
+
+        Retorna:
+            pd.DataFrame: El DataFrame de las jerarquías (`self.hierarchies_info_df`).
+        """
+        hierarchy_values = await self.request_all_hierarchies_values_async(semaphore, max_concurrency)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, functools.partial(self.process_all_hierarchies,
+                                                                      hierarchy_values = hierarchy_values,
+                                                                      prune = prune))
+
+    async def get_DataFrame_dataJSON_async(self, process_measures = False, numeric_measures = False, executor = None):
+        """
+        Ejecuta `get_DataFrame_dataJSON` en `executor` (por defecto, el del bucle de eventos) sin bloquear el bucle.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, functools.partial(self.get_DataFrame_dataJSON, process_measures,
+                                                                      numeric_measures))
+
+    async def map_data_w_hierarchies_info_async(self, executor = None, layout = "wide"):
+        """
+        Ejecuta `map_data_w_hierarchies_info` en `executor` (por defecto, el del bucle de eventos) sin bloquear el bucle.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, functools.partial(self.map_data_w_hierarchies_info, layout))
+
+    def process_all_hierarchies(self, max_workers = None, hierarchy_values = None, prune = False):
         """
         Función principal para procesar todas las jerarquías y devolver el DataFrame limpio.
     
         Este método recorre todas las jerarquías definidas en `self.hierarchies`, procesa cada una de ellas
-        utilizando la función `process_hierarchy_level` para desglosar los diferentes niveles de jerarquía, 
+        aplanando sus niveles con una pila explícita (sin recursión ni copias de listas por nivel), 
         y almacena los resultados en un DataFrame estructurado. Además, se limpia la columna 'COD_combination' 
         para eliminar valores como 'Total' o 'TOTAL', y guarda el DataFrame final como un atributo de la clase.
     
         Parámetros:
-            Ninguno. El método utiliza los atributos internos de la clase (`self.hierarchies` y `self.result_rows`).
+            max_workers (int, opcional): Número de hilos para descargar las jerarquías en paralelo
+                                         (ver `request_all_hierarchies_values`). Por defecto, secuencial.
+            hierarchy_values (list, opcional): Respuestas JSON de las jerarquías ya descargadas, en el orden de
+                                               `self.hierarchies` (como las devuelve `request_all_hierarchies_values`).
+                                               Si se indican, no se realiza ninguna petición.
+            prune (bool, opcional): Si es True, solo se aplanan los nodos que aparecen en los datos de la consulta
+                                    y sus antecesores: se recogen las combinaciones de códigos distintas de cada
+                                    columna `_cod` de `self.df_data` y las ramas del árbol que no llevan a ninguna
+                                    de ellas no se recorren. Requiere haber llamado antes a `get_DataFrame_dataJSON`.
     
         Retorna:
             pd.DataFrame: Un DataFrame que contiene los resultados procesados de todas las jerarquías,
@@ -339,12 +740,19 @@ class APIDataHandler:
     
         Funcionalidad:
             1. Recorre todas las jerarquías definidas en `self.hierarchies`.
-            2. Para cada jerarquía, obtiene los datos relacionados a través de `request_hierarchies_values`.
-            3. Verifica si los datos obtenidos son un diccionario, y en ese caso, llama a `process_hierarchy_level`
-               para procesar los niveles de jerarquía de forma recursiva.
-            4. Los resultados de todos los niveles de jerarquía se almacenan en `self.result_rows`.
-            5. Al final, los datos procesados se convierten en un DataFrame y se limpia la columna 'COD_combination'
-               eliminando valores no deseados como 'Total' y 'TOTAL'.
+            2. Obtiene los datos de todas las jerarquías a través de `request_all_hierarchies_values`,
+               de forma concurrente si se indica `max_workers`.
+            3. Verifica si los datos obtenidos son un diccionario, y en ese caso, recorre el árbol de forma iterativa
+               con `hierarchy_flatten.flatten_hierarchy`, que escribe los nodos en búferes por columnas
+               (posición del padre, nivel, código, descripción e id).
+            4. Los nodos aplanados de cada jerarquía se almacenan en `self.hierarchy_nodes` y se indexan en
+               `self.hierarchy_index` (`hierarchy_index.HierarchyIndex`, un índice por alias), que es lo que
+               consultan el mapeo y la exportación de las jerarquías. Con el registro de jerarquías (`self.registry`),
+               si otra consulta del proceso ya indexó una jerarquía con el mismo contenido, se reutiliza su índice
+               sin aplanarla: las jerarquías descargadas se buscan en el registro por el hash del cuerpo de su
+               respuesta antes de aplanarlas.
+            5. Al final, las combinaciones de códigos (sin valores como 'Total' y 'TOTAL') y las columnas Des1, Des2, etc.
+               se derivan de los búferes y se construye el DataFrame.
             6. El DataFrame final se guarda como el atributo `self.hierarchies_info_df`.
     
         Ejemplo de uso:
@@ -357,63 +765,228 @@ class APIDataHandler:
             - Este método depende de la función `request_hierarchies_values` para obtener los datos
               correspondientes a cada jerarquía. Los datos deben estar en un formato adecuado.
             - La columna 'COD_combination' es limpiada para asegurar que no contenga valores como 'Total' o 'TOTAL'.
-            - El método modifica el atributo `self.hierarchies_info_df` con el DataFrame final.
+            - Con `prune = True`, `hierarchies_info_df` solo contiene los nodos usados por los datos, y el mapeo da el
+              mismo resultado. Los índices podados son propios de la consulta, por lo que no se guardan en el registro.
+            - El método modifica el atributo `self.hierarchies_info_df` con el DataFrame final. En modo `low_memory`
+              solo se conservan los índices y la tabla se vuelve a construir a partir de ellos cuando se pide.
             - La estructura del DataFrame resultante incluye las combinaciones de códigos y descripciones
               correspondientes a cada jerarquía procesada.
         """
         hierarchies = self.hierarchies
-        self.result_rows = []
-
-        # Procesar cada jerarquía
-        for hier in hierarchies:
-            alias = hier["alias"]
-            example_data = self.request_hierarchies_values(hier)
-            parent_data = example_data["data"]
+        if prune and getattr(self, "df_data", None) is None:
+            raise ValueError("Para podar las jerarquías hay que construir antes df_data (get_DataFrame_dataJSON)")
 
-            # Confirma que parent_data es un diccionario y lo pasa directamente
-            if isinstance(parent_data, dict):
-                self.process_hierarchy_level(alias, parent_data)
+        with self._stage("hierarchies") as record:
+            # Descargar los valores de todas las jerarquías (en el orden de `self.hierarchies`)
+            if hierarchy_values is not None:
+                hierarchies_values = list(hierarchy_values)
             else:
-                print(f"parent_data no es un diccionario: {parent_data}")
+                hierarchies_values = self.request_all_hierarchies_values(max_workers)
 
-        # Convertir la lista de resultados en un DataFrame final
-        df = pd.DataFrame(self.result_rows)
+            # Aplanar cada jerarquía en búferes por columnas e indexarla
+            indexes = {}
+            for hier, example_data in zip(hierarchies, hierarchies_values):
+                alias = hier["alias"]
+                parent_data = example_data["data"]
+
+                # Confirma que parent_data es un diccionario y lo pasa directamente
+                if isinstance(parent_data, dict):
+                    with self._stage("hierarchy_flatten", memory = False, alias = alias) as flatten_record:
+                        keep = None
+                        if prune and alias + "_cod" in self.df_data.columns:
+                            # Nodos observados en los datos y sus antecesores
+                            keep = hierarchy_flatten.observed_prefixes(self.df_data[alias + "_cod"])
+                        flatten_record["pruned"] = keep is not None
+                        # Con el registro, una jerarquía con el mismo contenido ya indexada se reutiliza sin aplanarla:
+                        # las descargadas se buscan por el hash de su respuesta y las demás por el de sus nodos
+                        digest = getattr(example_data, "digest", None)
+                        index = None
+                        if self.registry is not None and keep is None and digest is not None:
+                            index = self.registry.lookup(alias, digest)
+                            flatten_record["cached"] = index is not None
+                        if index is None:
+                            nodes = hierarchy_flatten.flatten_hierarchy(parent_data, keep = keep)
+                            if self.registry is not None and keep is None:
+                                index, flatten_record["cached"] = self.registry.get(alias, nodes, digest)
+                            else:
+                                index = hierarchy_index.HierarchyIndex(alias, nodes)
+                        flatten_record["rows_out"] = len(index)
+                    indexes[alias] = index
+                else:
+                    print(f"parent_data no es un diccionario: {parent_data}")
+            del hierarchies_values
+
+            # Construir el DataFrame final; 'COD_combination' se genera ya sin 'Total' y 'TOTAL'
+            df = hierarchy_index.hierarchies_frame(indexes.values())
+            record["rows_out"] = len(df)
+            # En modo `low_memory` no se conservan los nodos aplanados ni la tabla, que se derivan de los índices
+            self.hierarchy_nodes = None if self.low_memory else [(alias, index.nodes()) for alias, index in indexes.items()]
 
-        # Limpiar la columna 'COD_combination' para eliminar 'Total' y 'TOTAL'
-        df["COD_combination"] = df["COD_combination"].apply(self.clean_cod_combination)
-        
         # Guardarlo como atributo
-        self.hierarchies_info_df = df
+        self.hierarchy_index = indexes
+        self.hierarchies_info_df = None if self.low_memory else df
 
         # Devolver el DataFrame limpio
         return df
 
-    def save_hierarchies_level(self, path, level = None):
+    def save_hierarchies_level(self, path, level = None, by_sheet = False, batch_size = 10000, sep = ";"):
         """
         Método para guardar la tabla de desagregación y aplanamiento de jerarquías.
         Si `level` está vacío, guarda la tabla completa. Si contiene un valor, 
         guarda solo las filas correspondientes al nivel especificado.
-        Si la tabla `hierarchies_info_df` no existe o está vacía, llama al método 
-        `process_all_hierarchies` para generarla.
+        Si las jerarquías no se han procesado, llama al método `process_all_hierarchies` para generarlas.
+        Las filas de cada jerarquía se obtienen de su índice (`self.hierarchy_index`), sin filtrar la tabla completa.
+
+        Las filas se escriben por lotes (`writers`), sin construir el libro completo en memoria.
 
         Parámetros:
-            path (str): Ruta donde se guardará el archivo Excel.
+            path (str): Ruta donde se guardará el archivo. Con extensión `.xlsx` se guarda en Excel; con `.tsv`,
+                        separado por tabuladores; en otro caso, CSV separado por `sep`.
             level (str, opcional): Nivel de jerarquía a filtrar. Si es None, se guarda la tabla completa.
+            by_sheet (bool, opcional): Si es True, cada jerarquía se guarda en su propia hoja del libro (con el alias
+                                       como nombre y sin las columnas Des vacías), en una sola pasada. En CSV/TSV,
+                                       cada jerarquía se guarda en un fichero `<nombre>_<alias>.<extensión>`.
+            batch_size (int, opcional): Número de filas que se escriben en cada lote.
+            sep (str, opcional): Separador de columnas del CSV.
+
+        Retorna:
+            list of str: Hojas escritas (Excel) o ficheros escritos (CSV/TSV).
+
+        Ejemplo de uso:
+            >>> handler.save_hierarchies_level("jerarquias.xlsx", by_sheet = True)
+            ['D_SEXO_0', 'D_TEMPORAL_0', 'D_AA_TERRITROIO_0']
         """
-        # Verificar si la tabla de jerarquías existe y está llena
-        if not hasattr(self, 'hierarchies_info_df') or self.hierarchies_info_df.empty:
+        # Verificar si las jerarquías se han procesado
+        if not self.hierarchy_index:
             print("La tabla de jerarquías no está disponible o está vacía. Procesando jerarquías...")
             self.process_all_hierarchies()
 
-        # Trabajar con la tabla procesada
-        df_hier = self.hierarchies_info_df
+        # Seleccionar la jerarquía indicada en `level` o todas
+        indexes = [index for alias, index in self.hierarchy_index.items() if not level or alias == level]
+        if not level:
+            df_hier = self.hierarchies_info_df
+        else:
+            n_levels = max(int(index.depth.max()) for index in self.hierarchy_index.values())
+            df_hier = hierarchy_index.hierarchies_frame(indexes, n_levels)
+
+        sheets = self._hierarchy_sheets(indexes) if by_sheet else [("Sheet1", df_hier)]
+        if path.lower().endswith(".xlsx"):
+            return writers.write_xlsx(path, sheets, batch_size = batch_size)
 
-        # Filtrar por nivel si se proporciona
-        if level:
-            df_hier = df_hier[df_hier['Variable'] == level]
+        sep = "\t" if path.lower().endswith(".tsv") else sep
+        if not by_sheet:
+            return [writers.write_delimited(path, df_hier, sep = sep, batch_size = batch_size)]
+        root, extension = os.path.splitext(path)
+        return [writers.write_delimited(f"{root}_{alias}{extension}", df, sep = sep, batch_size = batch_size)
+                for alias, df in sheets]
 
-        # Guardar el resultado en Excel
-        df_hier.to_excel(path, index=False)
+    def _hierarchy_sheets(self, indexes):
+        """
+        Tabla de cada jerarquía por separado, en su orden, con tantas columnas Des como niveles tiene la jerarquía.
+        """
+        for index in indexes:
+            yield index.alias, index.frame()
+
+    def save_dataset(self, path, dataset = None, decimal_comma = True, sep = ";", batch_size = 10000):
+        """
+        Método para exportar el conjunto de datos a Excel o CSV/TSV según la extensión de `path`.
+
+        Es el paso de exportación del modo de medidas numéricas: las medidas se mantienen como números
+        durante todo el procesamiento y el formato con coma decimal solo se aplica al escribir el fichero.
+        Las filas se escriben por lotes de `batch_size` (`writers`), sin copiar ni convertir la tabla completa.
+
+        Parámetros:
+            path (str): Ruta del fichero. Con extensión `.xlsx` se guarda en Excel; con `.tsv`, separado por
+                        tabuladores; en otro caso, CSV separado por `sep`.
+            dataset (pd.DataFrame, opcional): Datos a exportar. Por defecto `self.df_data_mapped` si existe,
+                                              o `self.df_data` en otro caso.
+            decimal_comma (bool, opcional): Si es True, las medidas numéricas se escriben con coma decimal.
+            sep (str, opcional): Separador de columnas del CSV. Por defecto ';', habitual con coma decimal.
+            batch_size (int, opcional): Número de filas que se escriben en cada lote.
+
+        Ejemplo de uso:
+            >>> handler.get_DataFrame_dataJSON(process_measures = True, numeric_measures = True)
+            >>> handler.process_all_hierarchies()
+            >>> handler.map_data_w_hierarchies_info()
+            >>> handler.save_dataset("autonomos.csv")
+        """
+        if dataset is None:
+            dataset = self.df_data_mapped if getattr(self, 'df_data_mapped', None) is not None else self.df_data
+
+        if path.lower().endswith(".xlsx"):
+            transform = None
+            if decimal_comma:
+                measure_columns = self._measure_columns_in(dataset)
+                transform = functools.partial(functions.format_decimal_comma, columns = measure_columns)
+            writers.write_xlsx(path, [("Sheet1", dataset)], batch_size = batch_size, transform = transform)
+        else:
+            sep = "\t" if path.lower().endswith(".tsv") else sep
+            writers.write_delimited(path, dataset, sep = sep, decimal = "," if decimal_comma else ".",
+                                    batch_size = batch_size)
+
+    def export_tables(self, directory, file_format = "parquet", tables = ("df_data_mapped", "df_data", "hierarchies_info_df"),
+                      compression = None):
+        """
+        Exporta las tablas de la consulta a Parquet o Arrow IPC, con las columnas de descripciones
+        de las jerarquías codificadas como diccionario.
+
+        Parámetros:
+            directory (str): Directorio de destino. Se crea si no existe.
+            file_format (str, opcional): "parquet" (por defecto) o "arrow" (Arrow IPC / Feather v2).
+            tables (iterable of str, opcional): Atributos a exportar. Los que no existan o se hayan liberado
+                                                (modo `low_memory`) se omiten.
+            compression (str, opcional): Compresión del fichero (ver `export.write_table`).
+
+        Retorna:
+            dict: Ruta del fichero escrito para cada tabla, `<directorio>/<id_consulta>_<tabla>.<extensión>`.
+
+        Ejemplo de uso:
+            >>> handler.map_data_w_hierarchies_info()
+            >>> handler.export_tables("salida")
+            {'df_data_mapped': 'salida/44804_df_data_mapped.parquet', ...}
+
+        Notas:
+            - Requiere `pyarrow`. Las tablas se pueden volver a cargar con `export.read_table`.
+            - Las celdas de `df_data` con diccionarios de BADEA se guardan como su descripción (`des`) o valor
+              (`val`), y las combinaciones de códigos como listas de texto.
+        """
+        extension = {"parquet": ".parquet", "arrow": ".arrow"}.get(file_format)
+        if extension is None:
+            raise ValueError(f"Formato no soportado '{file_format}'. Use 'parquet' o 'arrow'.")
+        os.makedirs(directory, exist_ok = True)
+
+        paths = {}
+        for name in tables:
+            df = getattr(self, name, None)
+            if df is None:
+                continue
+            measure_columns = self._measure_columns_in(df)
+            path = os.path.join(directory, f"{self.id_consulta}_{name}{extension}")
+            self.logger.info(f'Exportando {name} a {path}')
+            paths[name] = export.write_table(df, path, export.description_columns(df, measure_columns), compression,
+                                             measure_columns = measure_columns)
+        return paths
+
+    def _measure_labels_in(self, dataset):
+        """
+        Columna de cada medida presente en `dataset` (con su nombre original o normalizado) y su descripción.
+        """
+        columns, labels = [], []
+        for medida in self.measures:
+            for name in (medida["des"], functions.clean_text(medida["des"])):
+                if name in dataset.columns:
+                    columns.append(name)
+                    labels.append(medida["des"])
+                    break
+        return columns, labels
+
+    def _measure_columns_in(self, dataset):
+        """
+        Columnas de medidas presentes en `dataset`, con su nombre original o normalizado, o `OBS_VALUE` en formato largo.
+        """
+        names = [medida["des"] for medida in self.measures]
+        names += [functions.clean_text(name) for name in names] + [frame_builder.OBS_VALUE]
+        return [col for col in dict.fromkeys(names) if col in dataset.columns]
     
     def union_by_cod_combination(self, df1_data, df2_hier, col1, col2):
         """
@@ -434,10 +1007,9 @@ class APIDataHandler:
             pd.DataFrame: El DataFrame resultante después de la unión y limpieza de columnas.
     
         Funcionalidad:
-            1. Preprocesa las columnas de los DataFrames (`col1` y `col2`) para asegurarse
-               de que los valores sean cadenas compatibles con el proceso de unión.
-               Si los valores son listas, se convierten en una cadena separada por comas.
-            2. Realiza la unión de los DataFrames utilizando un `merge` con la columna correspondiente.
+            1. Codifica las columnas de los DataFrames (`col1` y `col2`) como claves enteras compatibles
+               con el proceso de unión. Dos combinaciones coinciden si tienen los mismos códigos en el mismo orden.
+            2. Realiza la unión de los DataFrames utilizando un `merge` con la clave entera.
             3. Elimina las columnas que están completamente vacías (`NaN` o `None`).
             4. Remueve columnas específicas como el código de jerarquía (`alias+"_cod"`) y la columna común de combinación (`COD_combination`).
     
@@ -457,25 +1029,32 @@ class APIDataHandler:
             1    200   Region B
     
         Notas:
-            - Para evitar problemas de modificaciones no deseadas en los DataFrames originales,
-              se recomienda pasar copias de los mismos o asegurarse de que las modificaciones son esperadas.
+            - Los DataFrames de entrada no se modifican.
+            - Las combinaciones de códigos se internan como enteros (`functions.intern_cod_paths`): el diccionario
+              combinación -> entero se construye una vez con la tabla de la jerarquía y la unión se realiza sobre
+              columnas `int64`, en lugar de convertir cada lista a texto en ambos DataFrames.
             - Requiere que las columnas especificadas existan en ambos DataFrames.
         """
-        # Procesamos las columnas que van a hacer la unión para que python las entienda y pueda encontrar sus coincidencias.
-        for df, col in zip([df1_data, df2_hier], [col1, col2]):
-            df[col] = df[col].apply(lambda x: ", ".join(x) if isinstance(x, list) else str(x))
-        result = pd.merge(df1_data, df2_hier, left_on = col1, right_on= col2, how = 'left')
+        # Internamos las combinaciones de códigos: cada combinación distinta de la jerarquía recibe un entero
+        # y las de los datos que no existen en la jerarquía reciben -1, por lo que no encuentran coincidencia.
+        codes = {}
+        hier_keys = functions.intern_cod_paths(df2_hier[col2], codes)
+        data_keys = functions.intern_cod_paths(df1_data[col1], codes, add = False)
+
+        key = "__cod_key__"
+        left = df1_data.drop(columns = [col1]).assign(**{key: data_keys})
+        right = df2_hier.drop(columns = [col2]).assign(**{key: hier_keys})
+        result = pd.merge(left, right, on = key, how = 'left').drop(columns = [key])
         
         # Eliminar las columnas que no tienen valores porque la jerarquía 
         # no utiliza todas las desagregaciones en el dato de consulta
         result = result.dropna(axis = 1, how = "all")
-        # df de datos sin la columna de codificación correspondiente
-        result = functions.remove_column(result, col1)
         # Borramos las columnas comunes cuando se unen todas las jerarquías "COD_COMBINATION"
-        result = functions.remove_column(result, "COD_combination")
+        if "COD_combination" in result.columns:
+            result = result.drop(columns = ["COD_combination"])
         return result
     
-    def map_data_w_hierarchies_info(self):
+    def map_data_w_hierarchies_info(self, layout = "wide"):
         """
         Mapea los datos del conjunto de datos original (`self.dataset`) con la información de las jerarquías 
         (`self.hierarchies_info_df`) para integrar los valores jerárquicos dentro del DataFrame de medidas 
@@ -486,7 +1065,9 @@ class APIDataHandler:
         de jerarquía. Al final, genera un DataFrame mapeado que incluye tanto los datos originales como los valores jerárquicos.
     
         Parámetros:
-            Ninguno. El método utiliza los atributos de la clase (`self.dataset`, `self.measures`, `self.hierarchies_info_df`).
+            layout (str, opcional): "wide" (por defecto), con una columna por medida, o "long", con una fila por
+                                    observación y medida (columnas `INDICATOR` y `OBS_VALUE`, ver `to_long_format`).
+            El método utiliza los atributos de la clase (`self.dataset`, `self.measures`, `self.hierarchies_info_df`).
     
         Retorna:
             pd.DataFrame: Un DataFrame con los datos originales mapeados con la información de las jerarquías, 
@@ -496,66 +1077,292 @@ class APIDataHandler:
             1. Normaliza los nombres de las columnas en `self.dataset` utilizando la función `functions.norm_columns_name`.
             2. Prepara el nombre de las columnas de las medidas de acuerdo con las descripciones de `self.measures`.
             3. Filtra las columnas relevantes para el análisis, incluyendo las columnas de códigos (`_cod`) y las medidas.
-            4. Prepara la información de las jerarquías para cada nivel, extrayendo los nombres de las columnas de descripciones
-               y filtrando la información correspondiente de `self.hierarchies_info_df`.
-            5. Mapea las columnas de códigos de jerarquía con los valores jerárquicos en `self.hierarchies_info_df`, 
-               renombrando las columnas de descripción y uniendo los DataFrames de acuerdo con los códigos de combinación.
-            6. Al final, devuelve el DataFrame mapeado que incluye tanto los códigos como las descripciones jerárquicas.
+            4. Construye una tabla de búsqueda por jerarquía (`build_hierarchy_lookups`) con su índice
+               (`self.hierarchy_index`) y las columnas de descripciones ya renombradas.
+            5. Localiza, para cada jerarquía, el nodo de cada dato a partir de su columna `_cod` con una búsqueda en
+               el índice y toma sus descripciones por posición, descartando las columnas que quedan vacías según la
+               tabla de búsqueda.
+            6. Crea el DataFrame final una única vez con las descripciones jerárquicas de todas las jerarquías y las medidas.
+            7. Con `layout = "long"`, apila las medidas en formato largo (`frame_builder.long_frame`).
     
         Ejemplo de uso:
             >>> handler.map_data_w_hierarchies_info()
+            >>> handler.map_data_w_hierarchies_info(layout = "long")
             >>> print(handler.df_data_mapped)
             # El DataFrame resultante contendrá las columnas de medidas y códigos, con las descripciones jerárquicas mapeadas.
     
         Notas:
             - El proceso depende de las columnas de códigos (que terminan en '_cod') y las medidas que se definen en `self.measures`.
-            - La información de las jerarquías se extrae de `self.hierarchies_info_df` y se mapea a las columnas de códigos.
+            - La información de las jerarquías se extrae de `self.hierarchy_index`, sin construir ni filtrar
+              `self.hierarchies_info_df`, y se mapea a las columnas de códigos.
             - El DataFrame resultante contiene tanto las columnas originales como las nuevas columnas con las descripciones jerárquicas.
             - El método genera y guarda el DataFrame mapeado como el atributo `self.df_data_mapped`.
         """
-        # Preparar la tabla de datos para el mapeo.
-        self.df_data = functions.norm_columns_name(self.df_data)
-        n_medidas = len(self.measures)
-            # Generar nombre normalizado para las columnas de medidas 
-        if n_medidas == 1: 
-            col_medida = [functions.clean_text(self.measures[0]["des"])]
-        else:
-            col_medida = [functions.clean_text(self.measures[i]["des"]) for i in range(n_medidas)]
-        
-        # Disminuir la información del dataset para ahorrar coste computacional, 
-        # filtrando por las columnas que nos interesan para el análisis. 
-        cod_columns = self.df_data.filter(regex='_cod$').columns.tolist()
-        selected_columns = cod_columns + col_medida
-        cod_df = self.df_data[selected_columns].copy()
-        
-        # Preparación de la información de las jerarquías
-# =============================================================================
-#         if self.hierarchies_info_df.empty(): 
-#             self.process_all_hierarchies()
-# =============================================================================
-            
-        hierarchies_used = pd.unique(self.hierarchies_info_df.Variable)
-        name_cols = [re.search(r'D(?:_AA)?_(.*?)_0', elem).group(1) for elem in hierarchies_used]
+        if layout not in ("wide", "long"):
+            raise ValueError(f"Formato no soportado '{layout}'. Use 'wide' o 'long'.")
+
+        with self._stage("mapping") as record:
+            # Preparar la tabla de datos para el mapeo.
+            self.df_data = functions.norm_columns_name(self.df_data)
+            n_medidas = len(self.measures)
+                # Generar nombre normalizado para las columnas de medidas 
+            if n_medidas == 1: 
+                col_medida = [functions.clean_text(self.measures[0]["des"])]
+            else:
+                col_medida = [functions.clean_text(self.measures[i]["des"]) for i in range(n_medidas)]
         
-        # esas columnas de codificación de jerarquía serán mapeadas según la jerarquía con la tabla hierarchies_info_df.
-        for alias, col in zip(hierarchies_used, name_cols):
-            # Filtramos toda la información de las jerarquías según la que nos encontremos mapeando
-            hier_df_values = self.hierarchies_info_df[self.hierarchies_info_df["Variable"] == alias].copy()
-                # En el proceso de mapeo no necesitamos las columnas "Variable" ni "id" porque no aportan información al conjunto de datos. 
-            columns_to_keep = hier_df_values.columns.difference(["Variable", "id"])
-            hier_df_values = hier_df_values[columns_to_keep]
-                # Renombramos las columnas de valores categóricos para que queden organizadas según la jerarquía. 
-            cols_to_rename = hier_df_values.filter(regex = r'^Des\d+$').columns
-            rename_dict = {col_name : col_name.replace('Des', col) for col_name in cols_to_rename}
-            hier_df_values = hier_df_values.rename(columns = rename_dict)
-            
-            # Unión del conjunto de datos por "COD_combination" en la tabla de valores de jerarquías y por la columna "_cod" correspondiente a la jerarquía
-            cod_df = self.union_by_cod_combination(cod_df, hier_df_values, alias + "_cod", "COD_combination")
-            
-        remaining_col = [col for col in cod_df.columns if col not in self.measure_columns]
-        cod_df = cod_df[remaining_col + self.measure_columns]
-        self.df_data_mapped = cod_df.copy()
+            # Tablas de búsqueda de cada jerarquía: combinación de códigos -> fila con sus descripciones.
+            lookups = self.build_hierarchy_lookups()
+            n_rows = len(self.df_data)
+            record["rows_in"] = n_rows
+
+            # Columnas de la tabla final: se calculan todas antes de crear el DataFrame, que se reserva una única vez.
+            # Las columnas de códigos que no corresponden a ninguna jerarquía procesada se conservan delante.
+            cod_columns = self.df_data.filter(regex='_cod$').columns.tolist()
+            mapped_cod_columns = {alias + "_cod" for alias in lookups}
+            output = {}
+            for col in cod_columns:
+                if col not in mapped_cod_columns and self.df_data[col].notna().any():
+                    output[col] = self.df_data[col].array
+
+            for alias, lookup in lookups.items():
+                with self._stage("mapping_merge", memory = False, alias = alias, rows_in = n_rows) as merge_record:
+                    # Posición de la fila de la jerarquía que corresponde a cada dato (-1 si no tiene correspondencia)
+                    positions = lookup["index"].find_paths(self.df_data[alias + "_cod"])
+                    matched = np.unique(positions[positions >= 0])
+                    for col_name, values in lookup["columns"].items():
+                        # Las columnas de descripciones vacías para todas las filas usadas se descartan
+                        # consultando solo la tabla de búsqueda, sin recorrer los datos.
+                        if pd.notna(values.take(matched)).any():
+                            output[col_name] = values.take(positions, allow_fill = True)
+                    # Filas de datos con correspondencia en la jerarquía
+                    merge_record["rows_out"] = int((positions >= 0).sum())
+
+            for col in col_medida:
+                output[col] = self.df_data[col].array
+
+            cod_df = pd.DataFrame(output, index = pd.RangeIndex(n_rows), copy = False)
+            del output, lookups
+            if layout == "long":
+                cod_df = self.to_long_format(cod_df)
+            record["rows_out"] = len(cod_df)
+            if self.low_memory:
+                # Sin copia defensiva: el DataFrame devuelto es el propio atributo, y `df_data` ya está consumido
+                self.df_data_mapped = cod_df
+                self.df_data = None
+            else:
+                self.df_data_mapped = cod_df.copy()
         return cod_df
+
+    def to_long_format(self, dataset = None, dropna = False):
+        """
+        Convierte un conjunto de datos con una columna por medida al formato largo: una fila por observación y
+        medida, con la medida en la columna categórica `INDICATOR` y su valor en `OBS_VALUE`.
+
+        Parámetros:
+            dataset (pd.DataFrame, opcional): Datos en formato ancho. Por defecto `self.df_data_mapped` si existe,
+                                              o `self.df_data` en otro caso. No se modifica.
+            dropna (bool, opcional): Si es True, se omiten las observaciones sin valor.
+
+        Retorna:
+            pd.DataFrame: Las columnas que no son medidas, seguidas de `INDICATOR` (con la descripción de cada
+                          medida de `self.measures`) y `OBS_VALUE`, ordenadas por medida.
+
+        Ejemplo de uso:
+            >>> handler.map_data_w_hierarchies_info()
+            >>> handler.to_long_format()[["SEXO2", "INDICATOR", "OBS_VALUE"]].head(2)
+                 SEXO2            INDICATOR  OBS_VALUE
+            0  Hombres  Número de autónomos      120.0
+            1  Mujeres  Número de autónomos       98.0
+
+        Notas:
+            - La tabla se construye en una sola pasada, reservando cada columna con su tamaño final
+              (`frame_builder.long_frame`), en lugar de concatenar una tabla por medida.
+        """
+        if dataset is None:
+            dataset = self.df_data_mapped if getattr(self, 'df_data_mapped', None) is not None else self.df_data
+
+        columns, labels = self._measure_labels_in(dataset)
+        with self._stage("long_format", memory = False, rows_in = len(dataset)) as record:
+            df = frame_builder.long_frame(dataset, columns, labels, dropna = dropna)
+            record["rows_out"] = len(df)
+        return df
+
+    def to_sdmx(self, freq, maps = None, extend_maps = False, dropna = True, time_dimensions = sdmx.TIME_DIMENSIONS):
+        """
+        Construye la tabla de observaciones con el formato de SDMX: una columna por dimensión, `FREQ`,
+        `INDICATOR` y `OBS_VALUE`, con una fila por observación y medida.
+
+        Parámetros:
+            freq (str): Frecuencia de las observaciones, como código SDMX (`"A"`, `"M"`...) o como periodicidad
+                        de BADEA (`"Anual"`, `"Mensual"`...), ver `sdmx.frequency`.
+            maps (str or sdmx.DimensionMaps, opcional): Directorio de los mapas de dimensiones (se usa la caché
+                                                        compartida del proceso, `sdmx.get_dimension_maps`) o la
+                                                        propia caché. Si es None, no se traduce ningún valor.
+            extend_maps (bool, opcional): Si es True, los valores de los datos que no están en los mapas se añaden
+                                          con un código propuesto (`sdmx.default_target`) y los mapas se guardan.
+            dropna (bool, opcional): Si es True (por defecto), se omiten las observaciones sin valor.
+            time_dimensions (iterable of str, opcional): Dimensiones temporales, que toman el código del periodo
+                                                         (`AAAA-MM` en series mensuales) en lugar del id del nodo.
+
+        Retorna:
+            pd.DataFrame: Las dimensiones (categóricas, con el nombre del alias sin `D_` ni `_0`), `FREQ`,
+                          `INDICATOR` y `OBS_VALUE`, ordenadas por medida.
+
+        Funcionalidad:
+            1. Localiza el nodo de cada dato en el índice de su jerarquía (`self.hierarchy_index`) a partir de
+               su columna `_cod`.
+            2. Toma el id (o el periodo) de cada nodo y lo traduce con el mapa de la dimensión, si existe.
+               El mapa se aplica a los nodos utilizados, no a cada fila: cada fila toma el valor de su nodo por posición.
+            3. Convierte cada medida a número, tanto si viene de `get_DataFrame_dataJSON()` sin procesar (diccionarios
+               con `val`) como si se ha procesado como texto con coma decimal o como número.
+            4. Apila las medidas en `INDICATOR`/`OBS_VALUE` (`frame_builder.long_frame`) y traduce `INDICATOR`
+               con su mapa, si existe. Con `dropna`, se omiten las observaciones cuyo valor numérico está vacío
+               (también las cadenas vacías de la API).
+
+        Ejemplo de uso:
+            >>> handler.get_DataFrame_dataJSON()
+            >>> handler.process_all_hierarchies()
+            >>> handler.to_sdmx("Anual", maps = "mapas_dimensiones").head(1)
+              SEXO TEMPORAL AA_TERRITROIO FREQ INDICATOR  OBS_VALUE
+            0    H     2020        515893    A  AUTONOMOS     120.0
+
+        Notas:
+            - Los mapas se leen una única vez y se conservan en memoria (`sdmx.DimensionMaps`).
+            - Los valores que no están en el mapa de su dimensión quedan vacíos y se avisa en el log.
+            - Utiliza `self.df_data` (no `df_data_mapped`), por lo que en modo `low_memory` debe llamarse antes
+              de `map_data_w_hierarchies_info`.
+        """
+        if self.df_data is None:
+            raise ValueError("Los datos de la consulta no están disponibles: llame a get_DataFrame_dataJSON "
+                             "antes de to_sdmx (en modo low_memory, antes de map_data_w_hierarchies_info)")
+        if not self.hierarchy_index:
+            self.process_all_hierarchies()
+
+        freq = sdmx.frequency(freq)
+        maps = sdmx.resolve(maps)
+        time_dimensions = set(time_dimensions)
+        n_rows = len(self.df_data)
+
+        with self._stage("sdmx", rows_in = n_rows) as record:
+            dimensions = {}
+            for alias, index in self.hierarchy_index.items():
+                name = sdmx.dimension_name(alias)
+                positions = index.find_paths(self.df_data[alias + "_cod"])
+                if name in time_dimensions:
+                    values = np.array([sdmx.time_period(cod, freq) for cod in index.cod], dtype = object)
+                else:
+                    values = index.id
+                mapped = None
+                if maps is not None:
+                    # Solo se traducen los nodos utilizados por los datos
+                    used = np.unique(positions[positions >= 0])
+                    targets = maps.map_values(name, values[used], index.cod[used], index.des[used], extend_maps)
+                    if targets is not None:
+                        self._warn_unmapped(name, values[used], targets)
+                        mapped = np.full(len(values), None, dtype = object)
+                        mapped[used] = targets
+                dimensions[name] = sdmx.mapped_column(values, positions, mapped)
+
+            columns, labels = self._measure_labels_in(self.df_data)
+            indicator_mapped = None
+            if maps is not None:
+                indicator_mapped = maps.map_values(frame_builder.INDICATOR, np.array(labels, dtype = object),
+                                                   extend = extend_maps)
+                if indicator_mapped is not None:
+                    self._warn_unmapped(frame_builder.INDICATOR, labels, indicator_mapped)
+
+            measures = {col: self._numeric_measure(self.df_data[col]) for col in columns}
+            df = sdmx.sdmx_frame(dimensions, measures, labels, freq, indicator_mapped, dropna = dropna)
+            record["rows_out"] = len(df)
+
+        if maps is not None and extend_maps:
+            for path in maps.save():
+                self.logger.info(f'Mapa de dimensión actualizado: {path}')
+        return df
+
+    @staticmethod
+    def _numeric_measure(values):
+        """
+        Valores numéricos de una columna de medidas (`Int64` o `float64`, ver `functions.to_numeric_measure`),
+        extrayendo `val` si la columna no se ha procesado.
+        """
+        if pd.api.types.is_numeric_dtype(values.dtype):
+            return values.array
+        values = frame_builder.extract_key(values.to_numpy(), "val", len(values), keep_other = True)
+        return functions.to_numeric_measure(values).array
+
+    def _warn_unmapped(self, dimension, values, targets):
+        """
+        Avisa en el log de los valores de una dimensión que no tienen traducción en su mapa.
+        """
+        missing = [value for value, target in zip(values, targets) if target is None]
+        if missing:
+            self.logger.warning(f'Valores sin mapear en {dimension}: {missing[:10]}'
+                                f'{" ..." if len(missing) > 10 else ""}')
+
+    def export_sdmx(self, path, freq, maps = None, extend_maps = False, dropna = True, sep = ";", batch_size = 10000,
+                    compression = None):
+        """
+        Exporta las observaciones con el formato de SDMX (ver `to_sdmx`) a CSV o Parquet/Arrow según la extensión de `path`.
+
+        Parámetros:
+            path (str): Ruta del fichero. Con extensión `.parquet`/`.pq` o `.arrow`/`.feather`/`.ipc` se guarda con
+                        `export.write_table` (las dimensiones con codificación de diccionario); en otro caso, CSV
+                        separado por `sep`, por lotes de `batch_size` filas.
+            freq, maps, extend_maps, dropna: Ver `to_sdmx`.
+            sep (str, opcional): Separador de columnas del CSV.
+            batch_size (int, opcional): Número de filas que se escriben en cada lote del CSV.
+            compression (str, opcional): Compresión del fichero Parquet/Arrow (ver `export.write_table`).
+
+        Retorna:
+            str: La ruta del fichero escrito.
+
+        Ejemplo de uso:
+            >>> handler.export_sdmx("44804.csv", "Anual", maps = "mapas_dimensiones")
+            '44804.csv'
+
+        Notas:
+            - `OBS_VALUE` se escribe con punto decimal, como espera SDMX.
+            - Parquet/Arrow requiere `pyarrow`.
+        """
+        df = self.to_sdmx(freq, maps, extend_maps = extend_maps, dropna = dropna)
+        with self._stage("sdmx_write", memory = False, rows_in = len(df)):
+            if os.path.splitext(path)[1].lower() in export.FORMATS:
+                dictionary_columns = [col for col in df.columns if col != frame_builder.OBS_VALUE]
+                export.write_table(df, path, dictionary_columns, compression, measure_columns = [frame_builder.OBS_VALUE])
+            else:
+                writers.write_delimited(path, df, sep = sep, batch_size = batch_size)
+        self.logger.info(f'Observaciones SDMX exportadas a {path}')
+        return path
+
+    def build_hierarchy_lookups(self):
+        """
+        Construye, a partir de los índices de las jerarquías (`self.hierarchy_index`), una tabla de búsqueda
+        por jerarquía para el mapeo.
+
+        Retorna:
+            dict: Para cada alias (en el orden de las jerarquías), un diccionario con:
+                  - `index`: índice de la jerarquía (`hierarchy_index.HierarchyIndex`), que localiza el nodo
+                    de cada combinación de códigos (`find_paths`).
+                  - `columns`: columnas de descripciones ya renombradas según la jerarquía
+                    (`SEXO1`, `SEXO2`, ...) como arrays, en el mismo orden que los nodos del índice.
+
+        Notas:
+            - El nombre de las columnas se obtiene del alias (`D_SEXO_0` -> `SEXO`, `D_AA_TERRITROIO_0` -> `TERRITROIO`).
+            - Si una combinación de códigos se repite dentro de una jerarquía, se utiliza su primera aparición.
+        """
+        lookups = {}
+        for alias, index in (self.hierarchy_index or {}).items():
+            col = re.search(r'D(?:_AA)?_(.*?)_0', alias).group(1)
+            if index.duplicate_paths:
+                self.logger.warning(f'Combinaciones de códigos repetidas en {alias}: se usa la primera aparición')
+            lookups[alias] = {
+                "index": index,
+                "columns": {f"{col}{level}": values
+                            for level, values in enumerate(index.description_arrays(), start = 1)},
+            }
+        return lookups
         
         
 
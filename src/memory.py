@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+Medición de la memoria utilizada en cada etapa del procesamiento de una consulta.
+
+Utiliza `tracemalloc` (biblioteca estándar), que registra las reservas de memoria realizadas por Python
+(objetos, listas, arrays de numpy y DataFrames de pandas) desde que se activa. La medición ralentiza la
+ejecución, por lo que solo se activa cuando se pide expresamente y solo mientras dura cada etapa medida.
+
+`tracemalloc` es único para todo el proceso (un solo contador y un solo pico), por lo que solo se mide una
+etapa a la vez: una etapa que empieza mientras otra está siendo medida (en otro hilo, en otra tarea asyncio
+o con otro medidor) no se mide.
+"""
+
+import contextlib
+import threading
+import tracemalloc
+
+# Etapa medida en curso en el proceso (None si no hay ninguna)
+_measuring = None
+_measuring_lock = threading.Lock()
+
+
+class MemoryTracker:
+
+    def __init__(self):
+        """
+        Constructor del medidor.
+
+        Atributos:
+            report (list of dict): Una entrada por etapa medida, en orden, con las claves:
+                - `stage`: nombre de la etapa.
+                - `peak_bytes`: máximo de memoria reservada durante la etapa.
+                - `retained_bytes`: memoria reservada al terminar la etapa (todo lo que sigue vivo desde la activación
+                                    de `tracemalloc`).
+                - `delta_bytes`: variación de la memoria reservada durante la etapa.
+            skipped (list of str): Etapas que no se han medido porque empezaron mientras otra etapa (de este u
+                                   otro medidor) se estaba midiendo.
+
+        Notas:
+            - Si `tracemalloc` no estaba activo, el medidor lo activa al empezar cada etapa y lo desactiva al
+              terminarla, de forma que la medición no sigue activa (ni ralentiza el proceso) entre etapas ni
+              después de la ejecución. En ese caso `retained_bytes` coincide con `delta_bytes`.
+            - Si ya estaba activo (por ejemplo, con `python -X tracemalloc`), se utiliza sin desactivarlo.
+            - La memoria reservada antes de activar la medición no se contabiliza.
+            - Las etapas que se ejecutan a la vez no están aisladas: solo se mide la primera, y su pico incluye la
+              memoria reservada por el resto del proceso (otros hilos o tareas) mientras dura. Las etapas
+              concurrentes (descargas de jerarquías en varios hilos, partes de una consulta dividida) se registran
+              sin medir la memoria.
+        """
+        self.report = []
+        self.skipped = []
+        self._active = True
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """
+        Mide la memoria de las instrucciones ejecutadas dentro del bloque `with` y añade una entrada a `report`.
+
+        Devuelve la entrada de la etapa (completada al terminar el bloque), o None si la etapa no se mide
+        porque el medidor está detenido o porque se solapa con otra etapa medida (ver `skipped`).
+
+        Ejemplo de uso:
+            >>> tracker = MemoryTracker()
+            >>> with tracker.stage("lista"):
+            ...     values = list(range(100000))
+            >>> tracker.report[0]["stage"], tracker.report[0]["peak_bytes"] > 0
+            ('lista', True)
+        """
+        global _measuring
+        if not self._active:
+            yield None
+            return
+        with _measuring_lock:
+            measured = _measuring is None
+            if measured:
+                _measuring = name
+                started = not tracemalloc.is_tracing()
+                if started:
+                    tracemalloc.start()
+                start, _ = tracemalloc.get_traced_memory()
+                tracemalloc.reset_peak()
+            else:
+                self.skipped.append(name)
+        if not measured:
+            yield None
+            return
+        entry = {"stage": name}
+        try:
+            yield entry
+        finally:
+            with _measuring_lock:
+                current, peak = tracemalloc.get_traced_memory()
+                if started:
+                    tracemalloc.stop()
+                _measuring = None
+            entry.update(peak_bytes = peak, retained_bytes = current, delta_bytes = current - start)
+            self.report.append(entry)
+
+    def stop(self):
+        """
+        Detiene la medición. Las etapas posteriores no se registran.
+        """
+        self._active = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
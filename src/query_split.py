@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""
+División automática de consultas grandes en varias peticiones.
+
+Una consulta con muchos ids en varios parámetros (periodos × territorios × edades) genera una
+respuesta enorme, lenta y que puede superar el tiempo máximo del servidor. Aquí se estima el número
+de celdas a partir de los ids de `params` y, si supera un umbral, la consulta se divide a lo largo de
+uno o varios de esos parámetros (por ejemplo, una petición por periodo o por grupo de territorios).
+Las partes se descargan de forma concurrente y sus respuestas se unen en una sola, equivalente a la
+de la consulta completa, tras comprobar que todas tienen las mismas jerarquías y medidas.
+"""
+
+import asyncio
+import itertools
+import logging
+import math
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import http_client
+
+logger = logging.getLogger(__name__)
+
+# Umbral de celdas estimadas a partir del cual `APIDataHandler.from_url` divide la consulta
+DEFAULT_MAX_CELLS = 1000000
+
+_ID_LIST = re.compile(r'^\d+(,\d+)*$')
+
+
+def param_ids(params):
+    """
+    Ids de cada parámetro de dimensión de la consulta (los que contienen una lista de ids numéricos),
+    en el orden de `params`. `posord` y el resto de parámetros no numéricos se ignoran.
+
+    Ejemplo de uso:
+        >>> param_ids({"D_TEMPORAL_0": "180156, 180175", "posord": "c[Measures]"})
+        {'D_TEMPORAL_0': ['180156', '180175']}
+    """
+    ids = {}
+    for name, value in (params or {}).items():
+        value = re.sub(r'\s+', '', str(value))
+        if _ID_LIST.match(value):
+            ids[name] = list(dict.fromkeys(value.split(",")))
+    return ids
+
+
+def estimate_cells(params):
+    """
+    Número estimado de celdas de la consulta: producto del número de ids de cada parámetro de dimensión.
+    Las dimensiones sin ids en `params` no se pueden estimar y cuentan como 1.
+    """
+    return math.prod(len(ids) for ids in param_ids(params).values())
+
+
+def needs_split(params, max_cells = DEFAULT_MAX_CELLS, split_by = None):
+    """
+    Indica si la consulta se debe dividir: se han indicado dimensiones en `split_by` o las celdas estimadas
+    superan `max_cells` (None desactiva la división automática).
+    """
+    return split_by is not None or (max_cells is not None and estimate_cells(params) > max_cells)
+
+
+def chunk_sizes(params, max_cells = DEFAULT_MAX_CELLS, dimensions = None):
+    """
+    Número de ids por petición en cada dimensión para que cada parte tenga como máximo `max_cells` celdas
+    estimadas (o lo más cerca posible, una vez divididas todas las dimensiones permitidas).
+
+    Parámetros:
+        params (dict): Parámetros de la consulta.
+        max_cells (int, opcional): Celdas estimadas máximas por petición.
+        dimensions (iterable of str, opcional): Dimensiones que se pueden dividir. Por defecto, todas las de
+                                                `params`, empezando por la que tiene más ids.
+
+    Retorna:
+        dict: `{dimension: ids_por_peticion}` solo para las dimensiones que se dividen.
+
+    Ejemplo de uso:
+        >>> chunk_sizes({"D_TEMPORAL_0": "1,2,3,4", "D_TERRITORIO_0": "5,6"}, max_cells = 2)
+        {'D_TEMPORAL_0': 1}
+    """
+    ids = param_ids(params)
+    if dimensions is None:
+        dimensions = sorted(ids, key = lambda name: len(ids[name]), reverse = True)
+    sizes = {}
+    cells = estimate_cells(params)
+    for name in dimensions:
+        if cells <= max_cells:
+            break
+        count = len(ids.get(name, []))
+        if count <= 1:
+            continue
+        size = max(1, math.ceil(count / math.ceil(cells / max_cells)))
+        sizes[name] = size
+        cells = cells // count * size
+    return sizes
+
+
+def split_params(params, sizes):
+    """
+    Parámetros de cada petición al dividir la consulta según `sizes` (`{dimension: ids_por_peticion}`).
+    Los demás parámetros (`posord` incluido) se mantienen en todas las partes.
+
+    Ejemplo de uso:
+        >>> split_params({"D_TEMPORAL_0": "1,2,3", "posord": "c[Measures]"}, {"D_TEMPORAL_0": 2})
+        [{'D_TEMPORAL_0': '1,2', 'posord': 'c[Measures]'}, {'D_TEMPORAL_0': '3', 'posord': 'c[Measures]'}]
+
+    Excepciones:
+        ValueError: Si una dimensión de `sizes` no está en `params` o no tiene ids numéricos, o si su número
+                    de ids por petición no es un entero positivo.
+    """
+    ids = param_ids(params)
+    groups = []
+    for name, size in sizes.items():
+        if name not in ids:
+            raise ValueError(f"No se puede dividir la consulta por '{name}': el parámetro no existe o no tiene ids numéricos")
+        if isinstance(size, bool) or not isinstance(size, int) or size < 1:
+            raise ValueError(f"Número de ids por petición no válido para '{name}': {size!r}")
+        values = ids[name]
+        groups.append([(name, ",".join(values[i:i + size])) for i in range(0, len(values), size)])
+    return [dict(params, **dict(combination)) for combination in itertools.product(*groups)]
+
+
+def merge_responses(responses):
+    """
+    Une las respuestas JSON de las partes de una consulta en una sola, concatenando sus filas de datos.
+
+    Excepciones:
+        ValueError: Si las partes no tienen las mismas jerarquías y medidas, en cuyo caso sus filas no
+                    son comparables y no se pueden unir.
+    """
+    if not responses:
+        raise ValueError("No hay respuestas que unir")
+    first = responses[0]
+    for key in ("hierarchies", "measures"):
+        if any(response.get(key) != first.get(key) for response in responses[1:]):
+            raise ValueError(f"Las partes de la consulta no tienen las mismas '{key}' y no se pueden unir")
+    data = []
+    for response in responses:
+        data.extend(response.get("data") or [])
+    return dict(first, data = data)
+
+
+def fetch_split(url, params, client = None, max_cells = DEFAULT_MAX_CELLS, split_by = None, max_workers = 4):
+    """
+    Descarga una consulta en varias partes y devuelve la respuesta JSON unida.
+
+    Parámetros:
+        url (str): Url de la consulta.
+        params (dict): Parámetros de la consulta.
+        client (http_client.BADEAClient, opcional): Cliente HTTP. Por defecto, el compartido del proceso.
+        max_cells (int, opcional): Celdas estimadas máximas por petición (ver `chunk_sizes`).
+        split_by (dict or list, opcional): Dimensiones por las que dividir. Un diccionario
+                                           `{dimension: ids_por_peticion}` fija los tamaños (por ejemplo,
+                                           `{"D_TEMPORAL_0": 1}` para una petición por periodo); una lista
+                                           limita las dimensiones que se dividen según `max_cells`.
+        max_workers (int, opcional): Número de peticiones simultáneas.
+
+    Retorna:
+        dict: Respuesta JSON equivalente a la de la consulta completa. Las filas se devuelven agrupadas por
+              parte, en el orden de las partes.
+
+    Ejemplo de uso:
+        >>> json_data = fetch_split(url, params, split_by = {"D_TEMPORAL_0": 1})
+        >>> handler = APIDataHandler.from_json(json_data)
+    """
+    client = client if client is not None else http_client.get_default_client()
+    parts = plan_split(params, max_cells, split_by)
+    if len(parts) == 1:
+        return client.get_json(url, params = parts[0])
+    with ThreadPoolExecutor(max_workers = max(1, min(max_workers, len(parts)))) as executor:
+        responses = list(executor.map(lambda part: client.get_json(url, params = part), parts))
+    return merge_responses(responses)
+
+
+async def fetch_split_async(url, params, client = None, max_cells = DEFAULT_MAX_CELLS, split_by = None,
+                            semaphore = None, max_workers = 4):
+    """
+    Versión asíncrona de `fetch_split`. Cada parte se descarga en un hilo (`asyncio.to_thread`, con el cliente
+    bloqueante) y ocupa una plaza de `semaphore` mientras dura su petición, de forma que el semáforo compartido
+    limita también las peticiones de las partes. Sin `semaphore`, como máximo `max_workers` partes a la vez.
+
+    Retorna:
+        dict: Respuesta JSON equivalente a la de la consulta completa (ver `fetch_split`).
+    """
+    client = client if client is not None else http_client.get_default_client()
+    semaphore = semaphore if semaphore is not None else asyncio.Semaphore(max(1, max_workers))
+    parts = plan_split(params, max_cells, split_by)
+
+    async def request(part):
+        async with semaphore:
+            return await asyncio.to_thread(client.get_json, url, params = part)
+
+    responses = list(await asyncio.gather(*(request(part) for part in parts)))
+    return responses[0] if len(responses) == 1 else merge_responses(responses)
+
+
+def plan_split(params, max_cells = DEFAULT_MAX_CELLS, split_by = None):
+    """
+    Parámetros de cada parte en que se divide la consulta (ver `fetch_split`); una única parte si no se divide.
+    """
+    if isinstance(split_by, dict):
+        sizes = dict(split_by)
+    else:
+        sizes = chunk_sizes(params, max_cells, split_by)
+    parts = split_params(params, sizes) if sizes else [dict(params or {})]
+    if len(parts) > 1:
+        logger.info(f'Consulta dividida en {len(parts)} peticiones ({", ".join(f"{k}: {v}" for k, v in sizes.items())} '
+                    f'ids por petición)')
+    return parts
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+Actualización incremental de una consulta por periodos (`D_TEMPORAL_0`).
+
+La actualización anual de una consulta consiste en añadir el id del nuevo periodo a `D_TEMPORAL_0`
+(ver `result_script_pbi/Process_of_connection.md`). En lugar de descargar de nuevo el cubo completo,
+se guarda el resultado mapeado junto con los parámetros con los que se obtuvo y, en la siguiente
+actualización, solo se consultan los ids de periodo nuevos y se añaden sus filas al resultado guardado.
+"""
+
+import json
+import logging
+import os
+
+import pandas as pd
+
+import functions
+from main import APIDataHandler
+
+logger = logging.getLogger(__name__)
+
+# Parámetro de la consulta con los ids de los periodos
+TEMPORAL_KEY = "D_TEMPORAL_0"
+
+
+def split_ids(value):
+    """
+    Lista de ids de un parámetro de la consulta (`"180156,180175"` -> `["180156", "180175"]`), sin repetidos.
+    """
+    if value is None:
+        return []
+    ids = [id_.strip() for id_ in str(value).split(",")]
+    return list(dict.fromkeys(id_ for id_ in ids if id_))
+
+
+def new_ids(stored_params, params, key = TEMPORAL_KEY):
+    """
+    Ids de `key` presentes en `params` y no en `stored_params`, en el orden de `params`.
+    """
+    stored = set(split_ids(stored_params.get(key)))
+    return [id_ for id_ in split_ids(params.get(key)) if id_ not in stored]
+
+
+def is_incremental(stored_params, params, key = TEMPORAL_KEY):
+    """
+    Indica si `params` puede obtenerse a partir de `stored_params` consultando solo los ids nuevos de `key`:
+    el resto de parámetros son iguales y no se ha quitado ningún id de `key`.
+    """
+    def others(p):
+        return {name: str(value) for name, value in p.items() if name != key}
+
+    if others(stored_params) != others(params):
+        return False
+    return set(split_ids(stored_params.get(key))) <= set(split_ids(params.get(key)))
+
+
+def state_paths(path):
+    """
+    Rutas del fichero de datos (`path`, en formato pickle) y del fichero de parámetros (`<path>.params.json`).
+    """
+    return path, path + ".params.json"
+
+
+def save_state(path, dataset, params):
+    """
+    Guarda el resultado de la consulta y los parámetros con los que se obtuvo.
+    """
+    data_path, params_path = state_paths(path)
+    os.makedirs(os.path.dirname(os.path.abspath(data_path)), exist_ok = True)
+    dataset.to_pickle(data_path)
+    with open(params_path, "w", encoding = "utf-8") as f:
+        json.dump(params, f, ensure_ascii = False, indent = 2)
+
+
+def load_state(path):
+    """
+    Carga el resultado y los parámetros guardados con `save_state`.
+
+    Retorna:
+        tuple: `(dataset, params)`, o `(None, None)` si no hay ningún estado guardado.
+    """
+    data_path, params_path = state_paths(path)
+    if not (os.path.exists(data_path) and os.path.exists(params_path)):
+        return None, None
+    with open(params_path, encoding = "utf-8") as f:
+        params = json.load(f)
+    return pd.read_pickle(data_path), params
+
+
+def run_consulta(url, params, client = None, hierarchy_cache = None, numeric_measures = False, max_workers = None,
+                 **options):
+    """
+    Ejecuta el procesamiento completo de una consulta (datos, jerarquías y mapeo).
+
+    Retorna:
+        tuple: `(df_data_mapped, columnas_de_medidas)`.
+    """
+    handler = APIDataHandler.from_url(url, params = params, client = client, hierarchy_cache = hierarchy_cache,
+                                      **options)
+    handler.get_DataFrame_dataJSON(process_measures = True, numeric_measures = numeric_measures)
+    handler.process_all_hierarchies(max_workers = max_workers)
+    mapped = handler.map_data_w_hierarchies_info()
+    return mapped, [functions.clean_text(measure["des"]) for measure in handler.measures]
+
+
+def append_rows(stored, new, measure_columns):
+    """
+    Añade las filas de `new` a `stored`. Las columnas que solo existen en una de las dos tablas (por ejemplo,
+    un nivel de jerarquía que solo aparece en los periodos nuevos) se completan con nulos, y las medidas
+    se mantienen al final.
+    """
+    combined = pd.concat([stored, new], ignore_index = True)
+    measures = [col for col in combined.columns if col in measure_columns]
+    return combined[[col for col in combined.columns if col not in measures] + measures]
+
+
+def incremental_refresh(url, params, state_path, key = TEMPORAL_KEY, client = None, hierarchy_cache = None,
+                        numeric_measures = False, max_workers = None, **options):
+    """
+    Actualiza el resultado guardado de una consulta consultando solo los periodos nuevos.
+
+    Parámetros:
+        url (str): Url de la consulta.
+        params (dict): Parámetros actuales de la consulta, con todos los ids de `key` (los ya guardados y los nuevos).
+        state_path (str): Ruta del resultado guardado (ver `save_state`). Si no existe, se descarga la consulta
+                          completa y se guarda.
+        key (str, opcional): Parámetro de los periodos. Por defecto, `D_TEMPORAL_0`.
+        client, hierarchy_cache, max_workers, **options: Ver `APIDataHandler.from_url` y `process_all_hierarchies`.
+        numeric_measures (bool, opcional): Ver `APIDataHandler.get_DataFrame_dataJSON`.
+
+    Retorna:
+        pd.DataFrame: El resultado mapeado para `params`.
+
+    Funcionalidad:
+        1. Carga el resultado y los parámetros guardados.
+        2. Si los demás parámetros no han cambiado y solo se han añadido ids a `key`, consulta únicamente los ids
+           nuevos, procesa esa parte con `get_DataFrame_dataJSON`, `process_all_hierarchies` y
+           `map_data_w_hierarchies_info`, y añade sus filas al final del resultado guardado.
+        3. Si no hay ids nuevos, devuelve el resultado guardado sin realizar ninguna consulta.
+        4. En otro caso (primera ejecución, otros parámetros distintos o ids eliminados), descarga la consulta completa.
+        5. Guarda el resultado y los parámetros para la siguiente actualización.
+
+    Ejemplo de uso:
+        >>> params["D_TEMPORAL_0"] = "180156,180175,180194,180213"  # Se añade 2023
+        >>> dataset = incremental_refresh(url, params, "datos/44804.pkl")
+    """
+    params = dict(params)
+    stored, stored_params = load_state(state_path)
+
+    if stored is not None and is_incremental(stored_params, params, key):
+        pending = new_ids(stored_params, params, key)
+        if not pending:
+            logger.info(f'Sin periodos nuevos en {key}: se usa el resultado guardado')
+            return stored
+        logger.info(f'Consultando solo los periodos nuevos de {key}: {", ".join(pending)}')
+        slice_params = dict(params, **{key: ",".join(pending)})
+        new, measure_columns = run_consulta(url, slice_params, client, hierarchy_cache, numeric_measures,
+                                            max_workers, **options)
+        dataset = append_rows(stored, new, measure_columns)
+    else:
+        if stored is not None:
+            logger.info('Los parámetros han cambiado: se descarga la consulta completa')
+        dataset, _ = run_consulta(url, params, client, hierarchy_cache, numeric_measures, max_workers, **options)
+
+    save_state(state_path, dataset, params)
+    return dataset
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+Transporte de grabación y reproducción de respuestas de la API, para ejecutar las pruebas sin red.
+
+`ReplayTransport` sustituye a la sesión HTTP de `http_client.BADEAClient` (parámetro `transport`):
+
+- En modo "record" realiza las peticiones reales y guarda cada respuesta (estado, cabeceras y cuerpo)
+  en un directorio de fixtures, con la misma estructura que `http_cache.HTTPCache` (`<clave>.body` y
+  `<clave>.meta.json`).
+- En modo "replay" sirve las respuestas guardadas sin ninguna petición de red. Si falta alguna,
+  se lanza `MissingFixtureError` en lugar de consultar la API.
+
+La clave de cada respuesta es la url con todos sus parámetros (los de la url y los de `params`),
+ordenados, de forma que el orden de los parámetros en el diccionario no influye.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from urllib.parse import urlencode, urlsplit, urlunsplit, parse_qsl
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+# Variable de entorno que activa el modo de grabación (`BADEA_RECORD=1`)
+RECORD_ENV = "BADEA_RECORD"
+
+MODES = ("replay", "record")
+
+# Cabeceras que no se graban: el cuerpo se guarda ya descomprimido y completo
+_SKIPPED_HEADERS = {"content-encoding", "transfer-encoding", "content-length", "set-cookie"}
+
+
+class MissingFixtureError(LookupError):
+    """
+    No hay ninguna respuesta grabada para la petición en modo "replay".
+    """
+
+
+def request_key(url, params = None):
+    """
+    Url completa de la petición, con los parámetros de la url y de `params` ordenados.
+
+    Ejemplo de uso:
+        >>> request_key("https://host/consulta/44804?", {"posord": "c[Measures]", "D_TEMPORAL_0": "180194"})
+        'https://host/consulta/44804?D_TEMPORAL_0=180194&posord=c%5BMeasures%5D'
+    """
+    parts = urlsplit(url)
+    query = parse_qsl(parts.query, keep_blank_values = True)
+    query += [(str(name), str(value)) for name, value in (params or {}).items()]
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(sorted(query)), ""))
+
+
+def recording():
+    """
+    Indica si está activado el modo de grabación con la variable de entorno `BADEA_RECORD=1`.
+    """
+    return os.environ.get(RECORD_ENV, "").strip().lower() in ("1", "true", "yes")
+
+
+def has_fixtures(directory):
+    """
+    Indica si `directory` contiene alguna respuesta grabada.
+    """
+    return os.path.isdir(directory) and any(name.endswith(".meta.json") for name in os.listdir(directory))
+
+
+class ReplayTransport:
+
+    def __init__(self, directory, mode = None, transport = None):
+        """
+        Constructor del transporte.
+
+        Parámetros:
+            directory (str): Directorio de las respuestas grabadas.
+            mode (str, opcional): "record" o "replay". Por defecto, "record" si `BADEA_RECORD=1` y "replay" en otro caso.
+            transport (objeto, opcional): Transporte real usado en modo "record" (con un método `get` compatible
+                                          con `requests.Session.get`). Por defecto, una `requests.Session`.
+
+        Notas:
+            - En modo "replay", las peticiones condicionales (`If-None-Match`) cuyo `ETag` coincide con el de la
+              respuesta grabada reciben un 304, igual que en el servidor.
+            - `calls` registra las claves de todas las peticiones recibidas.
+        """
+        mode = mode or ("record" if recording() else "replay")
+        if mode not in MODES:
+            raise ValueError(f"Modo no soportado '{mode}'. Use uno de {MODES}.")
+        self.directory = directory
+        self.mode = mode
+        self.calls = []
+        self._lock = threading.Lock()
+        if mode == "record":
+            os.makedirs(directory, exist_ok = True)
+            self.transport = transport if transport is not None else requests.Session()
+        else:
+            self.transport = None
+
+    def _paths(self, key):
+        base = os.path.join(self.directory, hashlib.sha256(key.encode("utf-8")).hexdigest())
+        return base + ".body", base + ".meta.json"
+
+    def get(self, url, params = None, headers = None, timeout = None, stream = False):
+        """
+        Petición GET compatible con `requests.Session.get`: graba o reproduce la respuesta según el modo.
+        """
+        key = request_key(url, params)
+        with self._lock:
+            self.calls.append(key)
+        if self.mode == "record":
+            response = self.transport.get(url, params = params, headers = headers, timeout = timeout)
+            if response.status_code < 500 and response.status_code != 304:
+                self.save(key, response)
+            return response
+        return self.load(key, headers)
+
+    def save(self, key, response):
+        """
+        Guarda el estado, las cabeceras y el cuerpo de `response` para la petición `key`.
+
+        Retorna:
+            bool: True si se ha guardado. Una respuesta 304 o sin cuerpo no sustituye a una respuesta ya grabada,
+                  de forma que una revalidación durante la grabación no borra el cuerpo del fixture.
+        """
+        body_path, meta_path = self._paths(key)
+        if response.status_code == 304 or (not response.content and os.path.isfile(body_path)):
+            return False
+        headers = {name: value for name, value in response.headers.items() if name.lower() not in _SKIPPED_HEADERS}
+        meta = {"url": key, "status_code": response.status_code, "headers": headers}
+        with self._lock:
+            for path, content in ((body_path, response.content),
+                                  (meta_path, json.dumps(meta, ensure_ascii = False, indent = 2).encode("utf-8"))):
+                tmp_path = f"{path}.{threading.get_ident()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(content)
+                os.replace(tmp_path, path)
+        return True
+
+    def load(self, key, headers = None):
+        """
+        Respuesta grabada para la petición `key`, como un `requests.Response`.
+
+        Excepciones:
+            MissingFixtureError: Si no hay ninguna respuesta grabada para `key`.
+        """
+        body_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path, "r", encoding = "utf-8") as f:
+                meta = json.load(f)
+            with open(body_path, "rb") as f:
+                body = f.read()
+        except OSError:
+            raise MissingFixtureError(f"No hay ninguna respuesta grabada para {key} en {self.directory}. "
+                                      f"Ejecute las pruebas con {RECORD_ENV}=1 para grabarla.") from None
+
+        response_headers = CaseInsensitiveDict(meta.get("headers") or {})
+        status_code = meta["status_code"]
+        etag = response_headers.get("ETag")
+        if etag and (headers or {}).get("If-None-Match") == etag:
+            status_code, body = 304, b""
+
+        response = requests.Response()
+        response.status_code = status_code
+        response.headers = response_headers
+        response._content = body
+        response.url = key
+        response.encoding = "utf-8"
+        return response
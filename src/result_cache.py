@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""
+Caché de resultados de consultas de BADEA, por id de consulta y parámetros.
+
+Guarda, para cada consulta y combinación de parámetros (`posord` incluido), la respuesta original
+(en una `http_cache.HTTPCache`, con caducidad y revalidación por `ETag`/`Last-Modified`) y el
+DataFrame final ya mapeado, en Parquet, como adjunto de la respuesta. Mientras la respuesta está vigente,
+o si al revalidarla el servidor indica que no ha cambiado, el resultado se carga desde disco sin analizar
+la respuesta ni volver a procesar la consulta, siempre que las jerarquías de las que procede tampoco
+hayan cambiado. Requiere `pyarrow` (ver `export`).
+"""
+
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import threading
+from urllib.parse import urlencode, urlsplit, urlunsplit, parse_qsl
+
+import export
+import hierarchy_registry
+import http_client
+from http_cache import HTTPCache
+from main import APIDataHandler
+
+logger = logging.getLogger(__name__)
+
+
+def consulta_id(url):
+    """
+    Id de la consulta a partir de su url (`.../consulta/44804?` -> `"44804"`), o None si no aparece.
+    """
+    match = re.search(r'/consulta/(\d+)', url)
+    return match.group(1) if match else None
+
+
+def normalize_params(params):
+    """
+    Parámetros de la consulta en forma canónica: claves ordenadas, valores como texto y sin espacios
+    alrededor de cada id. El orden de los ids dentro de un parámetro y el de `posord` se conservan,
+    ya que pueden determinar el orden de las filas de la respuesta.
+
+    Ejemplo de uso:
+        >>> normalize_params({"posord": "c[Measures]", "D_TEMPORAL_0": "180156, 180175"})
+        [('D_TEMPORAL_0', '180156,180175'), ('posord', 'c[Measures]')]
+    """
+    normalized = []
+    for name, value in (params or {}).items():
+        value = ",".join(part.strip() for part in str(value).split(","))
+        normalized.append((str(name), value))
+    return sorted(normalized)
+
+
+def canonical_url(url, params = None):
+    """
+    Url completa de la consulta con los parámetros normalizados (los de la url y los de `params`) en la
+    query. Es la clave de la caché: dos peticiones equivalentes tienen la misma url canónica.
+    """
+    parts = urlsplit(url)
+    query = dict(parse_qsl(parts.query))
+    query.update(params or {})
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(normalize_params(query)), ""))
+
+
+class ResultCache:
+
+    # Adjunto de cada respuesta con el índice de sus resultados (ver `get_dataset`)
+    INDEX = "results.json"
+
+    def __init__(self, directory, ttl = 24 * 3600, max_bytes = None):
+        """
+        Constructor de la caché de resultados.
+
+        Parámetros:
+            directory (str): Directorio de la caché. Las respuestas de las consultas, con sus resultados
+                             como adjuntos, se guardan en `responses/` y las de las jerarquías en `hierarchies/`.
+            ttl (float, opcional): Segundos durante los que una respuesta se considera vigente y su resultado
+                                   se devuelve sin consultar al servidor. Al caducar, se revalida con una
+                                   petición condicional. Por defecto, un día.
+            max_bytes (int, opcional): Tamaño máximo de cada uno de los dos directorios (ver `HTTPCache`).
+                                       Los resultados cuentan para el tamaño de `responses/`.
+
+        Notas:
+            - Cada resultado es un adjunto Parquet de la respuesta de la que procede (`HTTPCache.write_attachment`):
+              se elimina con ella al superar `max_bytes` y se descarta si la respuesta cambia.
+            - La clave del resultado incluye el hash de las respuestas de las jerarquías, por lo que no se
+              reutiliza si alguna jerarquía ha cambiado. Las jerarquías caducan con el `ttl` por defecto de
+              `HTTPCache` (una semana).
+        """
+        self.directory = directory
+        self.responses = HTTPCache(os.path.join(directory, "responses"), ttl = ttl, max_bytes = max_bytes)
+        self.hierarchies = HTTPCache(os.path.join(directory, "hierarchies"), max_bytes = max_bytes)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def options_key(options):
+        """
+        Clave de `options` en el índice de resultados de una respuesta.
+        """
+        return hashlib.sha256(json.dumps(options, sort_keys = True).encode("utf-8")).hexdigest()[:32]
+
+    @staticmethod
+    def result_name(options, digests):
+        """
+        Nombre del adjunto con el resultado para `options` y los hashes de las respuestas de las jerarquías.
+        """
+        key = json.dumps({"options": options, "hierarchies": list(digests)}, sort_keys = True)
+        return "result-" + hashlib.sha256(key.encode("utf-8")).hexdigest()[:32] + ".parquet"
+
+    def get_json(self, url, params = None, client = None):
+        """
+        Respuesta JSON de la consulta, desde la caché mientras esté vigente o tras revalidarla.
+        """
+        client = client if client is not None else http_client.get_default_client()
+        return self.responses.get_json(canonical_url(url, params), get = client.get)
+
+    def load_result(self, request_url, options, hierarchy_cache, client):
+        """
+        Resultado guardado para la respuesta de `request_url` y `options`, sin analizar la respuesta, o None si
+        no hay ninguno o alguna de sus jerarquías ha cambiado (las caducadas se revalidan en `hierarchy_cache`).
+        """
+        index = self.responses.read_attachment(request_url, self.INDEX)
+        record = json.loads(index).get(self.options_key(options)) if index is not None else None
+        if record is None:
+            return None
+        for url, digest in record["hierarchies"]:
+            if hierarchy_registry.payload_digest(hierarchy_cache.get_body(url, get = client.get)) != digest:
+                return None
+        content = self.responses.read_attachment(request_url, record["result"])
+        if content is None:
+            return None
+        return export.read_table(io.BytesIO(content), file_format = "parquet")
+
+    def store_result(self, request_url, options, hierarchy_values, dataset):
+        """
+        Guarda el resultado de `request_url` y `options` en Parquet y lo registra en el índice de la respuesta,
+        con la url y el hash de la respuesta de cada jerarquía. Sustituye al resultado anterior de `options`.
+        """
+        hierarchies = [[url, getattr(value, "digest", None) or
+                        hierarchy_registry.payload_digest(json.dumps(value, sort_keys = True).encode("utf-8"))]
+                       for url, value in hierarchy_values]
+        name = self.result_name(options, [digest for _, digest in hierarchies])
+        buffer = io.BytesIO()
+        export.write_table(dataset, buffer, file_format = "parquet")
+        with self._lock:
+            if not self.responses.write_attachment(request_url, name, buffer.getvalue()):
+                return
+            index = self.responses.read_attachment(request_url, self.INDEX)
+            index = json.loads(index) if index is not None else {}
+            previous = index.get(self.options_key(options))
+            if previous is not None and previous["result"] != name:
+                self.responses.remove_attachment(request_url, previous["result"])
+            index[self.options_key(options)] = {"hierarchies": hierarchies, "result": name}
+            self.responses.write_attachment(request_url, self.INDEX, json.dumps(index).encode("utf-8"))
+
+    def get_dataset(self, url, params = None, client = None, hierarchy_cache = None, numeric_measures = False,
+                    max_workers = None):
+        """
+        DataFrame mapeado de la consulta (`df_data_mapped`), reutilizando el resultado guardado si ni la
+        respuesta de la consulta ni las de sus jerarquías han cambiado.
+
+        Parámetros:
+            url (str): Url de la consulta.
+            params (dict, opcional): Parámetros de la consulta (`D_TEMPORAL_0`, `posord`, ...).
+            client (http_client.BADEAClient, opcional): Cliente HTTP. Por defecto, el compartido del proceso.
+            hierarchy_cache (http_cache.HTTPCache, opcional): Caché de las jerarquías. Por defecto, la de la
+                                                              propia caché de resultados (`hierarchies/`).
+            numeric_measures (bool, opcional): Ver `APIDataHandler.get_DataFrame_dataJSON`. Forma parte de la clave
+                                               del resultado.
+            max_workers (int, opcional): Ver `APIDataHandler.process_all_hierarchies`.
+
+        Retorna:
+            pd.DataFrame: El resultado mapeado de la consulta.
+
+        Funcionalidad:
+            1. Se obtiene el cuerpo de la respuesta de la consulta: desde disco si está vigente o, si ha caducado,
+               revalidándola con una petición condicional. Si ha cambiado, sus resultados se descartan.
+            2. Si el índice de resultados de la respuesta tiene uno para las opciones y las respuestas de sus
+               jerarquías no han cambiado, se devuelve sin analizar el JSON de la consulta.
+            3. En otro caso se procesa la respuesta (datos, jerarquías y mapeo) y se guarda el resultado.
+
+        Ejemplo de uso:
+            >>> cache = ResultCache("cache_badea")
+            >>> dataset = cache.get_dataset(url, params = params)
+        """
+        client = client if client is not None else http_client.get_default_client()
+        hierarchy_cache = hierarchy_cache if hierarchy_cache is not None else self.hierarchies
+        request_url = canonical_url(url, params)
+        options = {"numeric_measures": numeric_measures}
+
+        body = self.responses.get_body(request_url, get = client.get)
+        dataset = self.load_result(request_url, options, hierarchy_cache, client)
+        if dataset is not None:
+            logger.info(f'Consulta {consulta_id(url)}: resultado servido desde la caché')
+            return dataset
+
+        handler = APIDataHandler.from_json(json.loads(body), hierarchy_cache = hierarchy_cache, client = client)
+        hierarchy_values = handler.request_all_hierarchies_values(max_workers)
+        handler.get_DataFrame_dataJSON(process_measures = True, numeric_measures = numeric_measures)
+        handler.process_all_hierarchies(hierarchy_values = hierarchy_values)
+        dataset = handler.map_data_w_hierarchies_info()
+        self.store_result(request_url, options, zip([hier["url"] for hier in handler.hierarchies], hierarchy_values),
+                          dataset)
+        return dataset
+
+    def clear(self):
+        """
+        Elimina todas las respuestas, jerarquías y resultados guardados.
+        """
+        self.responses.clear()
+        self.hierarchies.clear()
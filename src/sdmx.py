@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+"""
+Exportación de una consulta al formato tabular de SDMX: una columna por dimensión con el identificador de
+cada nodo de la jerarquía (o su código en las dimensiones temporales), `FREQ`, `INDICATOR` y `OBS_VALUE`.
+
+Los valores de cada dimensión se pueden traducir a los códigos de SDMX con mapas de dimensiones: ficheros
+CSV con las columnas `SOURCE`, `COD`, `NAME` y `TARGET`, uno por dimensión, dentro de un directorio.
+`DimensionMaps` lee cada mapa una única vez y lo conserva en memoria como diccionario `SOURCE -> TARGET`
+(compartido por todo el proceso con `get_dimension_maps`). El mapa se aplica a los nodos de la jerarquía,
+no a las filas de los datos: cada fila toma el valor de su nodo por posición, en una sola pasada.
+"""
+
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+import frame_builder
+
+# Columnas de los ficheros de mapas de dimensiones
+MAP_COLUMNS = ["SOURCE", "COD", "NAME", "TARGET"]
+
+# Columna de la frecuencia de las observaciones
+FREQ = "FREQ"
+
+# Frecuencias de SDMX y periodicidades de BADEA a las que corresponden
+FREQUENCY_CODES = frozenset({"A", "S", "Q", "M", "W", "D"})
+FREQUENCIES = {
+    "Mensual": "M",
+    "Mensual  Fuente: Instituto Nacional de Estadística": "M",
+    "": "M",
+    "Trimestral": "Q",
+    "Semestral": "S",
+    "Anual": "A",
+    "Anual. Datos a 31 de diciembre": "A",
+}
+
+# Dimensiones cuyo valor es el código del periodo (con el formato de SDMX) en lugar del id del nodo
+TIME_DIMENSIONS = ("TEMPORAL",)
+
+# Palabras que se omiten al abreviar una descripción larga (ver `default_target`)
+_PREPOSITIONS = {"A", "DE", "POR", "PARA", "EN"}
+
+
+def dimension_name(alias):
+    """
+    Nombre de la dimensión SDMX de una jerarquía: su alias sin el prefijo `D_` ni el sufijo `_0`.
+
+    Ejemplo de uso:
+        >>> dimension_name("D_AA_TERRITROIO_0")
+        'AA_TERRITROIO'
+    """
+    name = alias[2:] if alias.startswith("D_") else alias
+    return name[:-2] if name.endswith("_0") else name
+
+
+def frequency(periodicity):
+    """
+    Código de frecuencia de SDMX (`A`, `Q`, `M`...) para un código de frecuencia o una periodicidad de BADEA.
+
+    Excepciones:
+        ValueError: Si la periodicidad no es ninguna de las conocidas.
+    """
+    if periodicity in FREQUENCY_CODES:
+        return periodicity
+    if periodicity not in FREQUENCIES:
+        raise ValueError(f"Periodicidad no soportada '{periodicity}'. Use un código SDMX "
+                         f"({', '.join(sorted(FREQUENCY_CODES))}) o una de: {', '.join(map(repr, FREQUENCIES))}")
+    return FREQUENCIES[periodicity]
+
+
+def time_period(cod, freq):
+    """
+    Código de un periodo con el formato de SDMX: en las series mensuales y trimestrales, `AAAAMM` pasa a `AAAA-MM`.
+    """
+    if freq in ("M", "Q") and isinstance(cod, str) and len(cod) > 4:
+        return cod[:4] + "-" + cod[4:]
+    return cod
+
+
+def default_target(description):
+    """
+    Código SDMX propuesto para un término nuevo de un mapa: la descripción en mayúsculas con guiones bajos,
+    abreviada (sin preposiciones y con cuatro letras por palabra) si tiene 15 caracteres o más.
+
+    Ejemplo de uso:
+        >>> default_target("Tasa de variación")
+        'TASA_VARI'
+    """
+    if description is None or pd.isna(description):
+        return None
+    target = str(description).upper().replace(" ", "_")
+    if len(target) >= 15:
+        target = "_".join(part[:4] for part in target.split("_") if part not in _PREPOSITIONS)
+    return target.replace("%", "PCT")
+
+
+class DimensionMaps:
+
+    def __init__(self, directory):
+        """
+        Constructor de la caché de mapas de dimensiones.
+
+        Parámetros:
+            directory (str): Directorio con un fichero de mapa por dimensión, `<DIMENSIÓN>.csv` (o `<DIMENSIÓN>`,
+                             sin extensión), con las columnas `SOURCE`, `COD`, `NAME` y `TARGET`.
+
+        Atributos:
+            loads (int): Número de ficheros leídos. Cada mapa se lee una vez y solo se vuelve a leer si el fichero
+                         cambia en disco (y no tiene términos nuevos sin guardar).
+
+        Notas:
+            - Cada mapa se guarda como diccionario `SOURCE -> [COD, NAME, TARGET]`, en el orden del fichero.
+        """
+        self.directory = directory
+        self.loads = 0
+        self._maps = {}
+        self._mtimes = {}
+        self._dirty = set()
+        self._lock = threading.Lock()
+
+    def path(self, dimension):
+        """
+        Fichero del mapa de `dimension`: `<DIMENSIÓN>.csv`, o el fichero sin extensión si es el que existe.
+        """
+        path = os.path.join(self.directory, dimension)
+        return path if os.path.isfile(path) and not os.path.isfile(path + ".csv") else path + ".csv"
+
+    def entries(self, dimension):
+        """
+        Términos del mapa de `dimension` (`SOURCE -> [COD, NAME, TARGET]`), o None si la dimensión no tiene mapa.
+        """
+        path = self.path(dimension)
+        mtime = os.path.getmtime(path) if os.path.isfile(path) else None
+        with self._lock:
+            if dimension in self._maps and (dimension in self._dirty or self._mtimes.get(dimension) == mtime):
+                return self._maps[dimension]
+            if mtime is None:
+                return None
+            # Las celdas vacías (términos sin traducir) se leen como texto vacío y se guardan como None
+            df = pd.read_csv(path, dtype = object, keep_default_na = False).reindex(columns = MAP_COLUMNS,
+                                                                                   fill_value = "")
+            entries = {}
+            for source, cod, name, target in df.itertuples(index = False, name = None):
+                entries.setdefault(source, [cod or None, name or None, target or None])
+            self._maps[dimension], self._mtimes[dimension] = entries, mtime
+            self.loads += 1
+            return entries
+
+    def map_values(self, dimension, values, codes = None, names = None, extend = False):
+        """
+        Traduce a SDMX los valores distintos de una dimensión.
+
+        Parámetros:
+            dimension (str): Nombre de la dimensión.
+            values (np.ndarray): Valores a traducir (ids de los nodos de la jerarquía o medidas).
+            codes, names (np.ndarray, opcional): Código y descripción de cada valor, para los términos nuevos.
+            extend (bool, opcional): Si es True, los valores que no están en el mapa se añaden con el código
+                                     propuesto por `default_target` (a partir de su descripción o, si no la
+                                     tiene, del propio valor). El mapa se crea si la dimensión no tenía.
+
+        Retorna:
+            np.ndarray or None: Array `object` con el `TARGET` de cada valor (None si no está en el mapa),
+                                o None si la dimensión no tiene mapa y no se extiende.
+        """
+        entries = self.entries(dimension)
+        if entries is None and not extend:
+            return None
+        with self._lock:
+            entries = self._maps.setdefault(dimension, entries if entries is not None else {})
+            if extend:
+                for position, value in enumerate(values):
+                    if value is None or (value in entries and entries[value][2] is not None):
+                        continue
+                    cod = codes[position] if codes is not None else None
+                    name = names[position] if names is not None else None
+                    entry = entries.setdefault(value, [cod, name, None])
+                    entry[2] = default_target(entry[1] if entry[1] is not None else value)
+                    self._dirty.add(dimension)
+            return np.array([entries[value][2] if value in entries else None for value in values], dtype = object)
+
+    def save(self):
+        """
+        Guarda en el directorio los mapas con términos nuevos (ver `map_values`).
+
+        Retorna:
+            list of str: Ficheros escritos.
+        """
+        written = []
+        with self._lock:
+            os.makedirs(self.directory, exist_ok = True)
+            for dimension in sorted(self._dirty):
+                path = self.path(dimension)
+                rows = [[source] + entry for source, entry in self._maps[dimension].items()]
+                pd.DataFrame(rows, columns = MAP_COLUMNS, dtype = object).to_csv(path, index = False)
+                self._mtimes[dimension] = os.path.getmtime(path)
+                written.append(path)
+            self._dirty.clear()
+        return written
+
+    def clear(self):
+        """
+        Descarta los mapas en memoria (también los términos nuevos sin guardar).
+        """
+        with self._lock:
+            self._maps.clear()
+            self._mtimes.clear()
+            self._dirty.clear()
+
+
+_dimension_maps = {}
+_dimension_maps_lock = threading.Lock()
+
+
+def get_dimension_maps(directory):
+    """
+    Devuelve la caché de mapas compartida por el proceso para `directory`, creándola en la primera llamada.
+    """
+    key = os.path.abspath(directory)
+    with _dimension_maps_lock:
+        maps = _dimension_maps.get(key)
+        if maps is None:
+            maps = _dimension_maps[key] = DimensionMaps(directory)
+        return maps
+
+
+def resolve(maps):
+    """
+    Caché de mapas que corresponde a la opción `maps` de `APIDataHandler.to_sdmx`: la compartida del
+    directorio indicado, ninguna si es None, o la propia caché indicada.
+    """
+    if isinstance(maps, (str, os.PathLike)):
+        return get_dimension_maps(maps)
+    return maps
+
+
+def mapped_column(values, positions, mapped = None):
+    """
+    Columna categórica con el valor de cada fila a partir de los valores de los nodos y la posición del nodo de
+    cada fila (-1 para vacío). Con `mapped`, se usa el valor traducido de cada nodo.
+    """
+    values = values if mapped is None else mapped
+    # Códigos de categoría de cada nodo (-1 si su valor está vacío) y, después, de cada fila por posición
+    node_codes, categories = pd.factorize(np.asarray(values, dtype = object))
+    node_codes = np.append(node_codes, -1)
+    return pd.Categorical.from_codes(node_codes[positions], categories = pd.Index(categories, dtype = object))
+
+
+def sdmx_frame(dimensions, measures, labels, freq, indicator_mapped = None, dropna = True):
+    """
+    Construye la tabla SDMX en formato largo.
+
+    Parámetros:
+        dimensions (dict): Nombre de la dimensión -> columna categórica (ver `mapped_column`).
+        measures (dict): Nombre de la columna -> valores numéricos de cada medida, en formato ancho.
+        labels (list of str): Valor de `INDICATOR` de cada medida.
+        freq (str): Código de frecuencia de SDMX.
+        indicator_mapped (np.ndarray, opcional): `INDICATOR` traducido de cada medida.
+        dropna (bool, opcional): Si es True, se omiten las observaciones sin valor.
+
+    Retorna:
+        pd.DataFrame: Las dimensiones, `FREQ`, `INDICATOR` y `OBS_VALUE`, ordenadas por medida.
+    """
+    n_rows = len(next(iter(measures.values()))) if measures else 0
+    wide = dict(dimensions)
+    wide[FREQ] = pd.Categorical.from_codes(np.zeros(n_rows, dtype = np.int8), categories = [freq])
+    wide.update(measures)
+    df = frame_builder.long_frame(pd.DataFrame(wide, index = pd.RangeIndex(n_rows), copy = False), list(measures),
+                                  labels, dropna = dropna)
+    if indicator_mapped is not None:
+        indicator = df[frame_builder.INDICATOR].array
+        df[frame_builder.INDICATOR] = mapped_column(np.asarray(labels, dtype = object), indicator.codes.astype(np.int64),
+                                                    indicator_mapped)
+    return df
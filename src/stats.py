@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+Instrumentación por etapas del procesamiento de una consulta.
+
+`StageStats` registra, para cada etapa (descarga, lectura del JSON, construcción del DataFrame, medidas,
+descarga y aplanado de cada jerarquía, unión de cada jerarquía en el mapeo...), el tiempo de reloj, el
+tiempo de CPU, los bytes descargados, las filas de entrada y salida y, si se mide la memoria, su pico.
+Los registros se pueden consultar como lista de diccionarios o DataFrame y, opcionalmente, se emiten
+como líneas JSON en el log según termina cada etapa.
+"""
+
+import contextlib
+import json
+import logging
+import threading
+import time
+
+import pandas as pd
+
+# Logger de las líneas JSON de las etapas
+logger = logging.getLogger("badea.stats")
+
+FIELDS = ("stage", "wall_seconds", "cpu_seconds", "bytes_downloaded", "rows_in", "rows_out", "peak_bytes")
+
+
+class StageStats:
+
+    def __init__(self, memory_tracker = None, client = None, log_json = False, context = None):
+        """
+        Constructor del registro de etapas.
+
+        Parámetros:
+            memory_tracker (memory.MemoryTracker, opcional): Si se indica, las etapas principales registran también
+                                                             su pico de memoria (`peak_bytes`).
+            client (http_client.BADEAClient, opcional): Cliente HTTP cuyo contador `bytes_downloaded` se usa para
+                                                        calcular los bytes descargados en cada etapa.
+            log_json (bool, opcional): Si es True, cada etapa se emite al terminar como una línea JSON en el logger
+                                       `badea.stats` (nivel INFO).
+            context (dict, opcional): Campos que se añaden a cada línea JSON (por ejemplo, el id de la consulta).
+
+        Atributos:
+            records (list of dict): Una entrada por etapa, en el orden en que empiezan, con las claves de `FIELDS`
+                                    y los campos adicionales de la etapa (por ejemplo, `alias`).
+
+        Notas:
+            - El tiempo de CPU es el del proceso: en etapas que se ejecutan a la vez en varios hilos (descargas
+              concurrentes de jerarquías), el tiempo de CPU y los bytes descargados incluyen los de las demás.
+            - Solo las etapas principales miden la memoria, ya que `tracemalloc` tiene un único pico por proceso.
+              Las etapas concurrentes se registran con `memory = False`, y una etapa que empieza mientras otra
+              se está midiendo no se mide (`peak_bytes` None, ver `memory.MemoryTracker`).
+        """
+        self.memory_tracker = memory_tracker
+        self.client = client
+        self.log_json = log_json
+        self.context = dict(context or {})
+        self.records = []
+        self._lock = threading.Lock()
+
+    def _bytes(self):
+        return getattr(self.client, "bytes_downloaded", None)
+
+    @contextlib.contextmanager
+    def stage(self, name, memory = True, **fields):
+        """
+        Mide las instrucciones del bloque `with` como la etapa `name`.
+
+        Devuelve el registro de la etapa, en el que el bloque puede completar `rows_in`, `rows_out` u otros campos.
+
+        Ejemplo de uso:
+            >>> stats = StageStats()
+            >>> with stats.stage("suma", rows_in = 3) as record:
+            ...     record["rows_out"] = len([sum([1, 2, 3])])
+            >>> stats.records[0]["stage"], stats.records[0]["rows_out"]
+            ('suma', 1)
+        """
+        record = {"stage": name, "rows_in": None, "rows_out": None}
+        record.update(fields)
+        with self._lock:
+            self.records.append(record)
+
+        tracked = memory and self.memory_tracker is not None
+        memory_stage = self.memory_tracker.stage(name) if tracked else contextlib.nullcontext()
+        bytes_start = self._bytes()
+        wall, cpu = time.perf_counter(), time.process_time()
+        entry = None
+        try:
+            with memory_stage as entry:
+                yield record
+        finally:
+            record["wall_seconds"] = time.perf_counter() - wall
+            record["cpu_seconds"] = time.process_time() - cpu
+            bytes_end = self._bytes()
+            record["bytes_downloaded"] = None if bytes_start is None else bytes_end - bytes_start
+            record["peak_bytes"] = entry.get("peak_bytes") if entry is not None else None
+            if self.log_json:
+                self.emit(record)
+
+    def emit(self, record):
+        """
+        Emite un registro como una línea JSON en el logger `badea.stats`.
+        """
+        logger.info(json.dumps(dict(self.context, **record), ensure_ascii = False, default = str))
+
+    def extend(self, other):
+        """
+        Añade al principio los registros de otro `StageStats` (por ejemplo, la descarga previa a la construcción
+        de la clase). Los registros no se vuelven a emitir: se emiten, en su caso, desde `other`.
+        """
+        with self._lock:
+            self.records[:0] = other.records
+
+    def to_frame(self):
+        """
+        Registros como DataFrame, con las columnas de `FIELDS` delante.
+        """
+        df = pd.DataFrame(self.records)
+        if df.empty:
+            return pd.DataFrame(columns = list(FIELDS))
+        columns = list(FIELDS) + [col for col in df.columns if col not in FIELDS]
+        return df.reindex(columns = columns)
+
+    def summary(self):
+        """
+        Totales por etapa: número de veces, tiempo de reloj, tiempo de CPU y bytes descargados.
+
+        Retorna:
+            dict: `{etapa: {"count", "wall_seconds", "cpu_seconds", "bytes_downloaded"}}`, en el orden de las etapas.
+        """
+        totals = {}
+        for record in self.records:
+            total = totals.setdefault(record["stage"], {"count": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0,
+                                                        "bytes_downloaded": 0})
+            total["count"] += 1
+            total["wall_seconds"] += record.get("wall_seconds") or 0.0
+            total["cpu_seconds"] += record.get("cpu_seconds") or 0.0
+            total["bytes_downloaded"] += record.get("bytes_downloaded") or 0
+        return totals
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+Generador de consultas sintéticas con la estructura de las respuestas de BADEA.
+
+Produce el JSON de una consulta (jerarquías, medidas, filas de datos y metainformación) y las respuestas
+de las urls de sus jerarquías, con tamaño configurable: número de jerarquías, profundidad y número de
+hijos por nodo de cada árbol, número de filas y de medidas. Sirve para medir cómo escalan las etapas de
+`APIDataHandler` sin depender de la API (ver `benchmarks/`).
+"""
+
+import json
+
+import numpy as np
+
+BASE_URL = "https://synthetic.badea/rest/v1.0"
+
+# Códigos de los nodos raíz (totales), como en BADEA
+ROOT_CODES = ("Total", "TOTAL")
+
+
+def generate_hierarchy(alias, depth = 3, fanout = 5, first_id = 1):
+    """
+    Árbol de una jerarquía con `depth` niveles bajo el nodo raíz (total) y `fanout` hijos por nodo.
+
+    Los códigos de cada nodo amplían los de su padre con dos dígitos (`"01"`, `"0103"`, ...), y las
+    descripciones indican el alias y el código.
+
+    Retorna:
+        dict: Nodo raíz con las claves de BADEA (`id`, `cod`, `des`, `isLastLevel`, `children`).
+
+    Ejemplo de uso:
+        >>> root = generate_hierarchy("D_SEXO_0", depth = 1, fanout = 2)
+        >>> [child["cod"] for child in root["children"]]
+        ['01', '02']
+    """
+    next_id = first_id
+
+    def node(cod, des, level):
+        nonlocal next_id
+        current = {"id": str(next_id), "cod": cod, "des": des, "isLastLevel": level == depth, "children": []}
+        next_id += 1
+        return current
+
+    root = node(ROOT_CODES[0], f"Total {alias}", 0)
+    stack = [(root, "", 0)]
+    while stack:
+        parent, prefix, level = stack.pop()
+        if level == depth:
+            continue
+        for i in range(fanout):
+            cod = f"{prefix}{i + 1:02d}"
+            child = node(cod, f"{alias} {cod}", level + 1)
+            parent["children"].append(child)
+            stack.append((child, cod, level + 1))
+    return root
+
+
+def hierarchy_paths(root):
+    """
+    Combinaciones de códigos (sin el total) y descripción de cada nodo del árbol bajo la raíz, en preorden.
+    Son los valores posibles de las celdas de datos de la jerarquía.
+    """
+    paths = []
+    stack = [(child, []) for child in reversed(root["children"])]
+    while stack:
+        node, path = stack.pop()
+        current = path + [node["cod"]]
+        paths.append((current, node["des"]))
+        stack.extend((child, current) for child in reversed(node["children"]))
+    return paths
+
+
+def generate_consulta(n_rows, n_hierarchies = 3, depth = 3, fanout = 5, n_measures = 2, missing = 0.01, seed = 0,
+                      consulta_id = 99999, base_url = BASE_URL):
+    """
+    Genera una consulta sintética y las respuestas de sus jerarquías.
+
+    Parámetros:
+        n_rows (int): Número de filas de datos.
+        n_hierarchies (int, opcional): Número de jerarquías (columnas de dimensión).
+        depth (int, opcional): Niveles de cada jerarquía bajo el total.
+        fanout (int, opcional): Hijos por nodo.
+        n_measures (int, opcional): Número de medidas.
+        missing (float, opcional): Proporción de valores de medida vacíos (`""`), como los no disponibles de BADEA.
+        seed (int, opcional): Semilla del generador aleatorio, para obtener siempre la misma consulta.
+        consulta_id (int, opcional): Id de la consulta en `metainfo`.
+        base_url (str, opcional): Url base de las urls de las jerarquías.
+
+    Retorna:
+        tuple: `(consulta, hierarchy_values)`, con el JSON de la consulta y un diccionario
+               `{url_de_la_jerarquia: respuesta}`.
+
+    Ejemplo de uso:
+        >>> consulta, hierarchy_values = generate_consulta(1000, depth = 2, fanout = 4)
+        >>> len(consulta["data"]), len(consulta["hierarchies"]), len(hierarchy_values)
+        (1000, 3, 3)
+    """
+    rng = np.random.default_rng(seed)
+    hierarchies = []
+    hierarchy_values = {}
+    columns = []
+    first_id = 1
+    for h in range(n_hierarchies):
+        alias = f"D_SINTETICA{h + 1}_0"
+        url = f"{base_url}/jerarquia/{alias}"
+        root = generate_hierarchy(alias, depth, fanout, first_id)
+        first_id += 10 ** 7
+        hierarchies.append({"alias": alias, "des": f"Jerarquía sintética {h + 1}", "url": url})
+        hierarchy_values[url] = {"data": root}
+
+        cells = [{"cod": cod, "des": des} for cod, des in hierarchy_paths(root)]
+        columns.append([cells[i] for i in rng.integers(0, len(cells), n_rows)])
+
+    measures = [{"des": f"Medida {m + 1}"} for m in range(n_measures)]
+    for _ in range(n_measures):
+        values = np.round(rng.normal(1000, 250, n_rows), 2).tolist()
+        empty = rng.random(n_rows) < missing
+        columns.append([{"val": "" if e else v, "format": "" if e else str(v).replace(".", ",")}
+                        for v, e in zip(values, empty.tolist())])
+
+    data = [list(row) for row in zip(*columns)] if columns else []
+    consulta = {
+        "hierarchies": hierarchies,
+        "measures": measures,
+        "data": data,
+        "metainfo": {"id": consulta_id, "title": f"Consulta sintética ({n_rows} filas)"},
+    }
+    return consulta, hierarchy_values
+
+
+def consulta_body(consulta):
+    """
+    Cuerpo de la respuesta de la consulta en bytes, como lo devolvería la API.
+    """
+    return json.dumps(consulta, ensure_ascii = False).encode("utf-8")
+
+
+def hierarchy_values_for(consulta, hierarchy_values):
+    """
+    Respuestas de las jerarquías en el orden de `consulta["hierarchies"]`, para
+    `APIDataHandler.process_all_hierarchies(hierarchy_values = ...)`.
+    """
+    return [hierarchy_values[hier["url"]] for hier in consulta["hierarchies"]]
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+Escritura por lotes, con memoria constante, de las tablas de una consulta en Excel o CSV/TSV.
+
+`DataFrame.to_excel` construye en memoria el libro completo (una celda de openpyxl por valor) antes de
+guardarlo. Aquí el libro se abre en modo `write_only` de openpyxl, que vuelca cada fila a disco según se
+añade, y las filas se generan por lotes a partir de las columnas del DataFrame, de forma que la memoria
+no depende del número de filas. Un mismo libro puede contener varias hojas, que se escriben en una pasada.
+"""
+
+import re
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+
+# Límites de Excel: filas por hoja (cabecera incluida) y nombres de las hojas
+MAX_EXCEL_ROWS = 1048576
+_MAX_SHEET_NAME = 31
+_INVALID_SHEET_CHARS = re.compile(r'[\[\]:*?/\\]')
+
+
+def iter_row_batches(df, batch_size = 10000, transform = None):
+    """
+    Recorre las filas de un DataFrame por lotes, como listas de tuplas de valores de Python.
+
+    Los valores nulos (NaN, NA, None) se convierten en None y las listas (combinaciones de códigos) en
+    su representación en texto, igual que en `to_excel`. Si se indica `transform`, se aplica a cada lote
+    (un DataFrame de `batch_size` filas como máximo) antes de convertirlo.
+
+    Ejemplo de uso:
+        >>> df = pd.DataFrame({"COD_combination": [["01"], []], "Des2": ["Almería", None]})
+        >>> list(iter_row_batches(df, batch_size = 1))
+        [[("['01']", 'Almería')], [('[]', None)]]
+    """
+    for start in range(0, len(df), batch_size):
+        chunk = df.iloc[start:start + batch_size]
+        if transform is not None:
+            chunk = transform(chunk)
+        columns = [_column_values(chunk[col]) for col in chunk.columns]
+        yield list(zip(*columns))
+
+
+def _column_values(series):
+    values = series.tolist()
+    # Enteros y booleanos de numpy: no pueden contener nulos ni listas
+    if isinstance(series.dtype, np.dtype) and series.dtype.kind in "iub":
+        return values
+    return [_excel_value(value) for value in values]
+
+
+def _excel_value(value):
+    if value is None or value is pd.NA or value is pd.NaT:
+        return None
+    if isinstance(value, float) and value != value:
+        return None
+    if isinstance(value, (list, tuple, dict)):
+        return str(value)
+    return value
+
+
+def sheet_name(name, used = ()):
+    """
+    Nombre de hoja válido en Excel a partir de `name`: sin los caracteres no permitidos, de 31 caracteres
+    como máximo y distinto de los de `used`.
+    """
+    base = _INVALID_SHEET_CHARS.sub("_", str(name))[:_MAX_SHEET_NAME] or "Hoja"
+    candidate, n = base, 1
+    while candidate.lower() in {u.lower() for u in used}:
+        suffix = f"_{n}"
+        candidate = base[:_MAX_SHEET_NAME - len(suffix)] + suffix
+        n += 1
+    return candidate
+
+
+def write_xlsx(path, sheets, batch_size = 10000, transform = None):
+    """
+    Escribe una o varias tablas en un libro de Excel, cada una en su hoja, en una sola pasada.
+
+    Parámetros:
+        path (str): Ruta del fichero `.xlsx`.
+        sheets (iterable of tuples): Pares `(nombre_de_hoja, DataFrame)`, en el orden de las hojas.
+                                     Los nombres se ajustan a las restricciones de Excel (ver `sheet_name`).
+        batch_size (int, opcional): Número de filas que se convierten a la vez.
+        transform (callable, opcional): Función que se aplica a cada lote de filas (ver `iter_row_batches`).
+
+    Retorna:
+        list of str: Nombres de las hojas escritas.
+
+    Excepciones:
+        ValueError: Si una tabla supera el máximo de filas de una hoja de Excel (1.048.576, cabecera incluida).
+    """
+    workbook = Workbook(write_only = True)
+    names = []
+    try:
+        for name, df in sheets:
+            if len(df) + 1 > MAX_EXCEL_ROWS:
+                raise ValueError(f"La tabla de la hoja '{name}' tiene {len(df)} filas y supera el máximo de Excel "
+                                 f"({MAX_EXCEL_ROWS - 1}). Use CSV/TSV.")
+            name = sheet_name(name, names)
+            names.append(name)
+            worksheet = workbook.create_sheet(title = name)
+            worksheet.append([str(col) for col in df.columns])
+            for rows in iter_row_batches(df, batch_size, transform):
+                for row in rows:
+                    worksheet.append(row)
+        if not names:
+            workbook.create_sheet(title = "Hoja")
+        workbook.save(path)
+    finally:
+        workbook.close()
+    return names
+
+
+def write_delimited(path, df, sep = ";", decimal = ".", batch_size = 10000, header = True, mode = "w"):
+    """
+    Escribe una tabla en CSV/TSV por lotes de `batch_size` filas (`to_csv` con `chunksize`), sin
+    convertir antes la tabla completa a texto.
+    """
+    df.to_csv(path, index = False, sep = sep, decimal = decimal, chunksize = batch_size, header = header,
+              mode = mode)
+    return path
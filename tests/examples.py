@@ -90,3 +90,11 @@ processed_data = handler.process_all_hierarchies()
 # =============================================================================
 
 final_dataset = handler.map_data_w_hierarchies_info()
+
+# =============================================================================
+# 6. Caché de resultados: si la consulta no ha cambiado desde la última
+#    ejecución, el resultado mapeado se carga desde disco.
+# =============================================================================
+# from src.result_cache import ResultCache
+# cache = ResultCache("cache_badea", ttl = 24 * 3600)
+# final_dataset = cache.get_dataset(url, params = params)
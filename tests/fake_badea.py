@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+Consulta ficticia con la estructura de respuesta de BADEA para ejecutar las pruebas sin conexión.
+
+Contiene tres jerarquías (sexo, periodo y territorio), dos medidas y las respuestas de las urls
+de cada jerarquía, de forma que se pueda construir un `APIDataHandler` sin consultar la API real.
+"""
+import hashlib
+import json
+from urllib.parse import parse_qsl, urlsplit
+
+BASE_URL = "https://fake.badea/rest/v1.0"
+
+HIERARCHIES = [
+    {"alias": "D_SEXO_0", "des": "Sexo", "url": f"{BASE_URL}/jerarquia/D_SEXO_0"},
+    {"alias": "D_TEMPORAL_0", "des": "Periodo", "url": f"{BASE_URL}/jerarquia/D_TEMPORAL_0"},
+    {"alias": "D_AA_TERRITROIO_0", "des": "Territorio", "url": f"{BASE_URL}/jerarquia/D_AA_TERRITROIO_0"},
+]
+
+MEASURES = [
+    {"des": "Número de autónomos"},
+    {"des": "Tasa de variación"},
+]
+
+
+def _node(id_, cod, des, children=None):
+    return {
+        "id": id_,
+        "cod": cod,
+        "des": des,
+        "isLastLevel": not children,
+        "children": children or [],
+    }
+
+
+HIERARCHY_VALUES = {
+    f"{BASE_URL}/jerarquia/D_SEXO_0": {"data": _node("3691", "Total", "Ambos sexos", [
+        _node("3689", "1", "Hombres"),
+        _node("3690", "6", "Mujeres"),
+    ])},
+    f"{BASE_URL}/jerarquia/D_TEMPORAL_0": {"data": _node("180000", "TOTAL", "Total periodos", [
+        _node("180156", "2020", "2020"),
+        _node("180175", "2021", "2021"),
+        _node("180194", "2022", "2022"),
+    ])},
+    f"{BASE_URL}/jerarquia/D_AA_TERRITROIO_0": {"data": _node("515000", "Total", "Total territorio", [
+        _node("515892", "01", "Andalucía", [
+            _node("515893", "04", "Almería", [
+                _node("515894", "04001", "Abla"),
+                _node("515895", "04002", "Abrucena"),
+            ]),
+            _node("515902", "11", "Cádiz", [
+                _node("515903", "11001", "Alcalá de los Gazules"),
+            ]),
+        ]),
+        _node("515999", "99", "Extranjero"),
+    ])},
+}
+
+
+def _cell(cod, des):
+    return {"cod": cod, "des": des}
+
+
+def _measure(val):
+    return {"val": val, "format": str(val).replace(".", ",")}
+
+
+DATA = [
+    [_cell(["1"], "Hombres"), _cell(["2020"], "2020"), _cell(["01", "04"], "Almería"),
+     _measure(120), _measure(1.5)],
+    [_cell(["6"], "Mujeres"), _cell(["2020"], "2020"), _cell(["01", "04"], "Almería"),
+     _measure(98), _measure(-0.25)],
+    [_cell(["1"], "Hombres"), _cell(["2021"], "2021"), _cell(["01", "04", "04001"], "Abla"),
+     _measure(7), _measure(2.0)],
+    [_cell(["6"], "Mujeres"), _cell(["2022"], "2022"), _cell(["01", "11", "11001"], "Alcalá de los Gazules"),
+     _measure(3), _measure("")],
+    [_cell(["1"], "Hombres"), _cell(["2022"], "2022"), _cell(["01"], "Andalucía"),
+     _measure(45210), _measure(0.75)],
+]
+
+CONSULTA = {
+    "hierarchies": HIERARCHIES,
+    "measures": MEASURES,
+    "data": DATA,
+    "metainfo": {"id": 44804, "title": "Autónomos por sexo y territorio"},
+}
+
+
+class FakeResponse:
+    """
+    Respuesta mínima compatible con `requests.Response` para las pruebas.
+    """
+
+    def __init__(self, payload, status_code=200, headers=None, url=None):
+        self.payload = payload
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.url = url
+        self.content = json.dumps(payload).encode("utf-8")
+
+    def json(self):
+        return json.loads(self.content)
+
+    def iter_content(self, chunk_size=1):
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start:start + chunk_size]
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+
+def fake_request_hierarchies_values(hierarchy_element, cache=None, client=None):
+    """
+    Sustituto de `APIDataHandler.request_hierarchies_values` que devuelve los valores ficticios.
+    """
+    return json.loads(json.dumps(HIERARCHY_VALUES[hierarchy_element["url"]]))
+
+
+def consulta_response():
+    return FakeResponse(CONSULTA)
+
+
+CONSULTA_URL = f"{BASE_URL}/consulta/44804"
+
+# Ids de los parámetros de la consulta -> código de la celda de datos, por jerarquía
+PARAM_IDS = {
+    "D_TEMPORAL_0": {"180156": "2020", "180175": "2021", "180194": "2022"},
+    "D_SEXO_0": {"3689": "1", "3690": "6"},
+}
+
+
+def filter_consulta(params=None):
+    """
+    Consulta ficticia con solo las filas de los ids indicados en `params` (para `D_TEMPORAL_0` y `D_SEXO_0`),
+    como haría la API al añadir esos parámetros a la url de la consulta.
+    """
+    rows = DATA
+    for position, hier in enumerate(HIERARCHIES):
+        ids = (params or {}).get(hier["alias"])
+        if ids and hier["alias"] in PARAM_IDS:
+            codes = {PARAM_IDS[hier["alias"]][id_] for id_ in str(ids).split(",")}
+            rows = [row for row in rows if row[position]["cod"][-1] in codes]
+    return dict(CONSULTA, data=rows)
+
+
+class FakeBADEATransport:
+    """
+    Transporte local para `BADEAClient` que responde a la url de la consulta ficticia (filtrando sus filas
+    por los parámetros) y a las urls de sus jerarquías, registrando cada petición en `calls`.
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def get(self, url, params=None, headers=None, timeout=None, stream=False):
+        self.calls.append({"url": url, "params": dict(params or {}), "headers": dict(headers or {})})
+        if url in HIERARCHY_VALUES:
+            return FakeResponse(HIERARCHY_VALUES[url], url=url)
+        if url.startswith(CONSULTA_URL):
+            # Los parámetros pueden llegar en `params` o ya incluidos en la url
+            query = dict(parse_qsl(urlsplit(url).query))
+            query.update(params or {})
+            response = FakeResponse(filter_consulta(query), url=url)
+            etag = '"' + hashlib.sha256(response.content).hexdigest()[:16] + '"'
+            if (headers or {}).get("If-None-Match") == etag:
+                return FakeResponse({}, status_code=304, headers={"ETag": etag}, url=url)
+            response.headers["ETag"] = etag
+            return response
+        return FakeResponse({}, status_code=404, url=url)
+
+    def consulta_calls(self):
+        return [call for call in self.calls if call["url"].startswith(CONSULTA_URL)]
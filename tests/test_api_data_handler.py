@@ -1,40 +1,61 @@
 import unittest
-import requests
-import sys 
+import sys
 import os
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
-from src.main import APIDataHandler 
+from src.main import APIDataHandler
+from http_client import BADEAClient
+import replay
+
+# Respuestas grabadas de la API (consultas y jerarquías). Se graban ejecutando las pruebas con BADEA_RECORD=1.
+# La prueba no se omite: sin una respuesta grabada falla con replay.MissingFixtureError.
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "badea")
+
+BASE_URL = "https://www.juntadeandalucia.es/institutodeestadisticaycartografia/intranet/admin/rest/v1.0/consulta"
+
+CONSULTAS = {
+    "44804": (f"{BASE_URL}/44804?", {
+        "D_TEMPORAL_0" : "180156,180175,180194",
+        "AA_TERRITROIO_0" : "515892,515902",
+        "posord" : "f[D_AA_TERRITROIO_0],f[D_TEMPORAL_0],f[D_SEXO_0],f[D_EDAD_0],f[D_AA_TIPRELSSANO_0],c[Measures]"
+    }),
+    "13514": (f"{BASE_URL}/13514?", {
+        "D_TEMPORAL_0" : "180156,180175,180194,180213",
+        "posord" : "f[D_SEXO_0],f[D_CNED2014_0],f[D_EPA_NIVEL_0],f[D_TEMPORAL_0],f[D_EDAD_0],c[Measures],p[D_EPA_RELACTIVIDAD_0],p[D_TERRITORIO_0]"
+    }),
+}
+
 
 class TestAPIDataHandlerRealQuery(unittest.TestCase):
 
     def setUp(self):
-        """Realiza una consulta real a la API y configura la clase."""
-        self.url = "https://www.juntadeandalucia.es/institutodeestadisticaycartografia/intranet/admin/rest/v1.0/consulta/44804?"
-        self.params = {
-            "D_TEMPORAL_0" : "180156,180175,180194",
-            "AA_TERRITROIO_0" : "515892,515902",
-            "posord" : "f[D_AA_TERRITROIO_0],f[D_TEMPORAL_0],f[D_SEXO_0],f[D_EDAD_0],f[D_AA_TIPRELSSANO_0],c[Measures]"
-        }
-        # Realizar la solicitud a la API
-        response = requests.get(self.url, params=self.params)
+        """Configura un cliente que reproduce las respuestas grabadas de la API (o las graba con BADEA_RECORD=1)."""
+        self.client = BADEAClient(transport=replay.ReplayTransport(FIXTURES))
+
+    def query(self, consulta):
+        """Realiza la consulta a la API y configura la clase."""
+        url, params = CONSULTAS[consulta]
+        response = self.client.get(url, params=params)
         self.assertEqual(response.status_code, 200, "La API no está disponible o la consulta falló.")
 
         # Inicializar la clase con la respuesta real
-        self.handler = APIDataHandler(response)
+        return APIDataHandler(response, client=self.client)
 
     def test_real_api_processing(self):
         """Prueba el procesamiento de datos reales de la API."""
-        # Procesar datos y jerarquías
-        self.handler.get_DataFrame_dataJSON(process_measures=True)
-        self.handler.process_all_hierarchies()
-        self.handler.map_data_w_hierarchies_info()
-
-        # Verificar que los datos mapeados contengan información esperada
-        df_mapped = self.handler.df_data_mapped
-        self.assertIsNotNone(df_mapped, "El DataFrame mapeado está vacío.")
-        self.assertGreater(len(df_mapped), 0, "El DataFrame mapeado no contiene filas.")
-        self.assertTrue("Des1" in self.handler.hierarchies_info_df.columns, "La columna Des1 no está presente en el DataFrame mapeado.")
+        for consulta in CONSULTAS:
+            with self.subTest(consulta=consulta):
+                handler = self.query(consulta)
+                # Procesar datos y jerarquías
+                handler.get_DataFrame_dataJSON(process_measures=True)
+                handler.process_all_hierarchies()
+                handler.map_data_w_hierarchies_info()
+
+                # Verificar que los datos mapeados contengan información esperada
+                df_mapped = handler.df_data_mapped
+                self.assertIsNotNone(df_mapped, "El DataFrame mapeado está vacío.")
+                self.assertGreater(len(df_mapped), 0, "El DataFrame mapeado no contiene filas.")
+                self.assertTrue("Des1" in handler.hierarchies_info_df.columns, "La columna Des1 no está presente en el DataFrame mapeado.")
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,102 @@
+import unittest
+import sys
+import os
+import asyncio
+import threading
+import time
+from unittest import mock
+
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+from src.main import APIDataHandler
+from http_client import BADEAClient
+import batch
+import refresh
+import fake_badea
+
+PARAMS = {"D_TEMPORAL_0": "180156,180175", "posord": "f[D_AA_TERRITROIO_0],f[D_TEMPORAL_0],c[Measures]"}
+
+
+class SlowTransport(fake_badea.FakeBADEATransport):
+    """
+    Transporte ficticio que tarda en responder y registra el máximo de peticiones simultáneas.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def get(self, *args, **kwargs):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(0.02)
+            return super().get(*args, **kwargs)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+
+class TestAsyncPipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.transport = SlowTransport()
+        self.client = BADEAClient(transport=self.transport)
+
+    def expected(self):
+        dataset, _ = refresh.run_consulta(fake_badea.CONSULTA_URL, PARAMS, client=self.client, numeric_measures=True)
+        return dataset
+
+    def test_async_pipeline_matches_sync(self):
+        async def pipeline():
+            semaphore = asyncio.Semaphore(2)
+            handler = await APIDataHandler.from_url_async(fake_badea.CONSULTA_URL, PARAMS, client=self.client,
+                                                          semaphore=semaphore)
+            await handler.get_DataFrame_dataJSON_async(process_measures=True, numeric_measures=True)
+            await handler.process_all_hierarchies_async(semaphore=semaphore)
+            return await handler.map_data_w_hierarchies_info_async()
+
+        dataset = asyncio.run(pipeline())
+        self.assertLessEqual(self.transport.max_in_flight, 2)
+        pd.testing.assert_frame_equal(dataset, self.expected())
+
+    def test_split_parts_share_the_semaphore(self):
+        params = dict(PARAMS, D_TEMPORAL_0="180156,180175,180194")
+        loop_threads = []
+        from_json = APIDataHandler.from_json.__func__
+
+        def recording_from_json(cls, *args, **kwargs):
+            loop_threads.append(threading.current_thread() is threading.main_thread())
+            return from_json(cls, *args, **kwargs)
+
+        async def fetch():
+            return await APIDataHandler.from_url_async(fake_badea.CONSULTA_URL, params, client=self.client,
+                                                       semaphore=asyncio.Semaphore(1), split_by={"D_TEMPORAL_0": 1})
+
+        with mock.patch.object(APIDataHandler, "from_json", classmethod(recording_from_json)):
+            handler = asyncio.run(fetch())
+        self.assertEqual(len(self.transport.consulta_calls()), 3)
+        self.assertEqual(self.transport.max_in_flight, 1)
+        self.assertEqual(len(handler.data), 5)
+        # from_json no se ejecuta en el hilo del bucle de eventos
+        self.assertEqual(loop_threads, [False])
+
+    def test_run_batch_async_bounded_with_failures(self):
+        jobs = [{"url": fake_badea.CONSULTA_URL, "params": PARAMS}, {"id": 99999},
+                {"url": fake_badea.CONSULTA_URL, "params": dict(PARAMS, D_TEMPORAL_0="180194")}]
+        results = asyncio.run(batch.run_batch_async(jobs, client=self.client, max_concurrency=3, numeric_measures=True,
+                                                    base_url=fake_badea.BASE_URL + "/consulta/"))
+        self.assertLessEqual(self.transport.max_in_flight, 3)
+        self.assertEqual([r["ok"] for r in results], [True, False, True])
+        self.assertEqual(results[1]["stage"], "fetch")
+        pd.testing.assert_frame_equal(results[0]["dataset"], self.expected())
+        self.assertEqual(len(results[2]["dataset"]), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+import sys
+import os
+import json
+import tempfile
+
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+from http_client import BADEAClient
+import batch
+import refresh
+import fake_badea
+
+POSORD = "f[D_AA_TERRITROIO_0],f[D_TEMPORAL_0],c[Measures]"
+JOBS = [
+    {"url": fake_badea.CONSULTA_URL, "params": {"D_TEMPORAL_0": "180156,180175", "posord": POSORD}},
+    {"id": 99999, "name": "inexistente"},
+    {"url": fake_badea.CONSULTA_URL, "params": {"D_TEMPORAL_0": "180194", "posord": POSORD}},
+]
+
+
+class TestBatchRunner(unittest.TestCase):
+
+    def setUp(self):
+        self.transport = fake_badea.FakeBADEATransport()
+        self.client = BADEAClient(transport=self.transport)
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = tmp.name
+
+    def expected(self, params):
+        dataset, _ = refresh.run_consulta(fake_badea.CONSULTA_URL, params, client=self.client, numeric_measures=True)
+        return dataset
+
+    def test_failures_do_not_abort_the_batch(self):
+        results = batch.run_batch(JOBS, client=self.client, numeric_measures=True, process_workers=0,
+                                  base_url=fake_badea.BASE_URL + "/consulta/")
+        self.assertEqual([r["ok"] for r in results], [True, False, True])
+        self.assertEqual([r["name"] for r in results], ["44804", "inexistente", "44804_2"])
+        self.assertEqual(results[1]["stage"], "fetch")
+        self.assertIn("404", results[1]["error"])
+        for job, result in zip(JOBS[::2], results[::2]):
+            pd.testing.assert_frame_equal(result["dataset"], self.expected(job["params"]))
+
+    def test_process_pool_and_output_dir(self):
+        manifest = os.path.join(self.tmp, "consultas.json")
+        with open(manifest, "w", encoding="utf-8") as f:
+            json.dump({"base_url": fake_badea.BASE_URL + "/consulta", "output_dir": os.path.join(self.tmp, "salida"),
+                       "consultas": [{"id": 44804, "name": "autonomos", "params": JOBS[0]["params"]}]}, f)
+
+        jobs = batch.load_manifest(manifest)
+        self.assertEqual(jobs[0]["url"], fake_badea.CONSULTA_URL)
+        results = batch.run_manifest(manifest, client=self.client, numeric_measures=True, process_workers=2)
+        self.assertTrue(results[0]["ok"], results[0]["error"])
+        self.assertEqual(results[0]["path"], os.path.join(self.tmp, "salida", "autonomos.pkl"))
+        pd.testing.assert_frame_equal(pd.read_pickle(results[0]["path"]), self.expected(JOBS[0]["params"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
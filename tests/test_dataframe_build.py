@@ -0,0 +1,83 @@
+import unittest
+import tempfile
+import sys
+import os
+
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+from src.main import APIDataHandler
+from frame_builder import ColumnarDataBuilder
+import functions
+import fake_badea
+
+
+class TestDataFrameBuild(unittest.TestCase):
+
+    def setUp(self):
+        self.handler = APIDataHandler(fake_badea.consulta_response())
+        self.aliases = [h["alias"] for h in fake_badea.HIERARCHIES]
+        self.measures = [m["des"] for m in fake_badea.MEASURES]
+
+    def test_columns_and_codes(self):
+        df = self.handler.get_DataFrame_dataJSON()
+        self.assertEqual(list(df.columns), self.aliases + self.measures + [a + "_cod" for a in self.aliases])
+        self.assertEqual(df["D_AA_TERRITROIO_0_cod"].tolist()[2], ["01", "04", "04001"])
+        self.assertEqual(df["D_SEXO_0"].tolist()[0], {"cod": ["1"], "des": "Hombres"})
+        self.assertTrue((df.dtypes == object).all())
+
+    def test_matches_dataframe_of_dicts(self):
+        """Mismo resultado que construir el DataFrame de diccionarios y extraer 'cod' por filas."""
+        data = fake_badea.DATA + [[None, {"des": "sin código"}, {"cod": ["99"]}, {"val": 1}, "x"]]
+        expected = pd.DataFrame(data, columns=self.aliases + self.measures)
+        for alias in self.aliases:
+            expected[alias + "_cod"] = expected[alias].apply(
+                lambda x: x["cod"] if isinstance(x, dict) and "cod" in x else None)
+
+        builder = ColumnarDataBuilder()
+        builder.extend(data[:2])
+        builder.extend(iter(data[2:]))
+        pd.testing.assert_frame_equal(builder.to_frame(self.aliases, self.measures), expected)
+
+    def test_rows_with_wrong_length(self):
+        builder = ColumnarDataBuilder()
+        with self.assertRaises(ValueError):
+            builder.extend([fake_badea.DATA[0], fake_badea.DATA[0][:-1]])
+        builder.extend(fake_badea.DATA)
+        with self.assertRaises(ValueError):
+            builder.to_frame(self.aliases, self.measures[:1])
+
+
+class TestNumericMeasures(unittest.TestCase):
+
+    def setUp(self):
+        self.handler = APIDataHandler(fake_badea.consulta_response())
+
+    def test_measures_keep_numeric_dtypes(self):
+        df = self.handler.get_DataFrame_dataJSON(process_measures=True, numeric_measures=True)
+        self.assertEqual(str(df["Número de autónomos"].dtype), "Int64")
+        self.assertEqual(str(df["Tasa de variación"].dtype), "float64")
+        self.assertEqual(df["Número de autónomos"].tolist(), [120, 98, 7, 3, 45210])
+        self.assertTrue(pd.isna(df["Tasa de variación"].iloc[3]))
+        self.assertEqual(list(df.columns[-2:]), ["Número de autónomos", "Tasa de variación"])
+
+    def test_decimal_comma_only_at_export(self):
+        legacy = APIDataHandler(fake_badea.consulta_response()).get_DataFrame_dataJSON(process_measures=True)
+        df = self.handler.get_DataFrame_dataJSON(process_measures=True, numeric_measures=True)
+        formatted = functions.format_decimal_comma(df, ["Número de autónomos", "Tasa de variación"])
+        self.assertEqual(formatted["Tasa de variación"].tolist(), legacy["Tasa de variación"].tolist())
+        self.assertEqual(formatted["Número de autónomos"].tolist(), legacy["Número de autónomos"].tolist())
+        self.assertEqual(str(df["Tasa de variación"].dtype), "float64")
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "datos.csv")
+            self.handler.save_dataset(path, dataset=df[["Número de autónomos", "Tasa de variación"]])
+            with open(path, encoding="utf-8") as f:
+                lines = f.read().splitlines()
+        self.assertEqual(lines[0], "Número de autónomos;Tasa de variación")
+        self.assertEqual(lines[2], "98;-0,25")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+import sys
+import os
+import tempfile
+import importlib.util
+from unittest import mock
+
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+from src.main import APIDataHandler
+import export
+import fake_badea
+
+HAS_PYARROW = importlib.util.find_spec("pyarrow") is not None
+
+
+def processed_handler():
+    with mock.patch.object(APIDataHandler, "request_hierarchies_values",
+                           staticmethod(fake_badea.fake_request_hierarchies_values)):
+        handler = APIDataHandler(fake_badea.consulta_response())
+        handler.get_DataFrame_dataJSON(process_measures=True, numeric_measures=True)
+        handler.process_all_hierarchies()
+        handler.map_data_w_hierarchies_info()
+    return handler
+
+
+class TestPrepareFrame(unittest.TestCase):
+
+    def test_raw_cells_codes_and_dictionary_columns(self):
+        handler = APIDataHandler(fake_badea.consulta_response())
+        df = handler.get_DataFrame_dataJSON()
+        measures = handler._measure_columns_in(df)
+        prepared = export.prepare_frame(df, export.description_columns(df, measures), measures)
+        self.assertEqual(prepared["D_SEXO_0"].tolist(), ["Hombres", "Mujeres", "Hombres", "Mujeres", "Hombres"])
+        self.assertEqual(str(prepared["D_SEXO_0"].dtype), "category")
+        self.assertEqual(str(prepared["Número de autónomos"].dtype), "Int64")
+        self.assertEqual(prepared["D_AA_TERRITROIO_0_cod"].iloc[2], ["01", "04", "04001"])
+        # El DataFrame original no se modifica
+        self.assertIsInstance(df["D_SEXO_0"].iloc[0], dict)
+
+    def test_hierarchy_description_columns(self):
+        handler = processed_handler()
+        self.assertEqual(export.description_columns(handler.hierarchies_info_df),
+                         ["Variable", "Des1", "Des2", "Des3", "Des4"])
+
+    def test_unknown_extension(self):
+        with self.assertRaises(ValueError):
+            export.write_table(pd.DataFrame({"a": [1]}), "tabla.xlsx")
+
+
+@unittest.skipUnless(HAS_PYARROW, "pyarrow no está instalado")
+class TestExportTables(unittest.TestCase):
+
+    def test_round_trip_parquet_and_arrow(self):
+        handler = processed_handler()
+        with tempfile.TemporaryDirectory() as directory:
+            for file_format in ("parquet", "arrow"):
+                paths = handler.export_tables(directory, file_format=file_format)
+                self.assertEqual(set(paths), {"df_data_mapped", "df_data", "hierarchies_info_df"})
+                mapped = export.read_table(paths["df_data_mapped"])
+                self.assertEqual(str(mapped["SEXO2"].dtype), "category")
+                self.assertEqual(mapped["SEXO2"].tolist(), handler.df_data_mapped["SEXO2"].tolist())
+                hierarchies = export.read_table(paths["hierarchies_info_df"])
+                self.assertEqual(list(hierarchies["COD_combination"].iloc[9]), ["01", "04"])
+
+
+@unittest.skipIf(HAS_PYARROW, "pyarrow está instalado")
+class TestExportWithoutPyarrow(unittest.TestCase):
+
+    def test_clear_import_error(self):
+        handler = processed_handler()
+        with tempfile.TemporaryDirectory() as directory:
+            with self.assertRaisesRegex(ImportError, "pip install pyarrow"):
+                handler.export_tables(directory)
+
+
+if __name__ == "__main__":
+    unittest.main()
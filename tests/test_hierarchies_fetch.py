@@ -0,0 +1,49 @@
+import unittest
+import threading
+import time
+import sys
+import os
+from unittest import mock
+
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+from src.main import APIDataHandler
+import fake_badea
+
+
+class TestConcurrentHierarchiesFetch(unittest.TestCase):
+
+    def setUp(self):
+        """Construye la clase con la consulta ficticia y controla las peticiones de jerarquías."""
+        self.handler = APIDataHandler(fake_badea.consulta_response())
+        self.lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+
+    def slow_request(self, hierarchy_element, cache=None, client=None):
+        """Las primeras jerarquías tardan más, para que terminen en orden inverso."""
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        position = [h["url"] for h in fake_badea.HIERARCHIES].index(hierarchy_element["url"])
+        time.sleep(0.05 * (len(fake_badea.HIERARCHIES) - position))
+        with self.lock:
+            self.active -= 1
+        return fake_badea.fake_request_hierarchies_values(hierarchy_element)
+
+    def test_concurrent_matches_sequential(self):
+        """El modo concurrente descarga en paralelo y conserva el orden de `self.hierarchies`."""
+        with mock.patch.object(APIDataHandler, "request_hierarchies_values", staticmethod(self.slow_request)):
+            sequential = self.handler.process_all_hierarchies().copy()
+            self.assertEqual(self.max_active, 1)
+            concurrent = self.handler.process_all_hierarchies(max_workers=4)
+
+        self.assertGreater(self.max_active, 1, "Las jerarquías no se han descargado en paralelo.")
+        self.assertEqual(list(pd.unique(concurrent["Variable"])), [h["alias"] for h in fake_badea.HIERARCHIES])
+        self.assertTrue(sequential.equals(concurrent))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+import sys
+import os
+
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+from src.main import APIDataHandler
+import hierarchy_flatten
+import fake_badea
+
+
+def recursive_frame(hierarchies):
+    """Tabla de jerarquías construida con el recorrido recursivo original."""
+    handler = APIDataHandler.__new__(APIDataHandler)
+    handler.result_rows = []
+    for alias, root in hierarchies:
+        handler.process_hierarchy_level(alias, root)
+    df = pd.DataFrame(handler.result_rows)
+    df["COD_combination"] = df["COD_combination"].apply(handler.clean_cod_combination)
+    return df
+
+
+def chain(depth):
+    """Jerarquía lineal de `depth` niveles."""
+    root = node = {"id": "0", "cod": "Total", "des": "Total", "isLastLevel": False, "children": []}
+    for level in range(1, depth):
+        child = {"id": str(level), "cod": f"C{level}", "des": f"Nivel {level}",
+                 "isLastLevel": level == depth - 1, "children": []}
+        node["children"].append(child)
+        node = child
+    return root
+
+
+class TestFlattenHierarchy(unittest.TestCase):
+
+    def test_same_frame_as_recursive_flattening(self):
+        hierarchies = [(hier["alias"], fake_badea.HIERARCHY_VALUES[hier["url"]]["data"])
+                       for hier in fake_badea.HIERARCHIES]
+        flattened = [(alias, hierarchy_flatten.flatten_hierarchy(root)) for alias, root in hierarchies]
+        pd.testing.assert_frame_equal(hierarchy_flatten.hierarchies_frame(flattened),
+                                      recursive_frame(hierarchies))
+
+    def test_buffers_in_preorder(self):
+        nodes = hierarchy_flatten.flatten_hierarchy(
+            fake_badea.HIERARCHY_VALUES[fake_badea.HIERARCHIES[2]["url"]]["data"])
+        self.assertEqual(nodes["cod"][:4], ["Total", "01", "04", "04001"])
+        self.assertEqual(nodes["parent"].tolist()[:4], [-1, 0, 1, 2])
+        self.assertEqual(nodes["level"].tolist()[:4], [1, 2, 3, 4])
+
+    def test_deeper_than_recursion_limit(self):
+        depth = sys.getrecursionlimit() + 100
+        df = hierarchy_flatten.hierarchies_frame([("CADENA", hierarchy_flatten.flatten_hierarchy(chain(depth)))])
+        self.assertEqual(len(df), depth)
+        self.assertEqual(len(df["COD_combination"].iloc[-1]), depth - 1)
+        self.assertEqual(df[f"Des{depth}"].iloc[-1], f"Nivel {depth - 1}")
+        self.assertTrue(pd.isna(df["Des2"].iloc[0]))
+
+
+if __name__ == "__main__":
+    unittest.main()
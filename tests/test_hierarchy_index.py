@@ -0,0 +1,78 @@
+import unittest
+import sys
+import os
+from unittest import mock
+
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+from src.main import APIDataHandler
+import functions
+import hierarchy_flatten
+import hierarchy_index
+import fake_badea
+
+TERRITORY = fake_badea.HIERARCHY_VALUES[fake_badea.HIERARCHIES[2]["url"]]["data"]
+
+
+def run_pipeline(**options):
+    with mock.patch.object(APIDataHandler, "request_hierarchies_values",
+                           staticmethod(fake_badea.fake_request_hierarchies_values)):
+        handler = APIDataHandler(fake_badea.consulta_response(), **options)
+        handler.get_DataFrame_dataJSON(process_measures=True)
+        handler.process_all_hierarchies()
+    return handler
+
+
+class TestHierarchyIndex(unittest.TestCase):
+
+    def test_lookups_by_id_cod_and_path(self):
+        index = hierarchy_index.HierarchyIndex.from_tree("D_AA_TERRITROIO_0", TERRITORY)
+        self.assertEqual(len(index), 8)
+        position = index.find_path(["01", "11", "11001"])
+        self.assertEqual((index.id[position], index.des[position]), ("515903", "Alcalá de los Gazules"))
+        self.assertEqual(index.find_id("515903"), position)
+        self.assertEqual(index.find_cod("11001"), position)
+        self.assertEqual(index.path(position), ["01", "11", "11001"])
+        self.assertEqual(index.cod[index.ancestors(position)].tolist(), ["Total", "01", "11", "11001"])
+        # La combinación vacía es el total raíz; las que no existen no se encuentran
+        self.assertEqual(index.find_path([]), 0)
+        self.assertEqual(index.find_path(["11"]), -1)
+        self.assertEqual(index.find_id("0"), -1)
+        self.assertEqual(index.find_paths([["01", "04"], "99", None, ["01", "04"]]).tolist(), [2, 7, -1, 2])
+
+    def test_same_positions_as_interned_frame(self):
+        nodes = hierarchy_flatten.flatten_hierarchy(TERRITORY)
+        index = hierarchy_index.HierarchyIndex("D_AA_TERRITROIO_0", nodes)
+        codes = {}
+        functions.intern_cod_paths(hierarchy_flatten.cod_combinations(nodes), codes)
+        values = [["01", "04", "04002"], ["01"], ["02"], [], "99"]
+        self.assertEqual(index.find_paths(values).tolist(),
+                         [codes.get(functions.cod_key(value), -1) for value in values])
+        pd.testing.assert_frame_equal(index.frame(), hierarchy_flatten.hierarchies_frame([(index.alias, nodes)]))
+
+    def test_repeated_paths_use_first_occurrence(self):
+        root = {"id": "0", "cod": "Total", "des": "Total", "isLastLevel": False, "children": [
+            {"id": "1", "cod": "A", "des": "A", "isLastLevel": True, "children": []},
+            {"id": "2", "cod": "A", "des": "A bis", "isLastLevel": False, "children": [
+                {"id": "3", "cod": "B", "des": "B", "isLastLevel": True, "children": []}]},
+        ]}
+        index = hierarchy_index.HierarchyIndex.from_tree("D_X_0", root)
+        self.assertEqual(index.duplicate_paths, 1)
+        self.assertEqual(index.find_path(["A"]), 1)
+        self.assertEqual(index.find_path(["A", "B"]), 3)
+
+    def test_handler_index_and_frame(self):
+        handler = run_pipeline()
+        self.assertEqual(list(handler.hierarchy_index), [hier["alias"] for hier in fake_badea.HIERARCHIES])
+        self.assertIs(handler.hierarchies_info_df, handler.hierarchies_info_df)
+
+        low_memory = run_pipeline(low_memory=True)
+        self.assertIsNone(low_memory._hierarchies_info_df)
+        pd.testing.assert_frame_equal(low_memory.hierarchies_info_df, handler.hierarchies_info_df)
+        self.assertIsNone(low_memory._hierarchies_info_df)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import unittest
+import sys
+import os
+import copy
+import json
+
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+from src.main import APIDataHandler
+import hierarchy_flatten
+import synthetic
+import fake_badea
+
+
+def run_pipeline(consulta, values, prune):
+    handler = APIDataHandler.from_json(copy.deepcopy(consulta), registry=False)
+    handler.get_DataFrame_dataJSON(process_measures=True)
+    handler.process_all_hierarchies(hierarchy_values=values, prune=prune)
+    handler.map_data_w_hierarchies_info()
+    return handler
+
+
+class TestHierarchyPruning(unittest.TestCase):
+
+    def test_only_observed_nodes_and_ancestors(self):
+        values = [fake_badea.HIERARCHY_VALUES[hier["url"]] for hier in fake_badea.HIERARCHIES]
+        full = run_pipeline(fake_badea.CONSULTA, values, prune=False)
+        pruned = run_pipeline(fake_badea.CONSULTA, values, prune=True)
+
+        territory = pruned.hierarchy_index["D_AA_TERRITROIO_0"]
+        self.assertEqual(territory.cod.tolist(), ["Total", "01", "04", "04001", "11", "11001"])
+        self.assertEqual([len(index) for index in pruned.hierarchy_index.values()], [3, 4, 6])
+        self.assertEqual(len(pruned.hierarchies_info_df), 13)
+        pd.testing.assert_frame_equal(pruned.df_data_mapped, full.df_data_mapped)
+
+        flatten = [r for r in pruned.stats.records if r["stage"] == "hierarchy_flatten"]
+        self.assertEqual([(r["pruned"], r["rows_out"]) for r in flatten], [(True, 3), (True, 4), (True, 6)])
+
+    def test_pruned_buffers_are_a_preorder_subset(self):
+        root = fake_badea.HIERARCHY_VALUES[fake_badea.HIERARCHIES[2]["url"]]["data"]
+        keep = hierarchy_flatten.observed_prefixes([["01", "11", "11001"], "99"])
+        self.assertEqual(keep, {(), ("01",), ("01", "11"), ("01", "11", "11001"), ("99",)})
+        nodes = hierarchy_flatten.flatten_hierarchy(root, keep=keep)
+        self.assertEqual(nodes["cod"], ["Total", "01", "11", "11001", "99"])
+        self.assertEqual(nodes["parent"].tolist(), [-1, 0, 1, 2, 0])
+        self.assertEqual(nodes["level"].tolist(), [1, 2, 3, 4, 2])
+        self.assertEqual(hierarchy_flatten.flatten_hierarchy(root, keep=set())["cod"], [])
+
+    def test_large_tree_filtered_data(self):
+        consulta, values = synthetic.generate_consulta(200, n_hierarchies=2, depth=3, fanout=6, seed=3)
+        # Solo las filas de la primera rama de la primera jerarquía
+        consulta["data"] = [row for row in consulta["data"] if row[0]["cod"][0] == "01"]
+        consulta = json.loads(synthetic.consulta_body(consulta))
+        values = synthetic.hierarchy_values_for(consulta, values)
+        full = run_pipeline(consulta, values, prune=False)
+        pruned = run_pipeline(consulta, values, prune=True)
+        first = pruned.hierarchy_index["D_SINTETICA1_0"]
+        self.assertEqual(len(full.hierarchy_index["D_SINTETICA1_0"]), 1 + 6 + 36 + 216)
+        self.assertLessEqual(len(first), 1 + 1 + 6 + 36)
+        self.assertTrue(all(path[0] == "01" for path in map(first.path, range(1, len(first)))))
+        pd.testing.assert_frame_equal(pruned.df_data_mapped, full.df_data_mapped)
+
+    def test_requires_df_data(self):
+        handler = APIDataHandler.from_json(copy.deepcopy(fake_badea.CONSULTA))
+        with self.assertRaises(ValueError):
+            handler.process_all_hierarchies(hierarchy_values=[], prune=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+import unittest
+import sys
+import os
+import copy
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+from src.main import APIDataHandler
+from http_client import BADEAClient
+import hierarchy_flatten
+import hierarchy_registry
+import fake_badea
+
+
+def hierarchy_values():
+    return [copy.deepcopy(fake_badea.HIERARCHY_VALUES[hier["url"]]) for hier in fake_badea.HIERARCHIES]
+
+
+def run_pipeline(values=None, **options):
+    handler = APIDataHandler.from_json(copy.deepcopy(fake_badea.CONSULTA), **options)
+    handler.get_DataFrame_dataJSON(process_measures=True)
+    handler.process_all_hierarchies(hierarchy_values=values if values is not None else hierarchy_values())
+    handler.map_data_w_hierarchies_info()
+    return handler
+
+
+class TestHierarchyRegistry(unittest.TestCase):
+
+    def test_handlers_share_indexes(self):
+        registry = hierarchy_registry.HierarchyRegistry()
+        first = run_pipeline(registry=registry)
+        second = run_pipeline(registry=registry)
+        for alias, index in first.hierarchy_index.items():
+            self.assertIs(second.hierarchy_index[alias], index)
+        self.assertEqual((registry.misses, registry.hits, len(registry)), (3, 3, 3))
+        flatten = [r for r in second.stats.records if r["stage"] == "hierarchy_flatten"]
+        self.assertTrue(all(r["cached"] for r in flatten))
+        pd.testing.assert_frame_equal(second.df_data_mapped, run_pipeline(registry=False).df_data_mapped)
+
+    def test_changed_content_is_indexed_again(self):
+        registry = hierarchy_registry.HierarchyRegistry()
+        first = run_pipeline(registry=registry)
+        values = hierarchy_values()
+        values[0]["data"]["children"][0]["des"] = "Varones"
+        second = run_pipeline(values, registry=registry)
+        self.assertIsNot(second.hierarchy_index["D_SEXO_0"], first.hierarchy_index["D_SEXO_0"])
+        self.assertIs(second.hierarchy_index["D_TEMPORAL_0"], first.hierarchy_index["D_TEMPORAL_0"])
+        self.assertEqual(second.df_data_mapped["SEXO2"].tolist()[0], "Varones")
+
+    def test_lru_bound(self):
+        registry = hierarchy_registry.HierarchyRegistry(max_entries=2)
+        nodes = [(hier["alias"], hierarchy_flatten.flatten_hierarchy(value["data"]))
+                 for hier, value in zip(fake_badea.HIERARCHIES, hierarchy_values())]
+        registry.get(*nodes[0])
+        registry.get(*nodes[1])
+        self.assertTrue(registry.get(*nodes[0])[1])
+        registry.get(*nodes[2])
+        self.assertEqual(len(registry), 2)
+        # Se descarta la menos usada (la segunda)
+        self.assertTrue(registry.get(*nodes[0])[1])
+        self.assertFalse(registry.get(*nodes[1])[1])
+
+    def test_concurrent_handlers_keep_one_copy(self):
+        registry = hierarchy_registry.HierarchyRegistry()
+        start = threading.Barrier(4)
+
+        def run(_):
+            start.wait()
+            return run_pipeline(registry=registry)
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            handlers = list(executor.map(run, range(4)))
+        self.assertEqual(len(registry), 3)
+        for handler in handlers[1:]:
+            for alias, index in handler.hierarchy_index.items():
+                self.assertIs(index, handlers[0].hierarchy_index[alias])
+
+    def test_downloaded_hierarchies_skip_flattening(self):
+        registry = hierarchy_registry.HierarchyRegistry()
+        client = BADEAClient(transport=fake_badea.FakeBADEATransport())
+
+        def fetch():
+            handler = APIDataHandler.from_url(fake_badea.CONSULTA_URL, client=client, registry=registry)
+            handler.get_DataFrame_dataJSON(process_measures=True)
+            with mock.patch.object(hierarchy_flatten, "flatten_hierarchy",
+                                   wraps=hierarchy_flatten.flatten_hierarchy) as flatten:
+                handler.process_all_hierarchies()
+            return handler, flatten.call_count
+
+        first, first_calls = fetch()
+        second, second_calls = fetch()
+        self.assertEqual((first_calls, second_calls), (3, 0))
+        for alias, index in first.hierarchy_index.items():
+            self.assertIs(second.hierarchy_index[alias], index)
+        self.assertTrue(all(r["cached"] for r in second.stats.records if r["stage"] == "hierarchy_flatten"))
+        pd.testing.assert_frame_equal(second.map_data_w_hierarchies_info(), first.map_data_w_hierarchies_info())
+
+    def test_opt_out_and_default(self):
+        self.assertIsNone(run_pipeline(registry=False).registry)
+        self.assertIs(run_pipeline().registry, hierarchy_registry.get_default_registry())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+import unittest
+import tempfile
+import json
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+from src.main import APIDataHandler
+from http_cache import HTTPCache
+from http_client import BADEAClient
+import fake_badea
+
+
+class FakeServer:
+    """Servidor de jerarquías que registra las peticiones y responde 304 si el ETag coincide."""
+
+    def __init__(self):
+        self.calls = []
+
+    def get(self, url, headers=None, **kwargs):
+        headers = headers or {}
+        self.calls.append((url, dict(headers)))
+        etag = f'"{url[-12:]}"'
+        if headers.get("If-None-Match") == etag:
+            return fake_badea.FakeResponse(None, status_code=304)
+        return fake_badea.FakeResponse(fake_badea.HIERARCHY_VALUES[url], headers={"ETag": etag})
+
+
+class TestHTTPCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.server = FakeServer()
+        self.url = fake_badea.HIERARCHIES[0]["url"]
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_fresh_entry_makes_no_request(self):
+        cache = HTTPCache(self.tmp.name, ttl=3600)
+        first = cache.get_json(self.url, get=self.server.get)
+        second = HTTPCache(self.tmp.name, ttl=3600).get_json(self.url, get=self.server.get)
+        self.assertEqual(first, second)
+        self.assertEqual(len(self.server.calls), 1)
+
+    def test_expired_entry_is_revalidated(self):
+        cache = HTTPCache(self.tmp.name, ttl=0)
+        cache.get_json(self.url, get=self.server.get)
+        payload = cache.get_json(self.url, get=self.server.get)
+        self.assertEqual(payload, fake_badea.HIERARCHY_VALUES[self.url])
+        self.assertEqual(len(self.server.calls), 2)
+        self.assertIn("If-None-Match", self.server.calls[1][1])
+
+    def test_size_cap_evicts_least_recently_used(self):
+        urls = [h["url"] for h in fake_badea.HIERARCHIES]
+        entry_size = max(len(json.dumps(fake_badea.HIERARCHY_VALUES[u])) for u in urls) + 200
+        cache = HTTPCache(self.tmp.name, ttl=3600, max_bytes=entry_size)
+        for url in urls:
+            cache.get_json(url, get=self.server.get)
+        self.assertLessEqual(cache.size(), entry_size)
+        self.assertIsNone(cache.lookup(urls[0]))
+        self.assertIsNotNone(cache.lookup(urls[-1]))
+
+    def test_attachments_follow_their_entry(self):
+        cache = HTTPCache(self.tmp.name, ttl=0)
+        self.assertFalse(cache.write_attachment(self.url, "resultado.pkl", b"x"))
+        cache.get_json(self.url, get=self.server.get)
+        self.assertTrue(cache.write_attachment(self.url, "resultado.pkl", b"x" * 100))
+        self.assertEqual(cache.read_attachment(self.url, "resultado.pkl"), b"x" * 100)
+        with self.assertRaises(ValueError):
+            cache.write_attachment(self.url, "body", b"")
+
+        # Revalidada sin cambios (304) se conserva; con otro cuerpo se descarta
+        cache.get_json(self.url, get=self.server.get)
+        self.assertIsNotNone(cache.read_attachment(self.url, "resultado.pkl"))
+        size = cache.size()
+        cache.store(self.url, b'{"data": {}}')
+        self.assertIsNone(cache.read_attachment(self.url, "resultado.pkl"))
+        self.assertLess(cache.size(), size)
+
+        cache.write_attachment(self.url, "resultado.pkl", b"x")
+        cache.clear()
+        self.assertEqual(os.listdir(self.tmp.name), [])
+
+    def test_warm_handler_makes_no_hierarchy_requests(self):
+        cache = HTTPCache(self.tmp.name)
+        for url in fake_badea.HIERARCHY_VALUES:
+            cache.get_json(url, get=self.server.get)
+        calls = len(self.server.calls)
+
+        handler = APIDataHandler(fake_badea.consulta_response(), hierarchy_cache=cache,
+                                 client=BADEAClient(transport=self.server))
+        df = handler.process_all_hierarchies(max_workers=3)
+        self.assertEqual(len(self.server.calls), calls)
+        self.assertEqual(len(df), 15)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+import unittest
+import sys
+import os
+import time
+
+import requests
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+from src.main import APIDataHandler
+from http_client import BADEAClient
+import fake_badea
+
+
+class ScriptedTransport:
+    """Transporte local que devuelve, en orden, las respuestas o excepciones indicadas."""
+
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = []
+
+    def get(self, url, params=None, headers=None, timeout=None, stream=False):
+        self.calls.append({"url": url, "params": params, "timeout": timeout})
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+class SlowBody:
+    """Cuerpo de una respuesta que llega por bloques con una espera entre ellos."""
+
+    def __init__(self, chunks, delay):
+        self.chunks = list(chunks)
+        self.delay = delay
+
+    def read(self, amount=None, **kwargs):
+        time.sleep(self.delay)
+        return self.chunks.pop(0) if self.chunks else b""
+
+    def close(self):
+        self.chunks = []
+
+
+def slow_response(chunks, delay):
+    response = requests.Response()
+    response.status_code = 200
+    response.raw = SlowBody(chunks, delay)
+    response.url = "https://fake.badea/lenta"
+    return response
+
+
+class TestBADEAClient(unittest.TestCase):
+
+    def test_retries_server_and_connection_errors(self):
+        transport = ScriptedTransport([
+            fake_badea.FakeResponse({}, status_code=503),
+            requests.ConnectionError("reset"),
+            fake_badea.FakeResponse({"ok": True}),
+        ])
+        client = BADEAClient(transport=transport, backoff_factor=0)
+        self.assertEqual(client.get_json("https://fake.badea/x"), {"ok": True})
+        self.assertEqual(len(transport.calls), 3)
+        self.assertEqual(client.bytes_downloaded, len(b'{"ok": true}'))
+
+    def test_client_errors_are_not_retried(self):
+        transport = ScriptedTransport([fake_badea.FakeResponse({}, status_code=404)])
+        response = BADEAClient(transport=transport, backoff_factor=0).get("https://fake.badea/x")
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(len(transport.calls), 1)
+
+    def test_gives_up_after_retries(self):
+        transport = ScriptedTransport([requests.Timeout("lento")] * 3)
+        client = BADEAClient(transport=transport, retries=2, backoff_factor=0)
+        with self.assertRaises(requests.Timeout):
+            client.get("https://fake.badea/x")
+        self.assertEqual(len(transport.calls), 3)
+
+    def test_total_timeout_bounds_each_request(self):
+        transport = ScriptedTransport([fake_badea.FakeResponse({})])
+        BADEAClient(transport=transport, timeout=(10, 120), total_timeout=5).get("https://fake.badea/x")
+        connect, read = transport.calls[0]["timeout"]
+        self.assertLessEqual(connect, 5)
+        self.assertLessEqual(read, 5)
+
+    def test_total_timeout_bounds_reading_the_body(self):
+        # Cada bloque llega antes del tiempo de lectura, pero el cuerpo completo supera total_timeout
+        for stream in (False, True):
+            with self.subTest(stream=stream):
+                transport = ScriptedTransport([slow_response([b"x"] * 50, 0.02)])
+                client = BADEAClient(transport=transport, retries=0, total_timeout=0.2)
+                start = time.monotonic()
+                with self.assertRaises(requests.Timeout):
+                    response = client.get("https://fake.badea/x", stream=stream)
+                    b"".join(client.iter_content(response))
+                self.assertLess(time.monotonic() - start, 0.5)
+
+        transport = ScriptedTransport([slow_response([b"ab", b"cd"], 0)])
+        client = BADEAClient(transport=transport)
+        self.assertEqual(client.get("https://fake.badea/x").content, b"abcd")
+        self.assertEqual(client.bytes_downloaded, 4)
+
+    def test_handler_uses_client_for_data_and_hierarchies(self):
+        urls = [h["url"] for h in fake_badea.HIERARCHIES]
+        transport = ScriptedTransport(
+            [fake_badea.consulta_response()] + [fake_badea.FakeResponse(fake_badea.HIERARCHY_VALUES[u]) for u in urls]
+        )
+        client = BADEAClient(transport=transport)
+        handler = APIDataHandler.from_url("https://fake.badea/consulta/44804?", {"D_TEMPORAL_0": "180156"}, client=client)
+        handler.process_all_hierarchies()
+        self.assertEqual([c["url"] for c in transport.calls[1:]], urls)
+        self.assertEqual(transport.calls[0]["params"], {"D_TEMPORAL_0": "180156"})
+        self.assertEqual(handler.id_consulta, 44804)
+
+
+if __name__ == "__main__":
+    unittest.main()
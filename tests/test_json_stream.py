@@ -0,0 +1,71 @@
+import unittest
+import sys
+import os
+import json
+
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+from src.main import APIDataHandler
+from http_client import BADEAClient
+import json_stream
+import fake_badea
+
+
+def chunked(body, size):
+    return [body[start:start + size] for start in range(0, len(body), size)]
+
+
+class TestIterConsulta(unittest.TestCase):
+
+    def setUp(self):
+        self.body = json.dumps(fake_badea.CONSULTA, ensure_ascii=False, indent=1).encode("utf-8")
+
+    def test_any_chunk_size_gives_the_same_content(self):
+        # Bloques de 1 byte parten también los caracteres multibyte (tildes) y los números
+        for size in (1, 3, 17, len(self.body)):
+            content, rows = {}, []
+            for key, value in json_stream.iter_consulta(chunked(self.body, size), batch_size=2):
+                if key == "data":
+                    rows.extend(value)
+                else:
+                    content[key] = value
+            content["data"] = rows
+            self.assertEqual(content, fake_badea.CONSULTA)
+
+    def test_empty_data_and_invalid_body(self):
+        self.assertEqual(list(json_stream.iter_consulta([b'{"data": [], "metainfo": {}}'])),
+                         [("data", []), ("metainfo", {})])
+        with self.assertRaises(json.JSONDecodeError):
+            list(json_stream.iter_consulta([b'{"data": [[1], [2]'], batch_size=1))
+
+
+class TestStreamingHandler(unittest.TestCase):
+
+    def test_same_dataframe_as_full_response(self):
+        expected = APIDataHandler(fake_badea.consulta_response()).get_DataFrame_dataJSON(process_measures=True)
+        body = fake_badea.consulta_response().content
+        handler = APIDataHandler.from_stream(chunked(body, 50), batch_size=2)
+        self.assertIsNone(handler.data)
+        self.assertNotIn("data", handler.JSONdata)
+        self.assertEqual(handler.id_consulta, 44804)
+        pd.testing.assert_frame_equal(handler.get_DataFrame_dataJSON(process_measures=True), expected)
+
+    def test_from_url_streams_and_counts_bytes(self):
+        class StreamTransport:
+            def get(self, url, params=None, headers=None, timeout=None, stream=False):
+                self.stream = stream
+                return fake_badea.consulta_response()
+
+        transport = StreamTransport()
+        client = BADEAClient(transport=transport)
+        handler = APIDataHandler.from_url("https://fake.badea/consulta/44804?", client=client,
+                                          stream=True, chunk_size=64)
+        self.assertTrue(transport.stream)
+        self.assertEqual(handler.data_builder.n_rows, len(fake_badea.DATA))
+        self.assertEqual(client.bytes_downloaded, len(fake_badea.consulta_response().content))
+
+
+if __name__ == "__main__":
+    unittest.main()
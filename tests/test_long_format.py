@@ -0,0 +1,90 @@
+import unittest
+import sys
+import os
+import copy
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+from src.main import APIDataHandler
+import frame_builder
+import fake_badea
+
+LABELS = [measure["des"] for measure in fake_badea.MEASURES]
+
+
+def processed_handler(numeric_measures=True):
+    handler = APIDataHandler.from_json(copy.deepcopy(fake_badea.CONSULTA), registry=False)
+    handler.get_DataFrame_dataJSON(process_measures=True, numeric_measures=numeric_measures)
+    handler.process_all_hierarchies(hierarchy_values=[fake_badea.HIERARCHY_VALUES[hier["url"]]
+                                                      for hier in fake_badea.HIERARCHIES])
+    return handler
+
+
+class TestLongFrame(unittest.TestCase):
+
+    def setUp(self):
+        self.df = pd.DataFrame({
+            "SEXO1": ["Hombres", "Mujeres", "Hombres"],
+            "Total": pd.array([10, None, 30], dtype="Int64"),
+            "Nuevos": pd.array([1, 2, None], dtype="Int64"),
+        })
+
+    def test_same_rows_as_melt(self):
+        result = frame_builder.long_frame(self.df, ["Total", "Nuevos"])
+        expected = self.df.melt(id_vars=["SEXO1"], var_name="INDICATOR", value_name="OBS_VALUE")
+        self.assertEqual(result["SEXO1"].tolist(), expected["SEXO1"].tolist())
+        self.assertEqual(result["INDICATOR"].tolist(), expected["INDICATOR"].tolist())
+        self.assertEqual(str(result["OBS_VALUE"].dtype), "Int64")
+        self.assertEqual(result["OBS_VALUE"].tolist(), expected["OBS_VALUE"].tolist())
+        self.assertEqual(list(result["INDICATOR"].cat.categories), ["Total", "Nuevos"])
+
+    def test_dropna_and_value_types(self):
+        result = frame_builder.long_frame(self.df, ["Total", "Nuevos"], labels=["T", "N"], dropna=True)
+        self.assertEqual(result["INDICATOR"].tolist(), ["T", "T", "N", "N"])
+        self.assertEqual(result["SEXO1"].tolist(), ["Hombres", "Hombres", "Hombres", "Mujeres"])
+        self.assertEqual(result["OBS_VALUE"].tolist(), [10, 30, 1, 2])
+        self.assertEqual(list(result.index), [0, 1, 2, 3])
+
+        mixed = self.df.assign(Tasa=[0.5, np.nan, 1.5])
+        self.assertEqual(frame_builder.long_frame(mixed, ["Total", "Tasa"])["OBS_VALUE"].dtype, np.float64)
+        text = self.df.assign(Texto=["1,5", "2", "3"])
+        self.assertEqual(frame_builder.long_frame(text, ["Texto"])["OBS_VALUE"].tolist(), ["1,5", "2", "3"])
+
+
+class TestLongLayout(unittest.TestCase):
+
+    def test_mapping_in_long_layout(self):
+        wide = processed_handler().map_data_w_hierarchies_info()
+        handler = processed_handler()
+        long = handler.map_data_w_hierarchies_info(layout="long")
+        pd.testing.assert_frame_equal(handler.df_data_mapped, long)
+        records = {r["stage"]: r for r in handler.stats.records}
+        self.assertEqual(handler.stats.records[-1]["stage"], "long_format")
+        self.assertEqual((records["mapping"]["rows_in"], records["mapping"]["rows_out"]), (5, 10))
+        self.assertEqual(len(long), len(wide) * len(LABELS))
+        self.assertEqual(list(long.columns[-2:]), ["INDICATOR", "OBS_VALUE"])
+        self.assertEqual(list(long["INDICATOR"].cat.categories), LABELS)
+        self.assertEqual(long["OBS_VALUE"].tolist()[:5], wide["Numero_de_autonomos"].astype(float).tolist())
+        pd.testing.assert_frame_equal(long, handler.to_long_format(wide))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "largo.csv")
+            handler.save_dataset(path)
+            with open(path, encoding="utf-8") as f:
+                lines = f.read().splitlines()
+        self.assertTrue(lines[-1].endswith(";Tasa de variación;0,75"))
+
+    def test_unprocessed_data_and_invalid_layout(self):
+        handler = processed_handler(numeric_measures=False)
+        long = handler.to_long_format(dropna=True)
+        self.assertEqual(long["INDICATOR"].value_counts().to_dict(), {LABELS[0]: 5, LABELS[1]: 5})
+        with self.assertRaises(ValueError):
+            handler.map_data_w_hierarchies_info(layout="tall")
+
+
+if __name__ == "__main__":
+    unittest.main()
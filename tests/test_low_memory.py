@@ -0,0 +1,105 @@
+import unittest
+import sys
+import os
+import threading
+import tracemalloc
+from unittest import mock
+
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+from src.main import APIDataHandler
+import memory
+import stats
+import fake_badea
+
+
+def run_pipeline(**options):
+    with mock.patch.object(APIDataHandler, "request_hierarchies_values",
+                           staticmethod(fake_badea.fake_request_hierarchies_values)):
+        handler = APIDataHandler(fake_badea.consulta_response(), **options)
+        handler.get_DataFrame_dataJSON(process_measures=True)
+        handler.process_all_hierarchies()
+        mapped = handler.map_data_w_hierarchies_info()
+    return handler, mapped
+
+
+class TestLowMemoryMode(unittest.TestCase):
+
+    def test_same_result_and_intermediates_released(self):
+        expected_handler, expected = run_pipeline()
+        handler, mapped = run_pipeline(low_memory=True)
+        pd.testing.assert_frame_equal(mapped, expected)
+        pd.testing.assert_frame_equal(handler.hierarchies_info_df, expected_handler.hierarchies_info_df)
+        self.assertIs(handler.df_data_mapped, mapped)
+        for attribute in ("response", "data", "data_builder", "df_data", "hierarchy_nodes"):
+            self.assertIsNone(getattr(handler, attribute), attribute)
+        self.assertNotIn("data", handler.JSONdata)
+        self.assertEqual(handler.id_consulta, 44804)
+
+    def test_data_cannot_be_rebuilt_once_released(self):
+        handler = APIDataHandler(fake_badea.consulta_response(), low_memory=True)
+        handler.get_DataFrame_dataJSON()
+        with self.assertRaises(ValueError):
+            handler.get_DataFrame_dataJSON()
+
+    def test_memory_report_per_stage(self):
+        was_tracing = tracemalloc.is_tracing()
+        handler, _ = run_pipeline(low_memory=True, track_memory=True)
+        handler.memory_tracker.stop()
+        self.assertEqual([entry["stage"] for entry in handler.memory_report],
+                         ["parse", "dataframe", "hierarchies", "mapping"])
+        for entry in handler.memory_report:
+            self.assertGreaterEqual(entry["peak_bytes"], entry["retained_bytes"] - entry["delta_bytes"])
+            self.assertGreater(entry["peak_bytes"], 0)
+        self.assertEqual(tracemalloc.is_tracing(), was_tracing)
+
+    @unittest.skipIf(tracemalloc.is_tracing(), "tracemalloc ya está activo")
+    def test_tracing_only_during_stages(self):
+        handler, _ = run_pipeline(track_memory=True)
+        self.assertFalse(tracemalloc.is_tracing())
+        self.assertEqual(len(handler.memory_report), 4)
+        with memory.MemoryTracker() as tracker:
+            with tracker.stage("lista"):
+                self.assertTrue(tracemalloc.is_tracing())
+                values = list(range(10000))
+        self.assertFalse(tracemalloc.is_tracing())
+        self.assertGreater(tracker.report[0]["peak_bytes"], 0)
+        with tracker.stage("parada"):
+            del values
+        self.assertEqual(len(tracker.report), 1)
+
+
+    def test_overlapping_stages_are_not_mixed(self):
+        # Una etapa en otro hilo empieza y espera mientras la etapa principal se mide
+        first, second = memory.MemoryTracker(), memory.MemoryTracker()
+        second_stats = stats.StageStats(second)
+        entered, release = threading.Event(), threading.Event()
+
+        def overlapping():
+            with second_stats.stage("hilo"):
+                entered.set()
+                release.wait(5)
+            with second.stage("después"):
+                pass
+
+        with first.stage("principal"):
+            thread = threading.Thread(target=overlapping)
+            thread.start()
+            self.assertTrue(entered.wait(5))
+            values = list(range(10000))
+        release.set()
+        thread.join()
+
+        self.assertEqual([entry["stage"] for entry in first.report], ["principal"])
+        self.assertGreater(first.report[0]["peak_bytes"], 0)
+        # La etapa solapada no se mide; la siguiente, ya sin solaparse, sí
+        self.assertEqual(second.skipped, ["hilo"])
+        self.assertEqual([entry["stage"] for entry in second.report], ["después"])
+        self.assertIsNone(second_stats.records[0]["peak_bytes"])
+        del values
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+import sys
+import os
+from unittest import mock
+
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+from src.main import APIDataHandler
+import fake_badea
+
+
+def processed_handler(**kwargs):
+    """Handler de la consulta ficticia con los datos y las jerarquías ya procesados."""
+    with mock.patch.object(APIDataHandler, "request_hierarchies_values",
+                           staticmethod(fake_badea.fake_request_hierarchies_values)):
+        handler = APIDataHandler(fake_badea.consulta_response())
+        handler.get_DataFrame_dataJSON(process_measures=True, **kwargs)
+        handler.process_all_hierarchies()
+    return handler
+
+
+class TestUnionByCodCombination(unittest.TestCase):
+
+    def setUp(self):
+        self.df_data = pd.DataFrame({
+            "Region_cod": [["00", "RA"], ["00", "RE"], "RA", None],
+            "Value": [100, 200, 300, 400],
+        })
+        self.df_hier = pd.DataFrame({
+            "COD_combination": [["00", "RA"], ["00", "RE"], ["RA"]],
+            "Description": ["Region A", "Region B", "Solo RA"],
+        })
+
+    def test_join_on_interned_codes(self):
+        result = APIDataHandler.__new__(APIDataHandler).union_by_cod_combination(
+            self.df_data, self.df_hier, "Region_cod", "COD_combination")
+        self.assertEqual(list(result.columns), ["Value", "Description"])
+        self.assertEqual(result["Description"].tolist()[:3], ["Region A", "Region B", "Solo RA"])
+        self.assertTrue(pd.isna(result["Description"].iloc[3]))
+
+    def test_inputs_are_not_mutated(self):
+        data_before, hier_before = self.df_data.copy(), self.df_hier.copy()
+        APIDataHandler.__new__(APIDataHandler).union_by_cod_combination(
+            self.df_data, self.df_hier, "Region_cod", "COD_combination")
+        pd.testing.assert_frame_equal(self.df_data, data_before)
+        pd.testing.assert_frame_equal(self.df_hier, hier_before)
+
+
+class TestMapDataWithHierarchies(unittest.TestCase):
+
+    def test_mapped_dataset(self):
+        handler = processed_handler()
+        df = handler.map_data_w_hierarchies_info()
+        self.assertEqual(list(df.columns), [
+            "SEXO1", "SEXO2", "TEMPORAL1", "TEMPORAL2",
+            "TERRITROIO1", "TERRITROIO2", "TERRITROIO3", "TERRITROIO4",
+            "Numero_de_autonomos", "Tasa_de_variacion",
+        ])
+        self.assertEqual(df["SEXO2"].tolist(), ["Hombres", "Mujeres", "Hombres", "Mujeres", "Hombres"])
+        self.assertEqual(df["TERRITROIO4"].tolist()[2:4], ["Abla", "Alcalá de los Gazules"])
+        self.assertTrue(pd.isna(df["TERRITROIO3"].iloc[4]))
+        self.assertEqual(df["Tasa_de_variacion"].tolist(), ["1,5", "-0,25", "2,0", "", "0,75"])
+
+    def test_empty_description_columns_are_pruned(self):
+        handler = processed_handler(numeric_measures=True)
+        handler.df_data = handler.df_data.iloc[[0, 1, 4]].reset_index(drop=True)
+        handler.df_data["Tasa de variación"] = float("nan")
+        df = handler.map_data_w_hierarchies_info()
+        self.assertNotIn("TERRITROIO4", df.columns)
+        self.assertIn("TERRITROIO3", df.columns)
+        self.assertEqual(list(df.columns[-2:]), ["Numero_de_autonomos", "Tasa_de_variacion"])
+        self.assertEqual(str(df["Numero_de_autonomos"].dtype), "Int64")
+
+
+if __name__ == "__main__":
+    unittest.main()
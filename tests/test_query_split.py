@@ -0,0 +1,74 @@
+import unittest
+import sys
+import os
+
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+from src.main import APIDataHandler
+from http_client import BADEAClient
+import query_split
+import fake_badea
+
+PARAMS = {"D_TEMPORAL_0": "180156,180175,180194", "D_SEXO_0": "3689,3690",
+          "posord": "f[D_AA_TERRITROIO_0],f[D_TEMPORAL_0],c[Measures]"}
+
+
+def mapped(handler):
+    handler.get_DataFrame_dataJSON(process_measures=True, numeric_measures=True)
+    handler.process_all_hierarchies()
+    df = handler.map_data_w_hierarchies_info()
+    return df.sort_values(list(df.columns[:-2])).reset_index(drop=True)
+
+
+class TestQuerySplit(unittest.TestCase):
+
+    def setUp(self):
+        self.transport = fake_badea.FakeBADEATransport()
+        self.client = BADEAClient(transport=self.transport)
+
+    def test_chunk_sizes_and_params(self):
+        self.assertEqual(query_split.estimate_cells(PARAMS), 6)
+        self.assertEqual(query_split.chunk_sizes(PARAMS, max_cells=6), {})
+        self.assertEqual(query_split.chunk_sizes(PARAMS, max_cells=2), {"D_TEMPORAL_0": 1})
+        self.assertEqual(query_split.chunk_sizes(PARAMS, max_cells=1), {"D_TEMPORAL_0": 1, "D_SEXO_0": 1})
+        parts = query_split.split_params(PARAMS, {"D_TEMPORAL_0": 2, "D_SEXO_0": 1})
+        self.assertEqual([(p["D_TEMPORAL_0"], p["D_SEXO_0"]) for p in parts],
+                         [("180156,180175", "3689"), ("180156,180175", "3690"), ("180194", "3689"), ("180194", "3690")])
+        self.assertTrue(all(p["posord"] == PARAMS["posord"] for p in parts))
+
+    def test_automatic_split_matches_single_request(self):
+        single = APIDataHandler.from_url(fake_badea.CONSULTA_URL, params=PARAMS, client=self.client, max_cells=None)
+        n_calls = len(self.transport.consulta_calls())
+
+        split = APIDataHandler.from_url(fake_badea.CONSULTA_URL, params=PARAMS, client=self.client, max_cells=2)
+        self.assertEqual(len(self.transport.consulta_calls()) - n_calls, 3)
+        self.assertEqual(split.hierarchies, single.hierarchies)
+        self.assertEqual(split.measures, single.measures)
+        self.assertEqual(len(split.data), len(single.data))
+        pd.testing.assert_frame_equal(mapped(split), mapped(single))
+
+    def test_explicit_split_by(self):
+        handler = APIDataHandler.from_url(fake_badea.CONSULTA_URL, params=PARAMS, client=self.client,
+                                          split_by={"D_SEXO_0": 1})
+        self.assertEqual(sorted(c["params"]["D_SEXO_0"] for c in self.transport.consulta_calls()), ["3689", "3690"])
+        self.assertEqual(len(handler.data), len(fake_badea.filter_consulta(PARAMS)["data"]))
+
+    def test_split_rejects_unknown_dimensions(self):
+        for sizes in ({"D_EDAD_0": 1}, {"posord": 1}, {"D_SEXO_0": 0}):
+            with self.assertRaisesRegex(ValueError, list(sizes)[0]):
+                query_split.split_params(PARAMS, sizes)
+        with self.assertRaisesRegex(ValueError, "D_EDAD_0"):
+            APIDataHandler.from_url(fake_badea.CONSULTA_URL, params=PARAMS, client=self.client,
+                                    split_by={"D_EDAD_0": 1})
+
+    def test_merge_rejects_different_hierarchies(self):
+        first = fake_badea.filter_consulta()
+        second = dict(first, measures=first["measures"][:1])
+        with self.assertRaises(ValueError):
+            query_split.merge_responses([first, second])
+
+
+if __name__ == "__main__":
+    unittest.main()
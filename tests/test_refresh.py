@@ -0,0 +1,64 @@
+import unittest
+import sys
+import os
+import tempfile
+
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+from http_client import BADEAClient
+import refresh
+import fake_badea
+
+PARAMS = {"D_TEMPORAL_0": "180156,180175", "posord": "f[D_AA_TERRITROIO_0],f[D_TEMPORAL_0],c[Measures]"}
+
+
+def sort_rows(df):
+    return df.sort_values(list(df.columns[:4])).reset_index(drop=True)
+
+
+class TestIncrementalRefresh(unittest.TestCase):
+
+    def setUp(self):
+        self.transport = fake_badea.FakeBADEATransport()
+        self.client = BADEAClient(transport=self.transport)
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.state = os.path.join(tmp.name, "44804.pkl")
+
+    def refresh(self, params):
+        return refresh.incremental_refresh(fake_badea.CONSULTA_URL, params, self.state, client=self.client,
+                                           numeric_measures=True)
+
+    def test_only_new_periods_are_fetched(self):
+        first = self.refresh(PARAMS)
+        self.assertEqual(len(first), 3)
+
+        params = dict(PARAMS, D_TEMPORAL_0="180156,180175,180194")
+        updated = self.refresh(params)
+        calls = self.transport.consulta_calls()
+        self.assertEqual(calls[-1]["params"]["D_TEMPORAL_0"], "180194")
+        self.assertEqual(calls[-1]["params"]["posord"], PARAMS["posord"])
+
+        full, _ = refresh.run_consulta(fake_badea.CONSULTA_URL, params, client=self.client, numeric_measures=True)
+        self.assertEqual(list(updated.columns), list(full.columns))
+        pd.testing.assert_frame_equal(sort_rows(updated), sort_rows(full))
+        self.assertEqual(refresh.load_state(self.state)[1], params)
+
+    def test_no_new_periods_no_request(self):
+        self.refresh(PARAMS)
+        n_calls = len(self.transport.calls)
+        self.assertEqual(len(self.refresh(dict(PARAMS))), 3)
+        self.assertEqual(len(self.transport.calls), n_calls)
+
+    def test_changed_params_trigger_full_download(self):
+        self.refresh(PARAMS)
+        self.refresh(dict(PARAMS, D_TEMPORAL_0="180156"))
+        self.assertEqual(self.transport.consulta_calls()[-1]["params"]["D_TEMPORAL_0"], "180156")
+        self.assertFalse(refresh.is_incremental(PARAMS, dict(PARAMS, posord="c[Measures]")))
+        self.assertEqual(refresh.new_ids(PARAMS, dict(PARAMS, D_TEMPORAL_0="180175, 180194,180156")), ["180194"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+import sys
+import os
+import tempfile
+
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+from http_client import BADEAClient
+from http_cache import HTTPCache
+import refresh
+import replay
+import fake_badea
+
+PARAMS = {"D_TEMPORAL_0": "180156,180175", "posord": "f[D_AA_TERRITROIO_0],f[D_TEMPORAL_0],c[Measures]"}
+
+
+def run(client, params=PARAMS, **options):
+    dataset, _ = refresh.run_consulta(fake_badea.CONSULTA_URL, params, client=client, numeric_measures=True, **options)
+    return dataset
+
+
+class TestReplayTransport(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.fixtures = os.path.join(tmp.name, "fixtures")
+        self.tmp = tmp.name
+
+    def record(self):
+        source = fake_badea.FakeBADEATransport()
+        recorded = run(BADEAClient(transport=replay.ReplayTransport(self.fixtures, "record", transport=source)))
+        return recorded, source
+
+    def test_record_then_replay_offline(self):
+        recorded, source = self.record()
+        self.assertTrue(replay.has_fixtures(self.fixtures))
+
+        transport = replay.ReplayTransport(self.fixtures, "replay")
+        replayed = run(BADEAClient(transport=transport))
+        self.assertEqual(len(transport.calls), len(source.calls))
+        pd.testing.assert_frame_equal(replayed, recorded)
+
+        # Los parámetros de la url y de `params` dan la misma clave, en cualquier orden
+        self.assertEqual(replay.request_key(fake_badea.CONSULTA_URL + "?posord=x", {"D_TEMPORAL_0": "1"}),
+                         replay.request_key(fake_badea.CONSULTA_URL, {"posord": "x", "D_TEMPORAL_0": "1"}))
+
+    def test_replay_keeps_headers_and_revalidation(self):
+        self.record()
+        client = BADEAClient(transport=replay.ReplayTransport(self.fixtures, "replay"))
+        response = client.get(fake_badea.CONSULTA_URL, params=PARAMS)
+        self.assertTrue(response.headers["etag"].startswith('"'))
+
+        # Revalidación de una caché caducada: la respuesta grabada responde 304 al mismo ETag
+        cache = HTTPCache(os.path.join(self.tmp, "cache"), ttl=0)
+        url = replay.request_key(fake_badea.CONSULTA_URL, PARAMS)
+        first = cache.get_json(url, get=client.get)
+        self.assertEqual(client.get(url, headers={"If-None-Match": response.headers["ETag"]}).status_code, 304)
+        self.assertEqual(cache.get_json(url, get=client.get), first)
+
+    def test_record_keeps_body_on_revalidation(self):
+        _, source = self.record()
+        recorder = replay.ReplayTransport(self.fixtures, "record", transport=source)
+        etag = recorder.get(fake_badea.CONSULTA_URL, params=PARAMS).headers["ETag"]
+        self.assertEqual(recorder.get(fake_badea.CONSULTA_URL, params=PARAMS,
+                                      headers={"If-None-Match": etag}).status_code, 304)
+        response = replay.ReplayTransport(self.fixtures, "replay").get(fake_badea.CONSULTA_URL, params=PARAMS)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["data"]), len(fake_badea.filter_consulta(PARAMS)["data"]))
+
+    def test_missing_fixture(self):
+        client = BADEAClient(transport=replay.ReplayTransport(self.fixtures, "replay"))
+        with self.assertRaises(replay.MissingFixtureError):
+            client.get(fake_badea.CONSULTA_URL, params=PARAMS)
+        with self.assertRaises(ValueError):
+            replay.ReplayTransport(self.fixtures, "live")
+
+
+if __name__ == "__main__":
+    unittest.main()
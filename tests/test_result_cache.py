@@ -0,0 +1,123 @@
+import unittest
+import sys
+import os
+import tempfile
+import copy
+import importlib.util
+from unittest import mock
+
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+from http_cache import HTTPCache
+from http_client import BADEAClient
+from main import APIDataHandler
+from result_cache import ResultCache, canonical_url, consulta_id
+import fake_badea
+
+HAS_PYARROW = importlib.util.find_spec("pyarrow") is not None
+
+PARAMS = {"D_TEMPORAL_0": "180156, 180175", "posord": "f[D_AA_TERRITROIO_0],f[D_TEMPORAL_0],c[Measures]"}
+
+
+@unittest.skipUnless(HAS_PYARROW, "pyarrow no está instalado")
+class TestResultCache(unittest.TestCase):
+
+    def setUp(self):
+        self.transport = fake_badea.FakeBADEATransport()
+        self.client = BADEAClient(transport=self.transport)
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.directory = tmp.name
+
+    def get(self, cache, params=PARAMS):
+        return cache.get_dataset(fake_badea.CONSULTA_URL, params, client=self.client, numeric_measures=True)
+
+    def test_fresh_result_without_requests(self):
+        cache = ResultCache(self.directory)
+        first = self.get(cache)
+        self.assertEqual(len(first), 3)
+        n_calls = len(self.transport.calls)
+
+        # Sin analizar la respuesta de la consulta ni construir el handler
+        with mock.patch.object(APIDataHandler, "from_json", side_effect=AssertionError("from_json")):
+            second = self.get(ResultCache(self.directory))
+        self.assertEqual(len(self.transport.calls), n_calls)
+        pd.testing.assert_frame_equal(first, second)
+
+    def test_expired_result_is_revalidated(self):
+        cache = ResultCache(self.directory, ttl=0)
+        first = self.get(cache)
+        n_hierarchy_calls = len(self.transport.calls) - len(self.transport.consulta_calls())
+
+        second = self.get(cache)
+        last = self.transport.consulta_calls()[-1]
+        self.assertIn("If-None-Match", last["headers"])
+        # Respuesta 304: no se vuelven a pedir las jerarquías
+        self.assertEqual(len(self.transport.calls) - len(self.transport.consulta_calls()), n_hierarchy_calls)
+        pd.testing.assert_frame_equal(first, second)
+
+    def test_key_includes_params(self):
+        cache = ResultCache(self.directory)
+        self.assertEqual(len(self.get(cache)), 3)
+        self.assertEqual(len(self.get(cache, dict(PARAMS, D_TEMPORAL_0="180156"))), 2)
+        self.assertEqual(len(self.transport.consulta_calls()), 2)
+
+        url = canonical_url(fake_badea.CONSULTA_URL, PARAMS)
+        self.assertEqual(url, canonical_url(fake_badea.CONSULTA_URL, dict(PARAMS, D_TEMPORAL_0="180156,180175")))
+        self.assertNotEqual(url, canonical_url(fake_badea.CONSULTA_URL, dict(PARAMS, posord="c[Measures]")))
+        self.assertEqual(consulta_id(url), "44804")
+
+        cache.clear()
+        self.get(cache)
+        self.assertEqual(len(self.transport.consulta_calls()), 3)
+
+    def test_results_count_toward_size_and_are_evicted(self):
+        cache = ResultCache(self.directory)
+        self.get(cache)
+        url = canonical_url(fake_badea.CONSULTA_URL, PARAMS)
+        names = os.listdir(os.path.join(self.directory, "responses"))
+        self.assertEqual(sorted(name.split(".", 1)[1] for name in names if "result-" not in name),
+                         ["body", "meta.json", "results.json"])
+        self.assertEqual(len([name for name in names if name.endswith(".parquet")]), 1)
+        self.assertEqual(cache.responses.size(), sum(
+            os.path.getsize(os.path.join(self.directory, "responses", name)) for name in names))
+
+        # Con un límite menor que la entrada, la respuesta y su resultado se eliminan juntos
+        small = ResultCache(self.directory, max_bytes=1)
+        self.get(small, dict(PARAMS, D_TEMPORAL_0="180156"))
+        self.assertIsNone(small.responses.lookup(url))
+        self.assertEqual(os.listdir(os.path.join(self.directory, "responses")), [])
+
+    def test_changed_response_discards_results(self):
+        cache = ResultCache(self.directory, ttl=0)
+        self.get(cache)
+        url = canonical_url(fake_badea.CONSULTA_URL, PARAMS)
+        body = cache.responses.lookup(url)["body"]
+        # Respuesta guardada distinta de la del servidor: la revalidación descarga la nueva
+        cache.responses.store(url, body + b" ", {"ETag": '"antiguo"'})
+        names = os.listdir(os.path.join(self.directory, "responses"))
+        self.assertFalse(any("result-" in name for name in names))
+        self.assertEqual(len(self.get(cache)), 3)
+
+    def test_key_includes_hierarchies(self):
+        hierarchy_cache = HTTPCache(os.path.join(self.directory, "jerarquias"), ttl=0)
+        cache = ResultCache(self.directory)
+        first = cache.get_dataset(fake_badea.CONSULTA_URL, PARAMS, client=self.client, hierarchy_cache=hierarchy_cache)
+        self.assertEqual(first["SEXO2"].tolist(), ["Hombres", "Mujeres", "Hombres"])
+
+        values = copy.deepcopy(fake_badea.HIERARCHY_VALUES)
+        values[fake_badea.HIERARCHIES[0]["url"]]["data"]["children"][0]["des"] = "Varones"
+        with mock.patch.dict(fake_badea.HIERARCHY_VALUES, values):
+            second = cache.get_dataset(fake_badea.CONSULTA_URL, PARAMS, client=self.client,
+                                       hierarchy_cache=hierarchy_cache)
+        self.assertEqual(second["SEXO2"].tolist(), ["Varones", "Mujeres", "Varones"])
+        # El resultado anterior se sustituye
+        names = os.listdir(os.path.join(self.directory, "responses"))
+        self.assertEqual(len([name for name in names if name.endswith(".parquet")]), 1)
+        self.assertEqual(len(self.transport.consulta_calls()), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,159 @@
+import unittest
+import sys
+import os
+import copy
+import tempfile
+import importlib.util
+
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+from src.main import APIDataHandler
+import export
+import sdmx
+import synthetic
+import fake_badea
+
+HAS_PYARROW = importlib.util.find_spec("pyarrow") is not None
+
+
+def processed_handler(consulta=fake_badea.CONSULTA, values=None, **measures_options):
+    handler = APIDataHandler.from_json(copy.deepcopy(consulta), registry=False)
+    handler.get_DataFrame_dataJSON(**(measures_options or {"process_measures": True, "numeric_measures": True}))
+    if values is None:
+        values = [fake_badea.HIERARCHY_VALUES[hier["url"]] for hier in fake_badea.HIERARCHIES]
+    handler.process_all_hierarchies(hierarchy_values=values)
+    return handler
+
+
+def write_map(directory, name, rows):
+    pd.DataFrame(rows, columns=sdmx.MAP_COLUMNS).to_csv(os.path.join(directory, name), index=False)
+
+
+class TestSdmxHelpers(unittest.TestCase):
+
+    def test_names_frequency_and_targets(self):
+        self.assertEqual(sdmx.dimension_name("D_AA_TERRITROIO_0"), "AA_TERRITROIO")
+        self.assertEqual(sdmx.dimension_name("INDICATOR"), "INDICATOR")
+        self.assertEqual([sdmx.frequency(p) for p in ("Anual", "Mensual", "", "Q")], ["A", "M", "M", "Q"])
+        with self.assertRaises(ValueError):
+            sdmx.frequency("Quincenal")
+        self.assertEqual(sdmx.time_period("202301", "M"), "2023-01")
+        self.assertEqual(sdmx.time_period("2023", "A"), "2023")
+        self.assertEqual(sdmx.default_target("Hombres"), "HOMBRES")
+        self.assertEqual(sdmx.default_target("Porcentaje de ocupados en %"), "PORC_OCUP_PCT")
+
+
+class TestSdmxExport(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.maps_dir = os.path.join(self.tmp.name, "mapas")
+        os.makedirs(self.maps_dir)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_ids_and_layout_without_maps(self):
+        df = processed_handler().to_sdmx("Anual", dropna=False)
+        self.assertEqual(list(df.columns), ["SEXO", "TEMPORAL", "AA_TERRITROIO", "FREQ", "INDICATOR", "OBS_VALUE"])
+        self.assertEqual(len(df), 10)
+        self.assertEqual(df["SEXO"].tolist()[:5], ["3689", "3690", "3689", "3690", "3689"])
+        self.assertEqual(df["TEMPORAL"].tolist()[:5], ["2020", "2020", "2021", "2022", "2022"])
+        self.assertEqual(df["AA_TERRITROIO"].tolist()[:5], ["515893", "515893", "515894", "515903", "515892"])
+        self.assertEqual(set(df["FREQ"]), {"A"})
+        self.assertEqual(df["INDICATOR"].tolist()[::5], [m["des"] for m in fake_badea.MEASURES])
+        # Con dropna se omite la tasa vacía
+        self.assertEqual(len(processed_handler().to_sdmx("A")), 9)
+
+    def test_measures_are_numeric_however_processed(self):
+        expected = processed_handler().to_sdmx("A", dropna=False)
+        self.assertEqual(expected["OBS_VALUE"].tolist()[:2], [120, 98])
+        for options in ({"process_measures": False}, {"process_measures": True}):
+            for dropna in (False, True):
+                df = processed_handler(**options).to_sdmx("A", dropna=dropna)
+                pd.testing.assert_frame_equal(df, processed_handler().to_sdmx("A", dropna=dropna))
+        # La tasa vacía ("" en la API) es nula y se omite con dropna
+        self.assertTrue(pd.isna(expected["OBS_VALUE"].iloc[8]))
+        self.assertEqual(len(processed_handler(process_measures=False).to_sdmx("A")), 9)
+
+    def test_maps_are_read_once_and_applied(self):
+        write_map(self.maps_dir, "SEXO.csv", [["3689", "1", "Hombres", "H"], ["3690", "6", "Mujeres", None]])
+        # Mapa con el formato antiguo, sin extensión
+        write_map(self.maps_dir, "INDICATOR", [["Número de autónomos", None, None, "AUTONOMOS"],
+                                               ["Tasa de variación", None, None, "TASA_VAR"]])
+        maps = sdmx.DimensionMaps(self.maps_dir)
+        handler = processed_handler()
+        with self.assertLogs(handler.logger, level="WARNING") as logs:
+            df = handler.to_sdmx("A", maps=maps, dropna=False)
+        self.assertIn("3690", logs.output[0])
+        self.assertEqual(df["SEXO"].tolist()[:5:2], ["H", "H", "H"])
+        self.assertEqual(df["SEXO"].isna().tolist()[:5], [False, True, False, True, False])
+        self.assertEqual(df["INDICATOR"].tolist()[::5], ["AUTONOMOS", "TASA_VAR"])
+        self.assertEqual(df["AA_TERRITROIO"].tolist()[0], "515893")
+
+        handler.to_sdmx("A", maps=maps)
+        self.assertEqual(maps.loads, 2)
+        # Se vuelve a leer si el fichero cambia
+        write_map(self.maps_dir, "SEXO.csv", [["3689", "1", "Hombres", "M1"], ["3690", "6", "Mujeres", "F"]])
+        os.utime(os.path.join(self.maps_dir, "SEXO.csv"), (1, 1))
+        self.assertEqual(handler.to_sdmx("A", maps=maps)["SEXO"].tolist()[:2], ["M1", "F"])
+        self.assertEqual(maps.loads, 3)
+
+    def test_extend_maps_with_observed_terms(self):
+        handler = processed_handler()
+        df = handler.to_sdmx("A", maps=self.maps_dir, extend_maps=True)
+        self.assertIs(sdmx.resolve(self.maps_dir), sdmx.get_dimension_maps(self.maps_dir))
+        self.assertEqual(df["SEXO"].tolist()[:2], ["HOMBRES", "MUJERES"])
+        territory = pd.read_csv(os.path.join(self.maps_dir, "AA_TERRITROIO.csv"), dtype=str)
+        # Solo los nodos presentes en los datos, con su código y descripción
+        self.assertEqual(territory["SOURCE"].tolist(), ["515892", "515893", "515894", "515903"])
+        self.assertEqual(territory["TARGET"].tolist(), ["ANDALUCÍA", "ALMERÍA", "ABLA", "ALCA_LOS_GAZU"])
+        self.assertEqual(territory["COD"].tolist(), ["01", "04", "04001", "11001"])
+
+        # Un mapa nuevo se lee desde disco igual que lo ha traducido la caché
+        fresh = processed_handler().to_sdmx("A", maps=sdmx.DimensionMaps(self.maps_dir))
+        pd.testing.assert_frame_equal(fresh.astype(object), df.astype(object))
+
+    def test_same_rows_as_merge_per_column(self):
+        consulta, values = synthetic.generate_consulta(300, n_hierarchies=2, depth=2, fanout=4, seed=5)
+        handler = processed_handler(consulta, synthetic.hierarchy_values_for(consulta, values))
+        write_map(self.maps_dir, "SINTETICA1.csv",
+                  [[node_id, None, None, f"T{node_id}"] for node_id in handler.hierarchy_index["D_SINTETICA1_0"].id])
+        df = handler.to_sdmx("M", maps=self.maps_dir, dropna=False)
+
+        # Referencia: merge por columna con el mapa leído del fichero
+        mapa = pd.read_csv(os.path.join(self.maps_dir, "SINTETICA1.csv"), dtype=str)
+        ids = pd.DataFrame({"SOURCE": pd.Series(df["SINTETICA1"].map(lambda t: t[1:]), dtype=str)})
+        self.assertEqual(ids.merge(mapa, how="left", on="SOURCE")["TARGET"].tolist(), df["SINTETICA1"].tolist())
+        index = handler.hierarchy_index["D_SINTETICA2_0"]
+        expected = index.id[index.find_paths(handler.df_data["D_SINTETICA2_0_cod"])].tolist()
+        self.assertEqual(df["SINTETICA2"].tolist()[:len(handler.df_data)], expected)
+
+    def test_export_csv(self):
+        path = os.path.join(self.tmp.name, "44804.csv")
+        self.assertEqual(processed_handler().export_sdmx(path, "A"), path)
+        df = pd.read_csv(path, sep=";", dtype={"SEXO": str, "AA_TERRITROIO": str})
+        self.assertEqual(len(df), 9)
+        self.assertEqual(df["OBS_VALUE"].tolist()[:2], [120, 98])
+        self.assertEqual(df["AA_TERRITROIO"].tolist()[0], "515893")
+
+    @unittest.skipUnless(HAS_PYARROW, "pyarrow no está instalado")
+    def test_export_parquet(self):
+        path = os.path.join(self.tmp.name, "44804.parquet")
+        handler = processed_handler()
+        handler.export_sdmx(path, "A")
+        df = export.read_table(path)
+        self.assertEqual(str(df["SEXO"].dtype), "category")
+        self.assertEqual(df["OBS_VALUE"].tolist(), handler.to_sdmx("A")["OBS_VALUE"].tolist())
+
+    def test_requires_data(self):
+        handler = APIDataHandler.from_json(copy.deepcopy(fake_badea.CONSULTA), registry=False)
+        handler.df_data = None
+        with self.assertRaises(ValueError):
+            handler.to_sdmx("A")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import unittest
+import sys
+import os
+import json
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+from src.main import APIDataHandler
+from http_client import BADEAClient
+import stats
+import fake_badea
+
+MAIN_STAGES = ["fetch", "parse", "dataframe", "hierarchies", "mapping"]
+
+
+def run_pipeline(**options):
+    client = BADEAClient(transport=fake_badea.FakeBADEATransport())
+    handler = APIDataHandler.from_url(fake_badea.CONSULTA_URL, client=client, **options)
+    handler.get_DataFrame_dataJSON(process_measures=True, numeric_measures=True)
+    handler.process_all_hierarchies()
+    handler.map_data_w_hierarchies_info()
+    return handler
+
+
+class TestStageStats(unittest.TestCase):
+
+    def test_records_per_stage(self):
+        handler = run_pipeline(track_memory=True)
+        handler.memory_tracker.stop()
+        records = handler.stats.records
+
+        self.assertEqual([r["stage"] for r in records if r["stage"] in MAIN_STAGES], MAIN_STAGES)
+        self.assertEqual([r["stage"] for r in handler.memory_report], MAIN_STAGES[1:])
+        by_stage = {}
+        for record in records:
+            by_stage.setdefault(record["stage"], []).append(record)
+
+        self.assertGreater(by_stage["fetch"][0]["bytes_downloaded"], 0)
+        self.assertEqual(by_stage["parse"][0]["rows_out"], len(fake_badea.DATA))
+        self.assertEqual((by_stage["dataframe"][0]["rows_in"], by_stage["dataframe"][0]["rows_out"]), (5, 5))
+        self.assertEqual(len(by_stage["measures"]), 1)
+        self.assertEqual([r["alias"] for r in by_stage["hierarchy_fetch"]],
+                         [h["alias"] for h in fake_badea.HIERARCHIES])
+        self.assertTrue(all(r["bytes_downloaded"] > 0 for r in by_stage["hierarchy_fetch"]))
+        self.assertEqual([r["rows_out"] for r in by_stage["hierarchy_flatten"]], [3, 4, 8])
+        self.assertEqual(by_stage["hierarchies"][0]["rows_out"], 15)
+        self.assertEqual([r["rows_out"] for r in by_stage["mapping_merge"]], [5, 5, 5])
+        self.assertEqual(by_stage["mapping"][0]["rows_out"], 5)
+
+        for record in records:
+            self.assertGreaterEqual(record["wall_seconds"], 0)
+            # Solo las etapas principales miden la memoria
+            self.assertEqual(record["peak_bytes"] is not None, record["stage"] in MAIN_STAGES[1:])
+
+        summary = handler.stats.summary()
+        self.assertEqual(summary["hierarchy_fetch"]["count"], 3)
+        frame = handler.stats.to_frame()
+        self.assertEqual(list(frame.columns[:len(stats.FIELDS)]), list(stats.FIELDS))
+        self.assertEqual(len(frame), len(records))
+
+    def test_json_log_lines(self):
+        with self.assertLogs("badea.stats", level="INFO") as logs:
+            handler = run_pipeline(log_stats=True)
+        lines = [json.loads(message.split(":", 2)[2]) for message in logs.output]
+        self.assertEqual(len(lines), len(handler.stats.records))
+        self.assertEqual(lines[0]["stage"], "fetch")
+        self.assertTrue(all(line["id_consulta"] == 44804 for line in lines[1:]))
+
+    def test_no_log_lines_by_default(self):
+        handler = run_pipeline()
+        self.assertFalse(handler.stats.log_json)
+        self.assertIsNone(handler.stats.records[1]["peak_bytes"])
+
+
+if __name__ == "__main__":
+    unittest.main()
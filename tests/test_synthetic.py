@@ -0,0 +1,52 @@
+import unittest
+import sys
+import os
+import json
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../benchmarks')))
+from src.main import APIDataHandler
+import synthetic
+import bench_stages
+
+
+class TestSyntheticConsulta(unittest.TestCase):
+
+    def test_hierarchy_shape(self):
+        root = synthetic.generate_hierarchy("D_X_0", depth=3, fanout=4)
+        paths = synthetic.hierarchy_paths(root)
+        self.assertEqual(len(paths), 4 + 16 + 64)
+        self.assertEqual(paths[:2], [(["01"], "D_X_0 01"), (["01", "0101"], "D_X_0 0101")])
+
+    def test_pipeline_on_synthetic_consulta(self):
+        consulta, values = synthetic.generate_consulta(500, n_hierarchies=2, depth=2, fanout=3, n_measures=3, seed=1)
+        self.assertEqual(consulta, synthetic.generate_consulta(500, 2, 2, 3, 3, seed=1)[0])
+
+        handler = APIDataHandler.from_json(json.loads(synthetic.consulta_body(consulta)))
+        handler.get_DataFrame_dataJSON(process_measures=True, numeric_measures=True)
+        handler.process_all_hierarchies(hierarchy_values=synthetic.hierarchy_values_for(consulta, values))
+        mapped = handler.map_data_w_hierarchies_info()
+        self.assertEqual(len(mapped), 500)
+        self.assertEqual(list(mapped.columns[-3:]), ["Medida_1", "Medida_2", "Medida_3"])
+        # Todas las celdas tienen su descripción en la jerarquía
+        self.assertFalse(mapped["SINTETICA11"].isna().any())
+
+    def test_benchmark_report_and_regressions(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, "results.json")
+            report = bench_stages.run_grid([1000], output, n_hierarchies=2, depth=2, fanout=3)
+            with open(output, encoding="utf-8") as f:
+                saved = json.load(f)
+        self.assertEqual([r["stage"] for r in saved["results"]], list(bench_stages.STAGES))
+        self.assertTrue(all(r["peak_bytes"] > 0 and r["rows_out"] > 0 for r in saved["results"]))
+
+        self.assertEqual(bench_stages.compare(report, saved), [])
+        slower = json.loads(json.dumps(report))
+        slower["results"][1]["wall_seconds"] *= 2
+        regressions = bench_stages.compare(slower, saved)
+        self.assertEqual([(r["stage"], r["metric"]) for r in regressions], [("dataframe", "wall_seconds")])
+
+
+if __name__ == "__main__":
+    unittest.main()
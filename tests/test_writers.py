@@ -0,0 +1,79 @@
+import unittest
+import sys
+import os
+import tempfile
+from unittest import mock
+
+import openpyxl
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+from src.main import APIDataHandler
+import writers
+import fake_badea
+
+
+def processed_handler():
+    with mock.patch.object(APIDataHandler, "request_hierarchies_values",
+                           staticmethod(fake_badea.fake_request_hierarchies_values)):
+        handler = APIDataHandler(fake_badea.consulta_response())
+        handler.get_DataFrame_dataJSON(process_measures=True, numeric_measures=True)
+        handler.process_all_hierarchies()
+        handler.map_data_w_hierarchies_info()
+    return handler
+
+
+def sheet_rows(path, sheet=None):
+    workbook = openpyxl.load_workbook(path, read_only=True)
+    worksheet = workbook[sheet] if sheet else workbook.active
+    rows = [list(row) for row in worksheet.iter_rows(values_only=True)]
+    workbook.close()
+    return rows
+
+
+class TestStreamingWriters(unittest.TestCase):
+
+    def setUp(self):
+        self.handler = processed_handler()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_dataset_xlsx_in_batches(self):
+        path = os.path.join(self.tmp.name, "datos.xlsx")
+        self.handler.save_dataset(path, batch_size=2)
+        rows = sheet_rows(path)
+        self.assertEqual(rows[0], list(self.handler.df_data_mapped.columns))
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(rows[1][-1], "1,5")
+        # Medida no disponible: celda vacía
+        self.assertEqual(rows[4][-2], "3")
+        self.assertIn(rows[4][-1], (None, ""))
+
+    def test_hierarchies_one_sheet_per_hierarchy(self):
+        path = os.path.join(self.tmp.name, "jerarquias.xlsx")
+        sheets = self.handler.save_hierarchies_level(path, by_sheet=True, batch_size=2)
+        self.assertEqual(sheets, ["D_SEXO_0", "D_TEMPORAL_0", "D_AA_TERRITROIO_0"])
+        sexo = sheet_rows(path, "D_SEXO_0")
+        self.assertEqual(sexo[0], ["Variable", "id", "COD_combination", "Des1", "Des2"])
+        self.assertEqual(sexo[2][2:], ["['1']", "Ambos sexos", "Hombres"])
+        self.assertEqual(len(sheet_rows(path, "D_AA_TERRITROIO_0")[0]), 7)
+
+    def test_hierarchies_level_and_csv_per_hierarchy(self):
+        path = os.path.join(self.tmp.name, "temporal.xlsx")
+        self.handler.save_hierarchies_level(path, level="D_TEMPORAL_0")
+        self.assertEqual(len(sheet_rows(path)), 5)
+
+        files = self.handler.save_hierarchies_level(os.path.join(self.tmp.name, "jerarquias.tsv"), by_sheet=True)
+        self.assertEqual([os.path.basename(f) for f in files],
+                         ["jerarquias_D_SEXO_0.tsv", "jerarquias_D_TEMPORAL_0.tsv", "jerarquias_D_AA_TERRITROIO_0.tsv"])
+        self.assertEqual(len(pd.read_csv(files[2], sep="\t")), 8)
+
+    def test_sheet_names(self):
+        self.assertEqual(writers.sheet_name("a/b:c"), "a_b_c")
+        self.assertEqual(len(writers.sheet_name("X" * 40)), 31)
+        self.assertEqual(writers.sheet_name("D_SEXO_0", ["d_sexo_0"]), "D_SEXO_0_1")
+
+
+if __name__ == "__main__":
+    unittest.main()